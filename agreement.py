@@ -0,0 +1,189 @@
+"""Inter-annotator agreement over sparse annotator x image rating matrices.
+
+Ratings arrive as parallel arrays of ``(rater, item, score)``. Item statistics
+are computed from an items x levels count matrix built with ``bincount``.
+Pairwise rater statistics join the ratings on item, so only pairs of raters
+that share items are formed; with many anonymous sessions that each rate a
+few images this stays far below raters x raters. Nothing loops over raters,
+items or ratings in Python.
+"""
+
+import numpy as np
+
+from analytics import SCORE_LEVELS
+
+LEVELS = len(SCORE_LEVELS)
+PAIR_CHUNK = 1 << 22
+
+
+class RatingMatrix:
+    """Sparse rating matrix with raters and items encoded as dense integer codes"""
+
+    def __init__(self, raters, items, scores):
+        raters = np.asarray(raters)
+        items = np.asarray(items)
+        self.scores = np.asarray(scores, dtype=np.int64)
+        if not (len(raters) == len(items) == len(self.scores)):
+            raise ValueError("raters, items and scores must have the same length")
+        if len(self.scores) and (self.scores.min() < 1 or self.scores.max() > LEVELS):
+            raise ValueError(f"scores must be between 1 and {LEVELS}")
+        self.rater_ids, self.raters = np.unique(raters, return_inverse=True)
+        self.item_ids, self.items = np.unique(items, return_inverse=True)
+
+    @property
+    def n_raters(self):
+        return len(self.rater_ids)
+
+    @property
+    def n_items(self):
+        return len(self.item_ids)
+
+    def item_counts(self):
+        """items x levels matrix of how many raters gave each score to each item"""
+        flat = self.items * LEVELS + (self.scores - 1)
+        return np.bincount(flat, minlength=self.n_items * LEVELS).reshape(self.n_items, LEVELS).astype(np.float64)
+
+
+def krippendorff_alpha_ordinal(matrix):
+    """Krippendorff's alpha with the ordinal difference function; None if undefined"""
+    counts = matrix.item_counts()
+    per_item = counts.sum(axis=1)
+    pairable = per_item >= 2
+    counts, per_item = counts[pairable], per_item[pairable]
+    if not len(counts):
+        return None
+
+    # Coincidence matrix: sum over items of (n_c n_k - [c=k] n_c) / (m - 1)
+    weighted = counts / (per_item - 1)[:, None]
+    coincidence = weighted.T @ counts - np.diag(weighted.sum(axis=0))
+    marginals = coincidence.sum(axis=0)
+    n = marginals.sum()
+
+    cumulative = np.concatenate([[0.0], np.cumsum(marginals)])
+    low = np.minimum.outer(np.arange(LEVELS), np.arange(LEVELS))
+    high = np.maximum.outer(np.arange(LEVELS), np.arange(LEVELS))
+    between = cumulative[high + 1] - cumulative[low]
+    delta = (between - (marginals[low] + marginals[high]) / 2) ** 2
+
+    observed = (coincidence * delta).sum()
+    expected = (np.outer(marginals, marginals) * delta).sum()
+    if expected == 0:
+        return None
+    return float(1 - (n - 1) * observed / expected)
+
+
+def fleiss_kappa(matrix):
+    """Fleiss' kappa generalized to a varying number of raters per item; None if undefined"""
+    counts = matrix.item_counts()
+    per_item = counts.sum(axis=1)
+    pairable = per_item >= 2
+    counts, per_item = counts[pairable], per_item[pairable]
+    if not len(counts):
+        return None
+    observed = ((counts ** 2).sum(axis=1) - per_item) / (per_item * (per_item - 1))
+    proportions = counts.sum(axis=0) / per_item.sum()
+    chance = (proportions ** 2).sum()
+    if chance == 1:
+        return None
+    return float((observed.mean() - chance) / (1 - chance))
+
+
+def _rating_pairs(matrix):
+    """``(rater a, rater b, score a, score b)`` for every item both raters rated, a < b, in chunks of items
+
+    Each chunk holds about ``PAIR_CHUNK`` pairs, so memory stays bounded when a
+    few raters share many items.
+    """
+    order = np.argsort(matrix.items, kind="stable")
+    items, raters, scores = matrix.items[order], matrix.raters[order], matrix.scores[order]
+    per_item = np.bincount(items, minlength=matrix.n_items)
+    starts = np.concatenate([[0], np.cumsum(per_item)])
+    pairs_per_item = np.cumsum(per_item.astype(np.int64) ** 2)
+
+    first = 0
+    while first < matrix.n_items:
+        base = pairs_per_item[first - 1] if first else 0
+        last = max(first + 1, int(np.searchsorted(pairs_per_item, base + PAIR_CHUNK, side="right")))
+        lo, hi = starts[first], starts[min(last, matrix.n_items)]
+        # Each rating is paired with every rating of its item, itself included
+        repeats = per_item[items[lo:hi]]
+        a = np.repeat(np.arange(lo, hi), repeats)
+        block = np.repeat(np.cumsum(repeats) - repeats, repeats)
+        b = starts[items[a]] + np.arange(len(a)) - block
+        keep = raters[a] < raters[b]
+        a, b = a[keep], b[keep]
+        yield raters[a], raters[b], scores[a].astype(np.float64), scores[b].astype(np.float64)
+        first = last
+
+
+def pairwise_weighted_kappa(matrix, min_overlap=2):
+    """Quadratic-weighted Cohen's kappa for every rater pair sharing at least ``min_overlap`` items
+
+    Returns ``(rater_a, rater_b, kappa, overlap)`` arrays with rater codes
+    ``a < b``; kappa is NaN where there is no expected disagreement.
+    """
+    keys, totals = [], []
+    for a, b, x, y in _rating_pairs(matrix):
+        key = a.astype(np.int64) * matrix.n_raters + b
+        unique, inverse = np.unique(key, return_inverse=True)
+        keys.append(unique)
+        totals.append(np.stack([
+            np.bincount(inverse, minlength=len(unique)),
+            np.bincount(inverse, x, len(unique)),
+            np.bincount(inverse, y, len(unique)),
+            np.bincount(inverse, x * x, len(unique)),
+            np.bincount(inverse, y * y, len(unique)),
+            np.bincount(inverse, x * y, len(unique)),
+        ]))
+    if not keys:
+        empty = np.zeros(0)
+        return empty.astype(np.int64), empty.astype(np.int64), empty, empty
+    # Pairs split across chunks are summed
+    unique, inverse = np.unique(np.concatenate(keys), return_inverse=True)
+    stacked = np.concatenate(totals, axis=1)
+    overlap, sum_x, sum_y, sum_x2, sum_y2, cross = (np.bincount(inverse, row, len(unique)) for row in stacked)
+
+    selected = overlap >= min_overlap
+    unique, overlap = unique[selected], overlap[selected]
+    sum_x, sum_y, sum_x2, sum_y2, cross = (v[selected] for v in (sum_x, sum_y, sum_x2, sum_y2, cross))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        observed = (sum_x2 + sum_y2 - 2 * cross) / overlap
+        expected = sum_x2 / overlap + sum_y2 / overlap - 2 * (sum_x / overlap) * (sum_y / overlap)
+        kappa = 1 - observed / expected
+    kappa[~(expected > 0)] = np.nan
+    return unique // matrix.n_raters, unique % matrix.n_raters, kappa, overlap
+
+
+def item_disagreement(matrix):
+    """Per-item rating count and standard deviation of scores"""
+    counts = matrix.item_counts()
+    per_item = counts.sum(axis=1)
+    levels = np.asarray(SCORE_LEVELS, dtype=np.float64)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = counts @ levels / per_item
+        variance = counts @ (levels ** 2) / per_item - mean ** 2
+    return per_item.astype(np.int64), np.sqrt(np.clip(variance, 0, None))
+
+
+def agreement_report(raters, items, scores, top=5):
+    """Summary of agreement statistics for the dashboard"""
+    matrix = RatingMatrix(raters, items, scores)
+    per_item, spread = item_disagreement(matrix)
+    multi = per_item >= 2
+    kappa = pairwise_weighted_kappa(matrix)[2]
+    mean_kappa = float(np.nanmean(kappa)) if np.isfinite(kappa).any() else None
+
+    order = np.argsort(-np.where(multi, spread, -1), kind="stable")[:top]
+    disputed = [
+        {"image_id": matrix.item_ids[i].item(), "ratings": int(per_item[i]), "std": float(spread[i])}
+        for i in order if multi[i]
+    ]
+    return {
+        "raters": matrix.n_raters,
+        "images": matrix.n_items,
+        "multi_rated_images": int(multi.sum()),
+        "krippendorff_alpha": krippendorff_alpha_ordinal(matrix),
+        "fleiss_kappa": fleiss_kappa(matrix),
+        "mean_weighted_kappa": mean_kappa,
+        "most_disputed": disputed,
+    }
@@ -1,9 +1,30 @@
+import os
+import random
+
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-import time
+from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+from agreement import agreement_report
+from analytics import AnalyticsEngine
+from batch_analysis import manifest_lookup
+from composites import COMPOSITE_MODES, DEFAULT_BACKGROUND, composite_for
+from dashboard import FigureCache, GroupedDistribution, LatestRatings, breakdown_figures, distribution_figure, version_hash
+from dataset import Dataset
+from dedupe import DedupedDataset, duplicate_ids, load_deduplicated
+from export import DEFAULT_EXPORT_DIR, EXTENSIONS, MIME_TYPES, export_file, parse_time
+from image_cache import ImageCache, is_remote
+from instrumentation import begin_rerun, count, end_rerun, measured, recorder, section
+from metrics import METRIC_LABELS, METRIC_NAMES, metric_correlations
+from mattes import cutout_for, is_matte
+from metrics_store import MetricsStore
+from previews import preview_for, width_for_view_mode
+from rapid_annotation import WINDOW, data_url, missing_items, rapid_annotator, unapplied_ratings
+from ranking import PairwiseRanking, comparison_sets
+from ratings_store import ANONYMOUS, RatingsStore, new_session_id
+from scheduler import SCHEDULERS, LinearScheduler, SchedulerIndex
+from sequential import DEFAULT_ERROR_RATE, assess
+from telemetry import CHANGED, IDLE_SECONDS, NEXT, QUANTILES, RATED, SHOWN, VIEW_MODE, DwellTimes, quantile_label
+from work_queue import QueueScheduler, WorkQueue, rater_for
 
 # Page configuration
 st.set_page_config(
@@ -13,8 +34,35 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+def session_key():
+    """Streamlit's id for this browser session, used to label instrumentation"""
+    ctx = get_script_run_ctx()
+    return ctx.session_id if ctx is not None else "-"
+
+def instrumented_session():
+    """Session key for a rerun being instrumented; also starts counting the bytes the run sends
+
+    Bytes are counted by wrapping the run context's private ``_enqueue``; on a
+    Streamlit version without it, reruns are still timed but bytes are not counted.
+    """
+    ctx = get_script_run_ctx()
+    if ctx is not None and hasattr(ctx, "_enqueue") and not getattr(ctx._enqueue, "counts_bytes", False):
+        enqueue = ctx._enqueue
+        
+        def counting_enqueue(msg):
+            count("bytes_sent", msg.ByteSize())
+            enqueue(msg)
+        
+        counting_enqueue.counts_bytes = True
+        ctx._enqueue = counting_enqueue
+    return session_key()
+
+# Per-rerun timers and counters; no-ops unless BRE_INSTRUMENT is set
+if recorder() is not None:
+    begin_rerun(instrumented_session())
+
 # Enhanced CSS for React-like styling and vertical layout
-st.markdown("""
+PAGE_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -53,6 +101,21 @@ st.markdown("""
         margin: 2rem 0;
     }
     
+    /* Celebration message that fades out in the browser after 3 seconds */
+    .celebration-toast {
+        background: #dcfce7;
+        color: #166534;
+        padding: 1rem;
+        border-radius: 0.5rem;
+        text-align: center;
+        animation: celebration-toast 3s forwards;
+    }
+    
+    @keyframes celebration-toast {
+        0%, 85% { opacity: 1; }
+        100% { opacity: 0; visibility: hidden; }
+    }
+    
     /* React-like vertical radio buttons */
     .vertical-radio {
         background: white;
@@ -244,9 +307,105 @@ st.markdown("""
         z-index: 1000;
     }
 </style>
-""", unsafe_allow_html=True)
+"""
+
+with section("css"):
+    st.markdown(PAGE_CSS, unsafe_allow_html=True)
+
+# Image pairs paged in from the evaluation manifest
+@st.cache_resource
+def load_dataset():
+    """Open the evaluation manifest once per process; records are paged in on demand
+
+    Once ``dedupe.py`` has grouped near-duplicates, only one image per group is shown.
+    """
+    return load_deduplicated(Dataset())
+
+images = load_dataset()
+
+def manifest_size():
+    """Images in the evaluation, near-duplicates hidden behind a representative included"""
+    return len(images.dataset) if isinstance(images, DedupedDataset) else len(images)
+
+def manifest_index(index):
+    """Manifest position of the image at view ``index``; stored ratings, events and queue leases use it"""
+    return images.manifest_index(index) if isinstance(images, DedupedDataset) else index
+
+def view_index(index):
+    """View position of the image at manifest ``index``, or None when it is hidden as a near-duplicate"""
+    if isinstance(images, DedupedDataset):
+        return images.view_index(index)
+    return index if 0 <= index < len(images) else None
+
+def rated_records(index):
+    """Manifest records a rating of the image at ``index`` counts for: the image and its near-duplicates
+
+    The same rule as ``batch_analysis.attach_duplicates``, so the dashboard and batch reports agree.
+    """
+    if not isinstance(images, DedupedDataset):
+        return [images[index]]
+    return [images[index]] + [images.dataset[int(member)] for member in images.duplicates(index)]
+
+def reset_analytics(ratings):
+    """Rebuild the session's aggregates from ``{index: score}``
+
+    ``analytics`` counts a rating for every image it stands for and backs the displayed totals.
+    ``human_analytics`` counts each rating once, for the sequential test and the schedulers.
+    """
+    st.session_state.analytics = AnalyticsEngine.from_ratings(ratings, rated_records, manifest_size())
+    st.session_state.human_analytics = AnalyticsEngine.from_ratings(
+        ratings, lambda index: [images[index]], len(images)
+    )
+
+@st.cache_resource
+def get_ratings_store():
+    """Shared ratings database; one batched writer thread serves every session"""
+    return RatingsStore()
+
+def annotator_name():
+    """Annotator recorded with this session's ratings"""
+    return st.session_state.annotator or ANONYMOUS
+
+def log_event(kind, index, value=None, ts=None):
+    """Append an interaction event about the image at ``index`` to the telemetry log"""
+    get_ratings_store().record_event(annotator_name(), st.session_state.session_id, kind, manifest_index(index),
+                                     images[index]['id'], value, ts)
+
+def log_shown(index):
+    """Record that the image at ``index`` is on screen, once per visit rather than once per rerun"""
+    shown = (st.session_state.session_id, index)
+    if st.session_state.get("shown_image") != shown:
+        st.session_state.shown_image = shown
+        log_event(SHOWN, index)
+
+def start_session():
+    """Begin a new stored evaluation session and expose its id in the URL for resuming"""
+    st.session_state.session_id = new_session_id()
+    st.query_params["session"] = st.session_state.session_id
+    get_ratings_store().start_session(annotator_name(), st.session_state.session_id)
+
+def resume_session(session_id):
+    """Restore ratings and position from a stored session; returns False if it doesn't exist"""
+    store = get_ratings_store()
+    info = store.session_info(session_id)
+    if info is None:
+        return False
+    annotator, _, completed_at = info
+    # Stored by manifest index, so ratings survive regrouping near-duplicates; hidden images drop out of the view
+    stored = store.session_ratings(session_id)
+    ratings = {view_index(index): score for index, score in stored.items() if view_index(index) is not None}
+    st.session_state.session_id = session_id
+    st.session_state.annotator = annotator
+    st.session_state.ratings = ratings
+    reset_analytics(ratings)
+    if ratings:
+        st.session_state.current_image = min(max(ratings) + 1, len(images) - 1)
+    st.session_state.evaluation_complete = completed_at is not None
+    return True
 
 # Initialize session state
+if 'annotator' not in st.session_state:
+    st.session_state.annotator = st.query_params.get("annotator", "")
 if 'current_image' not in st.session_state:
     st.session_state.current_image = 0
 if 'ratings' not in st.session_state:
@@ -257,40 +416,34 @@ if 'evaluation_complete' not in st.session_state:
     st.session_state.evaluation_complete = False
 if 'view_mode' not in st.session_state:
     st.session_state.view_mode = "Side-by-Side"
-
-# Image data with working URLs
-images = [
-    {
-        "id": 1,
-        "name": "Professional Portrait",
-        "original": "https://i.imgur.com/YG29M6I.png",
-        "processed": "https://i.imgur.com/xW3oobT.png"
-    },
-    {
-        "id": 2,
-        "name": "Business Attire",
-        "original": "https://i.imgur.com/Mxyf5Tt.png",
-        "processed": "https://i.imgur.com/bqx1bWu.png"
-    },
-    {
-        "id": 3,
-        "name": "Product - Smartphone",
-        "original": "https://i.imgur.com/NKBdsXV.png",
-        "processed": "https://i.imgur.com/NUTQwWT.png"
-    },
-    {
-        "id": 4,
-        "name": "Steak Dish",
-        "original": "https://i.imgur.com/DLokTft.png",
-        "processed": "https://i.imgur.com/FN6GcEf.png"
-    },
-    {
-        "id": 5,
-        "name": "Product - Coffee Cup",
-        "original": "https://i.imgur.com/ad5dEgm.png",
-        "processed": "https://i.imgur.com/wobxzdf.png"
-    }
-]
+if 'full_resolution' not in st.session_state:
+    st.session_state.full_resolution = False
+if 'composite_color' not in st.session_state:
+    st.session_state.composite_color = DEFAULT_BACKGROUND
+if 'early_stopping' not in st.session_state:
+    st.session_state.early_stopping = False
+if 'error_rate' not in st.session_state:
+    st.session_state.error_rate = DEFAULT_ERROR_RATE
+if 'scheduler' not in st.session_state:
+    st.session_state.scheduler = LinearScheduler.name
+if 'scheduler_cursors' not in st.session_state:
+    st.session_state.scheduler_cursors = {}
+if 'rapid_mode' not in st.session_state:
+    st.session_state.rapid_mode = False
+if 'rapid_acked' not in st.session_state:
+    st.session_state.rapid_acked = []
+if 'rapid_sent' not in st.session_state:
+    st.session_state.rapid_sent = set()
+    st.session_state.rapid_resent = None
+if 'compare_mode' not in st.session_state:
+    st.session_state.compare_mode = False
+if 'compare_position' not in st.session_state:
+    st.session_state.compare_position = 0
+if 'analytics' not in st.session_state:
+    reset_analytics({})
+if 'session_id' not in st.session_state:
+    if not resume_session(st.query_params.get("session", "")):
+        start_session()
 
 # Quality scale definitions with colors matching React version
 quality_scales = [
@@ -301,8 +454,185 @@ quality_scales = [
     {"value": 5, "label": "Production Ready", "description": "No further edits needed. Ready for immediate use.", "color": "#16a34a"}
 ]
 
+@st.cache_resource
+def get_image_cache():
+    """Shared on-disk image cache for all sessions in this process"""
+    return ImageCache()
+
+def resolve_image(ref):
+    """Return a local path for an image reference, falling back to the reference itself"""
+    try:
+        return get_image_cache().resolve(ref)
+    except OSError:
+        return ref
+
+def resolve_processed(original_ref, processed_ref):
+    """Local path of a processed image, rebuilt from its original when the manifest stores it as a matte"""
+    path = resolve_image(processed_ref)
+    if not is_matte(path):
+        return path
+    try:
+        return cutout_for(resolve_image(original_ref), path)
+    except (OSError, ValueError):
+        return path
+
+def display_image(ref, original_ref=None):
+    """Return what to send for an image: a display-sized preview unless full resolution is requested
+
+    Pass ``original_ref`` with a processed image, which may be stored as a matte over it.
+    """
+    with section("image_resolution"):
+        path = resolve_image(ref) if original_ref is None else resolve_processed(original_ref, ref)
+        if st.session_state.full_resolution or is_remote(path):
+            return path
+        return preview_for(path, st.session_state.view_mode)
+
+def composite_image(original_ref, processed_ref):
+    """Path of the pair rendered in the current composite view mode, or None if it can't be rendered"""
+    with section("composite"):
+        original, processed = resolve_image(original_ref), resolve_processed(original_ref, processed_ref)
+        if is_remote(original) or is_remote(processed):
+            return None
+        mode = st.session_state.view_mode
+        width = None if st.session_state.full_resolution else width_for_view_mode(mode)
+        return composite_for(original, processed, mode, width, st.session_state.composite_color)
+
+def show_image(src):
+    """st.image at the slot's width, timing its serialization"""
+    with section("st_image"):
+        st.image(src, use_container_width=True)
+    if recorder() is not None and not is_remote(src):
+        count("image_bytes", os.path.getsize(src))
+
+@st.cache_resource
+def get_metrics_store():
+    """Shared read handle on the precomputed metrics database"""
+    return MetricsStore()
+
+def pair_metrics(original_ref, processed_ref):
+    """Precomputed objective metrics for an image pair, or None if the batch job hasn't scored it"""
+    return get_metrics_store().get(original_ref, processed_ref)
+
+def duplicate_count(index):
+    """Near-duplicates hidden behind the image at ``index`` that share its rating"""
+    return len(images.duplicates(index)) if isinstance(images, DedupedDataset) else 0
+
+def format_metrics(metrics):
+    """One-line summary of a pair's objective metrics"""
+    return " · ".join([
+        f"Coverage {metrics['coverage']:.0%}",
+        f"Edge sharpness {metrics['edge_sharpness']:.2f}",
+        f"Fringe {metrics['fringe_ratio']:.1%}",
+        f"Halo bleed {metrics['halo_bleed']:.2f}",
+        f"Stray islands {int(metrics['stray_islands'])}",
+    ])
+
+@st.cache_resource
+def load_scheduler_index():
+    """Per-category image orderings for adaptive schedulers, built once per process"""
+    return SchedulerIndex.build(images, get_metrics_store().all_metrics())
+
+@st.cache_resource
+def get_work_queue():
+    """Shared lease queue that splits the dataset between concurrent annotators"""
+    queue = WorkQueue()
+    queue.set_images(images.indices if isinstance(images, DedupedDataset) else range(len(images)))
+    return queue
+
+@st.cache_resource
+def get_scheduler(name):
+    """Shared scheduler instance; linear order needs no index"""
+    scheduler_class = next(cls for cls in SCHEDULERS + (QueueScheduler,) if cls.name == name)
+    if scheduler_class is LinearScheduler:
+        return LinearScheduler()
+    if scheduler_class is QueueScheduler:
+        return QueueScheduler(get_work_queue(), queue_index=manifest_index, view_index=view_index)
+    return scheduler_class(load_scheduler_index())
+
+@st.cache_data(ttl=5, show_spinner=False)
+def queue_progress():
+    """Shared queue coverage, refreshed every few seconds rather than scanned on every rerun"""
+    return get_work_queue().progress()
+
+def uses_work_queue():
+    """Whether this session takes its images from the shared queue"""
+    return st.session_state.scheduler == QueueScheduler.name
+
+def rater():
+    """Who this session's ratings count for in the shared queue"""
+    return rater_for(annotator_name(), st.session_state.session_id)
+
+def scheduler_cursors():
+    """The session's scheduler cursors, labelled with the session and rater the shared queue leases to"""
+    cursors = st.session_state.scheduler_cursors
+    cursors["session"] = st.session_state.session_id
+    cursors["rater"] = rater()
+    return cursors
+
+def release_leases():
+    """Hand this session's queued images back to the shared queue, if it took any"""
+    if "held" in st.session_state.scheduler_cursors:
+        get_work_queue().release(st.session_state.session_id)
+        st.session_state.scheduler_cursors.pop("held")
+
+def scheduler_changed():
+    """Image order callback: start on a leased image when joining the shared queue, hand leases back when leaving"""
+    if uses_work_queue():
+        upcoming = next_image()
+        if upcoming is not None:
+            st.session_state.current_image = upcoming
+    else:
+        release_leases()
+
+def next_image():
+    """Index of the next image to show under the session's scheduler, or None once all are rated"""
+    return get_scheduler(st.session_state.scheduler).next_index(
+        st.session_state.current_image,
+        st.session_state.ratings,
+        scheduler_cursors(),
+        st.session_state.human_analytics,
+        len(images)
+    )
+
+def peek_images(current, count):
+    """Up to ``count`` images after ``current`` in scheduler order; looking ahead leases nothing from the shared queue"""
+    return get_scheduler(st.session_state.scheduler).peek(
+        current,
+        st.session_state.ratings,
+        scheduler_cursors(),
+        st.session_state.human_analytics,
+        len(images),
+        count
+    )
+
+def upcoming_images(count):
+    """The next ``count`` unrated image indices in scheduler order, starting with the one on screen
+
+    Only that first image is taken from the shared queue; the rest are preloaded without leasing them.
+    """
+    current = st.session_state.current_image
+    if current in st.session_state.ratings:
+        current = next_image()
+        if current is None:
+            return []
+        st.session_state.current_image = current
+    return [current] + peek_images(current, count - 1)
+
+@st.cache_data(max_entries=4 * WINDOW, show_spinner=False)
+def image_url(ref, original_ref=None):
+    """Side-by-side preview of an image inlined as a data URL, or the URL itself if it couldn't be fetched"""
+    path = resolve_image(ref) if original_ref is None else resolve_processed(original_ref, ref)
+    if is_remote(path):
+        return path
+    return data_url(preview_for(path, "Side-by-Side"))
+
+def prefetch_pair(index):
+    """Warm the cache for the image pair at the given index in the background"""
+    if index is not None and 0 <= index < len(images):
+        get_image_cache().prefetch([images[index]['original'], images[index]['processed']])
+
 def create_celebration_animation():
-    """Create animated celebration effect that runs for 3 seconds"""
+    """Create animated celebration effect; the browser runs and clears it, the script doesn't wait"""
     # Create celebration HTML with limited duration animations
     celebration_html = """
     <div class="celebration">
@@ -318,15 +648,9 @@ def create_celebration_animation():
     if 'celebration_shown' not in st.session_state:
         st.session_state.celebration_shown = True
         
-        # Show balloons for 3 seconds
+        # Balloons and a message that fades out after 3 seconds, both animated client-side
         st.balloons()
-        
-        # Brief message
-        with st.empty():
-            for i in range(3):
-                st.success(f"🎉 Celebration! Thank you for your evaluation! 🎉")
-                time.sleep(1)
-            st.empty()  # Clear the message
+        st.markdown('<div class="celebration-toast">🎉 Celebration! Thank you for your evaluation! 🎉</div>', unsafe_allow_html=True)
 
 def custom_radio_buttons(current_rating):
     """Create custom vertical radio buttons matching React design"""
@@ -362,94 +686,636 @@ def custom_radio_buttons(current_rating):
     
     return current_rating if current_rating > 0 else None
 
+def set_view_mode(mode):
+    """Button callback: switch the image panel's view mode"""
+    if mode != st.session_state.view_mode:
+        log_event(VIEW_MODE, st.session_state.current_image, mode)
+    st.session_state.view_mode = mode
+
 def create_view_mode_buttons():
     """Create custom view mode buttons"""
     st.markdown('<div class="view-mode-buttons">', unsafe_allow_html=True)
     
-    col1, col2, col3, col4 = st.columns([1, 1, 1, 6])
-    
-    with col1:
-        if st.button("Side-by-Side", key="side_by_side", 
-                    type="primary" if st.session_state.view_mode == "Side-by-Side" else "secondary"):
-            st.session_state.view_mode = "Side-by-Side"
-            st.rerun()
+    modes = ("Side-by-Side", "Original Only", "Processed Only") + COMPOSITE_MODES
     
-    with col2:
-        if st.button("Original Only", key="original_only",
-                    type="primary" if st.session_state.view_mode == "Original Only" else "secondary"):
-            st.session_state.view_mode = "Original Only"
-            st.rerun()
-    
-    with col3:
-        if st.button("Processed Only", key="processed_only",
-                    type="primary" if st.session_state.view_mode == "Processed Only" else "secondary"):
-            st.session_state.view_mode = "Processed Only"
-            st.rerun()
+    for col, mode in zip(st.columns([1] * len(modes) + [2]), modes):
+        with col:
+            st.button(mode, key=mode.lower().replace(" ", "_").replace("-", "_"),
+                      type="primary" if st.session_state.view_mode == mode else "secondary",
+                      on_click=set_view_mode, args=(mode,))
     
     st.markdown('</div>', unsafe_allow_html=True)
 
+def set_rating(index, value, ts=None):
+    """Button callback: record a rating for the image at ``index``; ``ts`` times its telemetry event"""
+    previous = st.session_state.ratings.get(index)
+    if value != previous:
+        log_event(RATED if previous is None else CHANGED, index, value, ts)
+    for record in rated_records(index):
+        st.session_state.analytics.update(previous, value, record)
+    st.session_state.human_analytics.update(previous, value, images[index])
+    st.session_state.ratings[index] = value
+    get_ratings_store().record(
+        annotator_name(),
+        st.session_state.session_id,
+        manifest_index(index),
+        images[index]['id'],
+        value,
+    )
+    if uses_work_queue():
+        get_work_queue().complete(rater(), [manifest_index(index)])
+
+def rapid_items(queue):
+    """Rapid component items for the queue, with images only for pairs the browser hasn't been sent"""
+    missing, st.session_state.rapid_resent = missing_items(st.session_state.get("rapid_annotator"),
+                                                           st.session_state.rapid_resent)
+    sent = st.session_state.rapid_sent - set(missing)
+    items = []
+    for index in queue:
+        item = {"index": index, "name": images[index]['name']}
+        if index not in sent:
+            item["original"] = image_url(images[index]['original'])
+            item["processed"] = image_url(images[index]['processed'], images[index]['original'])
+        items.append(item)
+    # The browser keeps the images of the pairs in its last queue only
+    st.session_state.rapid_sent = set(queue)
+    return items
+
+def rapid_mode_changed():
+    """Rapid mode callback: a newly shown component has no images yet"""
+    st.session_state.rapid_sent = set()
+
+def apply_rapid_ratings():
+    """Apply rating batches sent by the rapid annotation component that haven't been applied yet"""
+    for index, score, shown_at, rated_at in unapplied_ratings(st.session_state.get("rapid_annotator"),
+                                                                st.session_state.rapid_acked):
+        if 0 <= index < len(images) and 1 <= score <= 5:
+            if shown_at is not None:
+                log_event(SHOWN, index, ts=shown_at)
+            set_rating(index, score, rated_at)
+            st.session_state.current_image = index
+
+@st.cache_resource
+def load_comparison_sets():
+    """Originals with results from several models, found with one pass over the manifest"""
+    return comparison_sets(images)
+
+@st.cache_resource
+def get_model_ranking():
+    """Model ranking from every stored comparison, shared by all sessions and updated from new votes only"""
+    return PairwiseRanking()
+
+def model_ranking():
+    """Current model ranking rows, best first"""
+    ranking = get_model_ranking()
+    with section("ranking_refresh"):
+        ranking.refresh(get_ratings_store())
+        return ranking.table()
+
+def candidate_label(index):
+    """Model a manifest record's result comes from, or its name if it has none"""
+    return images[index]['model'] or images[index]['name']
+
+def candidate_order(position):
+    """Indices of a comparison set in an order fixed per session, so screen position favours no model"""
+    candidates = list(load_comparison_sets()[position])
+    random.Random(f"{st.session_state.session_id}:{position}").shuffle(candidates)
+    return candidates
+
+def record_preference(position, winner):
+    """Button callback: the result at ``winner`` beats every other one in the set, or all tie if it is None"""
+    candidates = load_comparison_sets()[position]
+    original = images[candidates[0]]['original']
+    # The visit was logged under the first candidate in screen order, see comparison_panel
+    log_event(NEXT, candidate_order(position)[0])
+    store = get_ratings_store()
+    for i, first in enumerate(candidates):
+        for second in candidates[i + 1:]:
+            if winner is None:
+                store.record_comparison(annotator_name(), st.session_state.session_id, original,
+                                        candidate_label(first), candidate_label(second), tie=True)
+            elif winner in (first, second):
+                loser = second if winner == first else first
+                store.record_comparison(annotator_name(), st.session_state.session_id, original,
+                                        candidate_label(winner), candidate_label(loser))
+    st.session_state.compare_position = position + 1
+
+def set_candidate_score(index):
+    """Selectbox callback: record the optional 1-5 score given to one candidate"""
+    value = st.session_state[f"compare_score_{index}"]
+    if value:
+        set_rating(index, value)
+
 def calculate_analysis():
-    """Calculate comprehensive analysis of ratings"""
-    if not st.session_state.ratings:
+    """Calculate comprehensive analysis of ratings from the session's running aggregates"""
+    analysis = st.session_state.analytics.snapshot()
+    if analysis is None:
         return None
     
-    scores = list(st.session_state.ratings.values())
-    average = sum(scores) / len(scores)
-    percentage = (average / 5) * 100
-    
-    # Calculate distribution
-    distribution = {i: scores.count(i) for i in range(1, 6)}
-    total = len(scores)
-    distribution_percent = {i: (distribution[i] / total) * 100 if total > 0 else 0 for i in range(1, 6)}
-    
-    # Generate executive summary
-    high_quality = distribution_percent[4] + distribution_percent[5]
-    low_quality = distribution_percent[1] + distribution_percent[2]
-    passes = average >= 4
-    
-    if passes and high_quality >= 80:
-        summary = "The background removal system demonstrates excellent performance with the majority of results meeting production standards. This technology is ready for enterprise deployment with minimal quality concerns."
-    elif passes and high_quality >= 60:
-        summary = "The background removal system shows strong performance with most results approaching production readiness. Minor refinements could further improve consistency across diverse image types."
-    elif average >= 3 and low_quality <= 30:
-        summary = "The background removal system delivers moderately functional results that can accelerate production workflows. Additional development is recommended to achieve consistent enterprise-grade quality standards."
-    elif low_quality >= 50:
-        summary = "The background removal system shows significant limitations with many results requiring substantial manual correction. Major algorithmic improvements are needed before enterprise deployment."
-    else:
-        summary = "The background removal system produces mixed results with inconsistent quality across different image types. Further optimization is required to meet enterprise production standards."
-    
-    # Add threshold context
-    threshold_text = " The system meets the production readiness threshold with scores exceeding the required 4.0 (80%) standard." if passes else " The system falls below the production readiness threshold, which requires an average score of at least 4.0 (80%)."
-    
-    performance_context = " A significant portion of results demonstrate moderate performance, indicating potential for improvement with targeted optimization." if distribution_percent[3] >= 50 else ""
-    
-    summary += threshold_text + performance_context
-    
+    rated_metrics = get_metrics_store().get_many(
+        (images[i]['original'], images[i]['processed']) for i in st.session_state.ratings
+    )
     return {
-        'scores': scores,
-        'average': average,
-        'percentage': percentage,
-        'passes': passes,
-        'distribution': distribution,
-        'distribution_percent': distribution_percent,
-        'summary': summary,
-        'total_images': len(images)
+        **analysis,
+        'metric_correlations': metric_correlations(rated_metrics, list(st.session_state.ratings.values()))
     }
 
+def rating_labels_and_colors():
+    """Chart labels and React colors for the five rating levels"""
+    return (
+        [f"{i} - {quality_scales[i-1]['label']}" for i in range(1, 6)],
+        [quality_scales[i-1]['color'] for i in range(1, 6)]
+    )
+
+def dashboard_data():
+    """Analysis and distribution figure, built once per ratings version and kept in session state"""
+    analytics = st.session_state.analytics
+    cached = st.session_state.get('dashboard_cache')
+    if cached is None or cached[0] is not analytics or cached[1] != analytics.version:
+        with section("calculate_analysis"):
+            analysis = calculate_analysis()
+        with section("plotly_figure"):
+            fig = distribution_figure(
+                [analysis['distribution'][i] for i in range(1, 6)],
+                *rating_labels_and_colors()
+            ) if analysis is not None else None
+        cached = st.session_state.dashboard_cache = (analytics, analytics.version, analysis, fig)
+    return cached[2], cached[3]
+
+@st.cache_resource
+def get_figure_cache():
+    """Dashboard figures shared by every session, keyed by the ratings version they show"""
+    return FigureCache()
+
+@st.cache_resource
+def get_latest_ratings():
+    """Latest rating of every rater for every image across all sessions, refreshed incrementally"""
+    return LatestRatings()
+
+@st.cache_resource
+def image_attributes():
+    """Category and model of every image id in the manifest"""
+    return manifest_lookup(images.path)[0]
+
+@st.cache_resource
+def image_duplicates():
+    """Ids of the near-duplicates behind each representative id; empty unless ``dedupe.py`` grouped the manifest"""
+    if not isinstance(images, DedupedDataset):
+        return {}
+    return duplicate_ids(images.dataset, images.representative)
+
+BREAKDOWN_GROUPS = {"Category": "category", "Model": "model", "Annotator": "annotator"}
+
+def breakdown_view(scope, field):
+    """Figures breaking scores down by ``field`` for this evaluation or all stored ones, built once per ratings version"""
+    labels, colors = rating_labels_and_colors()
+    title = f"Scores by {field}"
+    if scope == "This evaluation":
+        analytics = st.session_state.analytics
+        key = (field, version_hash("session", st.session_state.session_id, id(analytics), analytics.version))
+        
+        def grouped():
+            if field == "annotator":
+                return GroupedDistribution([annotator_name()], [analytics.overall.histogram])
+            return GroupedDistribution.from_aggregates(analytics.breakdowns[field])
+    else:
+        latest = get_latest_ratings()
+        with section("breakdown_refresh"):
+            latest.refresh(get_ratings_store())
+        key = (field, version_hash("all", latest.rowid))
+        
+        def grouped():
+            # Near-duplicates count as in this evaluation's figures and the batch reports
+            if field == "annotator":
+                return latest.by_rater(image_duplicates())
+            position = 0 if field == "category" else 1
+            attributes = image_attributes()
+            return latest.by_image(image_duplicates()).regroup(lambda image_id: attributes.get(image_id, (None, None))[position])
+    
+    def build():
+        with section("breakdown_figures"):
+            distribution = grouped()
+            return breakdown_figures(distribution, title, labels, colors) if len(distribution) else []
+    
+    return get_figure_cache().get_or_build(key, build)
+
+@st.cache_resource
+def get_dwell_times():
+    """Interaction events of every stored session, refreshed incrementally"""
+    return DwellTimes()
+
+def dwell_report():
+    """Dwell-time percentiles across every stored session, computed once per event-log version"""
+    dwell = get_dwell_times()
+    with section("dwell_refresh"):
+        dwell.refresh(get_ratings_store())
+    attributes = image_attributes()
+    return get_figure_cache().get_or_build(
+        ("dwell", version_hash("dwell", dwell.rowid)),
+        lambda: dwell.report(lambda image_id: attributes.get(image_id, (None, None))[0]),
+    )
+
+@st.cache_data(ttl=60, show_spinner=False)
+def load_agreement():
+    """Agreement statistics across every stored rater, refreshed at most once a minute"""
+    raters, image_ids, scores = get_ratings_store().latest_ratings()
+    if not scores:
+        return None
+    return agreement_report(raters, image_ids, scores)
+
+def format_agreement(value):
+    """Format an agreement coefficient that may be undefined"""
+    return f"{value:.2f}" if value is not None else "n/a"
+
+def complete_evaluation():
+    """Mark the evaluation finished and record completion in the ratings store"""
+    st.session_state.evaluation_complete = True
+    get_ratings_store().complete_session(st.session_state.session_id)
+    release_leases()
+
 def reset_evaluation():
     """Reset the evaluation to start over"""
+    release_leases()
     st.session_state.current_image = 0
     st.session_state.ratings = {}
+    reset_analytics({})
+    st.session_state.scheduler_cursors = {}
+    st.session_state.compare_position = 0
     st.session_state.show_analysis = False
     st.session_state.evaluation_complete = False
     st.session_state.view_mode = "Side-by-Side"
+    st.session_state.full_resolution = False
+    start_session()
     if 'celebration_shown' in st.session_state:
         del st.session_state.celebration_shown
 
+@st.fragment
+@measured("image_panel", instrumented_session)
+def image_panel(current_img):
+    """View mode switch and images; switching modes reruns only this panel"""
+    # View mode selection with custom buttons
+    st.markdown("**View Mode:**")
+    create_view_mode_buttons()
+    st.toggle("Full resolution", key="full_resolution", help="Load the original files instead of display-sized previews")
+    
+    # Display images in container
+    st.markdown('<div class="image-container">', unsafe_allow_html=True)
+    
+    original_ref = images[current_img]['original']
+    processed_ref = images[current_img]['processed']
+    
+    if st.session_state.view_mode == "Side-by-Side":
+        col1, col2 = st.columns(2)
+        
+        with col1:
+            st.markdown("**Original Image**")
+            show_image(display_image(original_ref))
+        
+        with col2:
+            st.markdown("**Background Removal Result**")
+            show_image(display_image(processed_ref, original_ref))
+    
+    elif st.session_state.view_mode == "Original Only":
+        st.markdown("**Original Image**")
+        show_image(display_image(original_ref))
+    
+    elif st.session_state.view_mode in COMPOSITE_MODES:
+        title_col, color_col = st.columns([4, 1])
+        with title_col:
+            st.markdown(f"**Background Removal Result · {st.session_state.view_mode}**")
+        if st.session_state.view_mode == "Solid Color":
+            with color_col:
+                st.color_picker("Background", key="composite_color")
+        elif st.session_state.view_mode == "Edge Errors":
+            with title_col:
+                st.caption("Red marks semi-transparent fringe and kept pixels that match the removed background.")
+        composite_src = composite_image(original_ref, processed_ref)
+        show_image(composite_src if composite_src is not None else display_image(processed_ref, original_ref))
+    
+    else:  # Processed Only
+        st.markdown("**Background Removal Result**")
+        show_image(display_image(processed_ref, original_ref))
+    
+    scores = pair_metrics(images[current_img]['original'], images[current_img]['processed'])
+    if scores is not None:
+        st.caption(format_metrics(scores))
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+@measured("rating_panel", instrumented_session)
+def rating_panel(current_img):
+    """Rating bar, early-stopping notice and navigation; a rating click reruns only this panel"""
+    ahead = peek_images(current_img, 1)
+    upcoming = ahead[0] if ahead else None
+    prefetch_pair(upcoming)
+    
+    # Rating section with horizontal buttons
+    current_rating = st.session_state.ratings.get(current_img, 0)
+    
+    st.markdown("### Rate the quality of the \"Background Removal Result\" image:")
+    duplicates = duplicate_count(current_img)
+    if duplicates:
+        st.caption(f"This rating also counts for {duplicates} near-duplicate image{'s' if duplicates > 1 else ''}.")
+    
+    # Create horizontal rating buttons
+    cols = st.columns(5)
+    
+    for i, scale in enumerate(quality_scales):
+        with cols[i]:
+            button_type = "primary" if current_rating == scale['value'] else "secondary"
+            st.button(
+                f"{scale['value']} - {scale['label']}", 
+                key=f"rating_btn_{current_img}_{scale['value']}", 
+                type=button_type,
+                help=scale['description'],
+                on_click=set_rating,
+                args=(current_img, scale['value'])
+            )
+    
+    # Sequential early stopping
+    if st.session_state.early_stopping:
+        verdict = assess(st.session_state.human_analytics.overall.histogram, st.session_state.error_rate)
+        if verdict is not None and verdict['decision'] is not None:
+            passed = verdict['decision'] == "pass"
+            certainty = verdict['p_pass'] if passed else 1 - verdict['p_pass']
+            st.info(
+                f"The verdict is settled after {verdict['rated']} ratings: the system "
+                f"{'meets' if passed else 'falls below'} the 4.0 threshold with {certainty:.1%} probability."
+            )
+            if st.button("Finish Early", key="finish_early"):
+                complete_evaluation()
+                st.rerun()
+    
+    # Navigation section - positioned at bottom right
+    st.markdown('<div class="nav-button-container">', unsafe_allow_html=True)
+    st.markdown('<div class="nav-button-right">', unsafe_allow_html=True)
+    
+    if upcoming is not None:
+        # Next button - blue if rating selected, gray if not
+        button_type = "primary" if current_rating > 0 else "secondary"
+        disabled = current_rating == 0
+        
+        if st.button("Next →", type=button_type, key=f"next_{current_img}", disabled=disabled):
+            log_event(NEXT, current_img)
+            # Lease the image actually shown; the one looked ahead at may have gone to another annotator
+            shown = next_image()
+            st.session_state.current_image = upcoming if shown is None else shown
+            st.rerun()
+    else:
+        # Submit button - blue if rating selected, gray if not
+        button_type = "primary" if current_rating > 0 else "secondary"
+        disabled = current_rating == 0
+        
+        if st.button("✨ Submit", type=button_type, key=f"submit_{current_img}", disabled=disabled):
+            log_event(NEXT, current_img)
+            complete_evaluation()
+            st.rerun()
+    
+    st.markdown('</div>', unsafe_allow_html=True)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+@measured("rapid_panel", instrumented_session)
+def rapid_panel():
+    """Keyboard rating of preloaded pairs; only this panel reruns when a batch arrives"""
+    apply_rapid_ratings()
+    # The browser reports when rapid-mode pairs are shown
+    st.session_state.shown_image = None
+    queue = upcoming_images(WINDOW)
+    rated = len(st.session_state.ratings)
+    if not queue:
+        complete_evaluation()
+        st.rerun()
+    
+    st.progress(rated / len(images))
+    rapid_annotator(
+        rapid_items(queue),
+        session=st.session_state.session_id,
+        acked=st.session_state.rapid_acked,
+        rated=rated,
+        total=len(images),
+        scale=[{"value": scale['value'], "label": scale['label'], "color": scale['color']} for scale in quality_scales],
+        key="rapid_annotator",
+    )
+
+def show_model_ranking(rows):
+    """Ranking table: Elo-scale Bradley-Terry rating, win rate and comparisons per model"""
+    st.table([
+        {
+            "Rank": rank,
+            "Model": row['model'],
+            "Elo": round(row['elo']),
+            "Win rate": f"{row['win_rate']:.0%}" if row['comparisons'] else "n/a",
+            "Comparisons": row['comparisons'],
+        }
+        for rank, row in enumerate(rows, 1)
+    ])
+
+COMPARE_COLUMNS = 4
+
+@st.fragment
+@measured("comparison_panel", instrumented_session)
+def comparison_panel():
+    """Results from several models for one original, picked blind; a vote reruns only this panel"""
+    sets = load_comparison_sets()
+    if not sets:
+        st.info("Comparing models needs originals with results from more than one model: "
+                "add manifest records that share an `original` and differ in `model`.")
+        return
+    
+    position = st.session_state.compare_position
+    if position >= len(sets):
+        st.success(f"All {len(sets)} comparison sets have been judged. Thank you!")
+    else:
+        candidates = candidate_order(position)
+        log_shown(candidates[0])
+        st.progress(position / len(sets))
+        st.markdown(f"**Comparison {position + 1} of {len(sets)}: {images[candidates[0]]['name']}** · "
+                    "pick the result you would rather use, and optionally score each one")
+        
+        tiles = [None] + candidates
+        for row in range(0, len(tiles), COMPARE_COLUMNS):
+            for col, index in zip(st.columns(COMPARE_COLUMNS), tiles[row:row + COMPARE_COLUMNS]):
+                with col:
+                    if index is None:
+                        st.markdown("**Original Image**")
+                        show_image(display_image(images[candidates[0]]['original']))
+                        continue
+                    letter = chr(ord("A") + candidates.index(index))
+                    st.markdown(f"**Result {letter}**")
+                    show_image(display_image(images[index]['processed'], images[index]['original']))
+                    st.button(f"Prefer {letter}", key=f"prefer_{position}_{index}", type="primary",
+                              on_click=record_preference, args=(position, index))
+                    current = st.session_state.ratings.get(index)
+                    st.selectbox(
+                        "Score (optional)",
+                        [None] + [scale['value'] for scale in quality_scales],
+                        index=current or 0,
+                        format_func=lambda value: "–" if value is None else f"{value} - {quality_scales[value-1]['label']}",
+                        key=f"compare_score_{index}",
+                        on_change=set_candidate_score,
+                        args=(index,)
+                    )
+        
+        st.button("No preference", key=f"no_preference_{position}",
+                  on_click=record_preference, args=(position, None))
+    
+    with st.expander("Model ranking"):
+        rows = model_ranking()
+        if rows:
+            show_model_ranking(rows)
+        else:
+            st.caption("The ranking appears once comparisons have been recorded.")
+
+def debug_panel(limit=20):
+    """Sidebar table of this session's most recent rerun timings; only offered when instrumentation is on"""
+    if recorder() is None or not st.sidebar.toggle("Debug panel", key="debug_panel"):
+        return
+    reruns = recorder().recent(session_key())[:limit]
+    st.sidebar.markdown("**Recent reruns** (ms)")
+    if not reruns:
+        st.sidebar.caption("No finished reruns yet.")
+    else:
+        st.sidebar.table([
+            {
+                "Run": rerun['kind'],
+                "Total": round(rerun['seconds'] * 1000, 1),
+                "KiB sent": round(rerun['counters'].get('bytes_sent', 0) / 1024, 1),
+                **{name: round(seconds * 1000, 1) for name, seconds in rerun['sections'].items()},
+            }
+            for rerun in reruns
+        ])
+    with st.sidebar.expander("Prometheus metrics"):
+        st.code(recorder().prometheus_text(), language="text")
+
+@st.fragment
+@measured("breakdown_panel", instrumented_session)
+def breakdown_panel():
+    """Score distributions per category, model or annotator; switching views reruns only this panel"""
+    st.markdown("### Breakdowns")
+    scope_col, group_col = st.columns(2)
+    with scope_col:
+        scope = st.selectbox("Ratings", ["This evaluation", "All evaluations"], key="breakdown_scope")
+    with group_col:
+        group = st.selectbox("Group by", list(BREAKDOWN_GROUPS), key="breakdown_group")
+    
+    figures = breakdown_view(scope, BREAKDOWN_GROUPS[group])
+    if not figures:
+        st.caption(f"No {group.lower()} information for these ratings; add a `{BREAKDOWN_GROUPS[group]}` field to the manifest.")
+    for fig in figures:
+        with section("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+
+DWELL_GROUPS = {"Image": "image", "Category": "category", "Annotator": "annotator"}
+DWELL_ROWS = 15
+
+@st.fragment
+@measured("rating_time_panel", instrumented_session)
+def rating_time_panel():
+    """Slowest images, categories or annotators by dwell time; switching views reruns only this panel"""
+    st.markdown("### Rating Time")
+    report = dwell_report()
+    overall = report['overall']
+    if overall is None:
+        st.caption("Rating times appear once images have been shown and rated.")
+        return
+    labels = [quantile_label(q) for q in QUANTILES]
+    
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Median time per image", f"{overall[labels[0]]:.1f} s")
+    with col2:
+        st.metric(f"{labels[-1]} time per image", f"{overall[labels[-1]]:.1f} s")
+    with col3:
+        rate = report['ratings_per_hour']
+        st.metric("Ratings per active hour", f"{rate:.0f}" if rate else "n/a")
+    
+    group = st.selectbox("Slowest by", list(DWELL_GROUPS), key="dwell_group")
+    rows = report[DWELL_GROUPS[group]][:DWELL_ROWS]
+    if not rows:
+        st.caption(f"No {group.lower()} information for these events; add a `{DWELL_GROUPS[group]}` field to the manifest.")
+    else:
+        st.table([
+            {
+                "Image ID" if group == "Image" else group: row['key'],
+                "Images timed": row['timed'],
+                **{f"{label} (s)": round(row[label], 1) for label in labels},
+                "View switches": round(row['view_switches'], 2),
+                "Rating changes": row['rating_changes'],
+                **({"Ratings per hour": round(row['ratings_per_hour']) if row['ratings_per_hour'] else "n/a"}
+                   if group == "Annotator" else {}),
+            }
+            for row in rows
+        ])
+    st.caption(f"Time from an image appearing until the next one, over every session. "
+               f"{report['breaks']} visits longer than {IDLE_SECONDS // 60} minutes count as breaks and are left out.")
+
+EXPORT_TABLES = {"Ratings": "ratings", "Per-image scores": "images", "Analysis": "analysis"}
+EXPORT_FORMATS = {"CSV": "csv", "Parquet": "parquet", "Arrow IPC": "arrow"}
+
+def attribute_values(position):
+    """Sorted distinct categories (0) or models (1) in the manifest"""
+    return sorted({attributes[position] for attributes in image_attributes().values()} - {None}, key=str)
+
+@st.fragment
+@measured("export_panel", instrumented_session)
+def export_panel():
+    """Filtered ratings, per-image scores or analysis as a file; each export is written once per ratings version"""
+    st.markdown("### Export")
+    table_col, format_col, scope_col = st.columns(3)
+    with table_col:
+        table = st.selectbox("Data", list(EXPORT_TABLES), key="export_table")
+    with format_col:
+        fmt = st.selectbox("Format", list(EXPORT_FORMATS), key="export_format")
+    with scope_col:
+        scope = st.selectbox("Ratings", ["This evaluation", "All evaluations"], key="export_scope")
+    since_col, until_col, model_col, category_col = st.columns(4)
+    with since_col:
+        since = st.date_input("From", value=None, key="export_since")
+    with until_col:
+        until = st.date_input("Until", value=None, key="export_until")
+    with model_col:
+        models = st.multiselect("Models", attribute_values(1), key="export_models")
+    with category_col:
+        categories = st.multiselect("Categories", attribute_values(0), key="export_categories")
+    
+    table, fmt = EXPORT_TABLES[table], EXPORT_FORMATS[fmt]
+    options = {
+        "lookup": image_attributes(),
+        "sessions": [st.session_state.session_id] if scope == "This evaluation" else None,
+        "since": parse_time(since.isoformat()) if since else None,
+        "until": parse_time(until.isoformat(), end=True) if until else None,
+        "models": set(models) or None,
+        "categories": set(categories) or None,
+        "total_images": manifest_size(),
+        "duplicates": image_duplicates(),
+    }
+    store = get_ratings_store()
+    
+    def name():
+        digest = version_hash(table, fmt, scope, st.session_state.session_id, since, until,
+                              sorted(models), sorted(categories), len(images), store.version())
+        return f"{table}-{digest}{EXTENSIONS[fmt]}"
+    
+    path = os.path.join(DEFAULT_EXPORT_DIR, name())
+    if not os.path.exists(path) and st.button("Prepare export", key="export_prepare"):
+        # Include this session's queued ratings
+        store.flush()
+        with st.spinner("Exporting..."), section("export"):
+            path = export_file(name(), table, fmt, store, **options)
+    if os.path.exists(path):
+        size = os.path.getsize(path)
+        label = f"{size / 1e6:.1f} MB" if size >= 1e6 else f"{size / 1e3:.0f} KB"
+        with open(path, "rb") as f:
+            st.download_button(f"⬇️ Download ({label})", f, file_name=f"{table}{EXTENSIONS[fmt]}", mime=MIME_TYPES[fmt], key="export_download")
+    st.caption("Ratings are every stored rating, including changed ones. Per-image scores and the analysis "
+               "count each session's current rating. `python export.py` runs the same export from the command line.")
+
 # Main application logic
 if st.session_state.show_analysis:
     # Analysis Page
-    analysis = calculate_analysis()
+    analysis, fig = dashboard_data()
     
     st.markdown('<h1 class="main-header">Evaluation Dashboard</h1>', unsafe_allow_html=True)
     st.markdown('<p class="sub-header">Performance evaluation dashboard</p>', unsafe_allow_html=True)
@@ -468,7 +1334,7 @@ if st.session_state.show_analysis:
     with col1:
         st.metric(
             label="Images Evaluated",
-            value=analysis['total_images']
+            value=analysis['rated']
         )
     
     with col2:
@@ -485,42 +1351,68 @@ if st.session_state.show_analysis:
             value=status
         )
     
-    # Rating Distribution Chart
-    st.markdown("### Rating Distribution")
-    
-    # Create distribution chart with React colors
-    rating_labels = [f"{i} - {quality_scales[i-1]['label']}" for i in range(1, 6)]
-    distribution_values = [analysis['distribution'][i] for i in range(1, 6)]
-    colors = [quality_scales[i-1]['color'] for i in range(1, 6)]
-    
-    fig = px.bar(
-        x=rating_labels,
-        y=distribution_values,
-        title="Distribution of Quality Ratings",
-        labels={'x': 'Rating Category', 'y': 'Number of Images'},
-        color=rating_labels,
-        color_discrete_sequence=colors
-    )
-    
-    fig.update_layout(
-        showlegend=False,
-        height=400,
-        title_x=0.5
+    confidence = assess(st.session_state.human_analytics.overall.histogram)
+    st.caption(
+        f"95% credible interval for the average: {confidence['mean_interval'][0]:.2f}–{confidence['mean_interval'][1]:.2f} · "
+        f"high-quality share: {confidence['high_quality_interval'][0]:.0f}–{confidence['high_quality_interval'][1]:.0f}% · "
+        f"probability the true average is at least 4.0: {confidence['p_pass']:.0%}"
     )
     
-    # Add percentage annotations
-    for i, v in enumerate(distribution_values):
-        if v > 0:
-            percentage = analysis['distribution_percent'][i+1]
-            fig.add_annotation(
-                x=i,
-                y=v + 0.1,
-                text=f"{percentage:.1f}%",
-                showarrow=False,
-                font=dict(size=12, color="black")
+    chart_col, agreement_col = st.columns([2, 1])
+    
+    with chart_col:
+        # Rating Distribution Chart
+        st.markdown("### Rating Distribution")
+    
+        with section("plotly_chart"):
+            st.plotly_chart(fig, use_container_width=True)
+    
+    with agreement_col:
+        st.markdown("### Annotator Agreement")
+        agreement = load_agreement()
+        if agreement is None or agreement['multi_rated_images'] == 0:
+            st.caption("Agreement appears once images have been rated by at least two annotators.")
+        else:
+            st.metric("Krippendorff's α (ordinal)", format_agreement(agreement['krippendorff_alpha']))
+            st.metric("Fleiss' κ", format_agreement(agreement['fleiss_kappa']))
+            st.metric("Mean weighted Cohen's κ", format_agreement(agreement['mean_weighted_kappa']))
+            st.caption(
+                f"{agreement['raters']} annotators · {agreement['multi_rated_images']} of "
+                f"{agreement['images']} images rated more than once"
             )
+            if agreement['most_disputed']:
+                st.markdown("**Most disputed images**")
+                st.table([
+                    {"Image ID": row['image_id'], "Ratings": row['ratings'], "Score std": f"{row['std']:.2f}"}
+                    for row in agreement['most_disputed']
+                ])
+    
+    breakdown_panel()
+    rating_time_panel()
+    
+    # Pairwise model ranking from the comparison mode
+    ranking = model_ranking()
+    if ranking:
+        st.markdown("### Model Ranking")
+        show_model_ranking(ranking)
+        st.caption("Bradley-Terry strengths fitted to every pairwise preference, on the Elo scale "
+                   "(a 400-point gap means 10:1 odds of being preferred).")
+    
+    # Objective metrics vs. human ratings
+    st.markdown("### Objective Metrics vs. Human Ratings")
+    correlations = analysis['metric_correlations']
+    if any(value is not None for value in correlations.values()):
+        st.table([
+            {
+                "Metric": METRIC_LABELS[name],
+                "Spearman ρ": f"{correlations[name]:+.2f}" if correlations[name] is not None else "n/a",
+            }
+            for name in METRIC_NAMES
+        ])
+    else:
+        st.caption("At least three scored images with varied ratings are needed to correlate metrics with human scores.")
     
-    st.plotly_chart(fig, use_container_width=True)
+    export_panel()
     
     # Action buttons
     col1, col2 = st.columns(2)
@@ -545,6 +1437,11 @@ elif st.session_state.evaluation_complete:
         if st.button("🔄 Start New Evaluation", type="secondary"):
             reset_evaluation()
             st.rerun()
+    
+    # The page above is already on its way to the browser; use the time the
+    # celebration plays to build the dashboard so "View Analysis" is instant
+    dashboard_data()
+    load_agreement()
 
 else:
     # Main Evaluation Page
@@ -562,85 +1459,61 @@ else:
     </div>
     """, unsafe_allow_html=True)
     
-    # Progress
-    current_img = st.session_state.current_image
-    total_imgs = len(images)
-    progress = (current_img + 1) / total_imgs
-    
-    st.progress(progress)
-    st.markdown(f"**Image {current_img + 1} of {total_imgs}: {images[current_img]['name']}**")
-    
-    # View mode selection with custom buttons
-    st.markdown("**View Mode:**")
-    create_view_mode_buttons()
-    
-    # Display images in container
-    st.markdown('<div class="image-container">', unsafe_allow_html=True)
-    
-    if st.session_state.view_mode == "Side-by-Side":
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.markdown("**Original Image**")
-            st.image(images[current_img]['original'], use_container_width=True)
-        
-        with col2:
-            st.markdown("**Background Removal Result**")
-            st.image(images[current_img]['processed'], use_container_width=True)
-    
-    elif st.session_state.view_mode == "Original Only":
-        st.markdown("**Original Image**")
-        st.image(images[current_img]['original'], use_container_width=True)
-    
-    else:  # Processed Only
-        st.markdown("**Background Removal Result**")
-        st.image(images[current_img]['processed'], use_container_width=True)
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    
-    # Rating section with horizontal buttons
-    current_rating = st.session_state.ratings.get(current_img, 0)
-    
-    st.markdown("### Rate the quality of the \"Background Removal Result\" image:")
-    
-    # Create horizontal rating buttons
-    cols = st.columns(5)
-    
-    for i, scale in enumerate(quality_scales):
-        with cols[i]:
-            button_type = "primary" if current_rating == scale['value'] else "secondary"
-            if st.button(
-                f"{scale['value']} - {scale['label']}", 
-                key=f"rating_btn_{current_img}_{scale['value']}", 
-                type=button_type,
-                help=scale['description']
-            ):
-                st.session_state.ratings[current_img] = scale['value']
-                st.rerun()
-    
-    # Navigation section - positioned at bottom right
-    st.markdown('<div class="nav-button-container">', unsafe_allow_html=True)
-    st.markdown('<div class="nav-button-right">', unsafe_allow_html=True)
-    
-    current_rating = st.session_state.ratings.get(current_img, 0)
+    st.sidebar.text_input("Annotator", key="annotator", help="Recorded with every rating in this session")
+    st.sidebar.selectbox(
+        "Image order",
+        [cls.name for cls in SCHEDULERS + (QueueScheduler,)],
+        key="scheduler",
+        on_change=scheduler_changed,
+        help="Linear follows the manifest; Stratified balances categories; Uncertainty rates where the verdict is least "
+             "certain; Shared queue splits the images between annotators working at the same time"
+    )
+    if uses_work_queue():
+        at_target, total, leased = queue_progress()
+        st.sidebar.caption(f"Shared queue: {at_target} of {total} images at target ({get_work_queue().target} ratings each), "
+                           f"{leased} out with annotators")
+    st.sidebar.toggle(
+        "Rapid mode",
+        key="rapid_mode",
+        on_change=rapid_mode_changed,
+        help="Rate with the 1-5 keys; images are preloaded and ratings are sent in batches"
+    )
+    st.sidebar.toggle(
+        "Compare models",
+        key="compare_mode",
+        help="Pick the best of several models' results for the same original"
+    )
+    st.sidebar.toggle(
+        "Early stopping",
+        key="early_stopping",
+        help="Offer to finish once the pass/fail verdict is statistically settled"
+    )
+    if st.session_state.early_stopping:
+        st.sidebar.select_slider(
+            "Allowed error rate",
+            options=[0.01, 0.025, 0.05, 0.1, 0.2],
+            key="error_rate",
+            format_func=lambda rate: f"{rate:.1%}"
+        )
     
-    if current_img < total_imgs - 1:
-        # Next button - blue if rating selected, gray if not
-        button_type = "primary" if current_rating > 0 else "secondary"
-        disabled = current_rating == 0
-        
-        if st.button("Next →", type=button_type, key=f"next_{current_img}", disabled=disabled):
-            st.session_state.current_image += 1
-            st.rerun()
+    if st.session_state.rapid_mode:
+        rapid_panel()
+    elif st.session_state.compare_mode:
+        comparison_panel()
     else:
-        # Submit button - blue if rating selected, gray if not
-        button_type = "primary" if current_rating > 0 else "secondary"
-        disabled = current_rating == 0
+        # Progress
+        current_img = st.session_state.current_image
+        total_imgs = len(images)
+        seen = len(st.session_state.ratings) + (0 if current_img in st.session_state.ratings else 1)
+        progress = seen / total_imgs
         
-        if st.button("✨ Submit", type=button_type, key=f"submit_{current_img}", disabled=disabled):
-            st.session_state.evaluation_complete = True
-            st.rerun()
-    
-    st.markdown('</div>', unsafe_allow_html=True)
-    st.markdown('</div>', unsafe_allow_html=True)
+        st.progress(progress)
+        st.markdown(f"**Image {seen} of {total_imgs}: {images[current_img]['name']}**")
+        
+        log_shown(current_img)
+        image_panel(current_img)
+        rating_panel(current_img)
     
+
+debug_panel()
+end_rerun()
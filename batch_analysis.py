@@ -0,0 +1,172 @@
+"""Headless evaluation analysis over exported rating records.
+
+Reads rating records from JSONL, CSV or Parquet files with the columns of the
+ratings log: ``session``, ``image_id``, ``score``, ``ts``, and optionally
+``annotator``, ``category`` and ``model``. It produces the analysis the
+dashboard shows (average, pass status, distribution and executive summary),
+grouped by session, annotator, model or category, or over everything. As in
+the app, only the latest rating of each image within a session counts.
+
+Files are split into row ranges that worker processes parse in parallel. Each
+range yields only the latest rating per (session, image) it saw, so memory
+grows with the number of distinct ratings rather than the size of the input.
+A category or model missing from the records is looked up in the manifest by
+image id. If ``dedupe.py`` has grouped the manifest's near-duplicates, each
+representative's rating also counts for the images it stands for. This module
+does not import Streamlit::
+
+    python batch_analysis.py ratings.jsonl --by session model --manifest manifest.jsonl --workers 8
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from analytics import BREAKDOWN_FIELDS, RatingAggregate, summarize
+from dataset import Dataset, open_reader
+from dedupe import duplicate_ids, load_dupes
+
+GROUPINGS = ("overall", "session", "annotator") + BREAKDOWN_FIELDS
+CHUNK_ROWS = 50_000
+
+
+def _read_range(task):
+    """Latest ``(ts, score, annotator, category, model)`` per (session, image id) in rows [start, stop) of a file"""
+    path, start, stop = task
+    latest = {}
+    for row in open_reader(path).read(start, stop):
+        key = (str(row["session"]), str(row["image_id"]))
+        ts = float(row["ts"])
+        current = latest.get(key)
+        if current is None or ts >= current[0]:
+            latest[key] = (ts, int(row["score"]), row.get("annotator") or None,
+                           row.get("category") or None, row.get("model") or None)
+    return latest
+
+
+def latest_ratings(paths, workers=None, chunk_rows=CHUNK_ROWS):
+    """Current rating of every (session, image id) across the given files, later rows winning ties"""
+    tasks = []
+    for path in paths:
+        # Opening once here builds the offset index the workers then share
+        total = len(open_reader(path))
+        tasks += [(path, start, min(total, start + chunk_rows)) for start in range(0, total, chunk_rows)]
+
+    merged = {}
+    pool = ProcessPoolExecutor(max_workers=workers) if workers != 1 and len(tasks) > 1 else None
+    try:
+        for partial in (pool.map(_read_range, tasks) if pool else map(_read_range, tasks)):
+            for key, value in partial.items():
+                current = merged.get(key)
+                if current is None or value[0] >= current[0]:
+                    merged[key] = value
+    finally:
+        if pool:
+            pool.shutdown()
+    return merged
+
+
+def manifest_lookup(path, chunk_size=4096):
+    """``{image id: (category, model)}`` for every record in a manifest, and the manifest length"""
+    dataset = Dataset(path)
+    lookup = {}
+    for _, records in dataset.iter_chunks(chunk_size):
+        for record in records:
+            lookup[str(record["id"])] = (record["category"], record["model"])
+    return lookup, len(dataset)
+
+
+def with_duplicates(items, duplicates):
+    """Stream current ratings, then each representative's rating copied to its near-duplicates
+
+    ``items`` are ``((session, image id), (ts, score, annotator, category,
+    model))`` pairs. A near-duplicate's own rating in a session wins over the
+    copy. Copies carry no category or model, so ``analyze`` looks up the
+    near-duplicate's own. Only the copies are held until the input ends.
+    """
+    members = {member for group in duplicates.values() for member in group}
+    copies, rated = {}, set()
+    for key, value in items:
+        yield key, value
+        session, image_id = key
+        if image_id in members:
+            rated.add(key)
+        for duplicate in duplicates.get(image_id, ()):
+            copies[(session, duplicate)] = value[:3] + (None, None)
+    for key, value in copies.items():
+        if key not in rated:
+            yield key, value
+
+
+def attach_duplicates(latest, duplicates):
+    """Copy each representative's current ratings to its near-duplicates, unless they were rated themselves"""
+    return dict(with_duplicates(latest.items(), duplicates))
+
+
+def analyze(latest, groupings=("session",), lookup=None, total_images=None):
+    """Yield one analysis dict per group, as ``summarize`` builds it for the dashboard
+
+    ``latest`` maps (session, image id) to ``(ts, score, annotator, category,
+    model)``, or is an iterable of such pairs that is read once.
+    """
+    aggregates = {grouping: {} for grouping in groupings}
+    rated = set() if total_images is None else None
+    items = latest.items() if isinstance(latest, dict) else latest
+    for (session, image_id), (_, score, annotator, category, model) in items:
+        if rated is not None:
+            rated.add(image_id)
+        if lookup is not None and (category is None or model is None):
+            known_category, known_model = lookup.get(image_id, (None, None))
+            category = category or known_category
+            model = model or known_model
+        keys = {"overall": "all", "session": session, "annotator": annotator, "category": category, "model": model}
+        for grouping in groupings:
+            key = keys[grouping]
+            if key is None:
+                continue
+            aggregate = aggregates[grouping].get(key)
+            if aggregate is None:
+                aggregate = aggregates[grouping][key] = RatingAggregate()
+            aggregate.add(score)
+
+    if total_images is None:
+        total_images = len(rated)
+    for grouping in groupings:
+        for key in sorted(aggregates[grouping], key=str):
+            yield {"group": grouping, "key": key, **summarize(aggregates[grouping][key], total_images)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluation analysis over exported rating records")
+    parser.add_argument("inputs", nargs="+", help="JSONL, CSV or Parquet rating files")
+    parser.add_argument("--by", nargs="+", choices=GROUPINGS, default=["session"])
+    parser.add_argument("--manifest", help="fill in category/model and the image count from this manifest")
+    parser.add_argument("--total-images", type=int, help="images in the evaluation (default: manifest length or images rated)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--output", default="-", help="JSONL output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    lookup, total_images = manifest_lookup(args.manifest) if args.manifest else (None, None)
+    latest = latest_ratings(args.inputs, args.workers, args.chunk_rows)
+    representative = load_dupes(args.manifest) if args.manifest else None
+    if representative is not None:
+        latest = attach_duplicates(latest, duplicate_ids(Dataset(args.manifest), representative))
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        groups = 0
+        for result in analyze(latest, args.by, lookup, args.total_images or total_images):
+            out.write(json.dumps(result) + "\n")
+            groups += 1
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(f"{len(latest)} current ratings, {groups} groups in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""Check incremental analytics against the original full recomputation.
+
+Replays ``--trials`` random sessions of ``--steps`` actions each over
+``--images`` pairs spread across categories and models. Each action rates an
+unrated image, re-rates a rated one, or clears a rating. After every action,
+``AnalyticsEngine.snapshot()`` is checked against ``calculate_analysis`` as the
+app computed it before the engine: from every current score, for the session
+and for each category and model::
+
+    python -m benchmarks.bench_analytics --trials 200 --steps 300
+"""
+
+import argparse
+import os
+import random
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from analytics import BREAKDOWN_FIELDS, AnalyticsEngine  # noqa: E402
+
+CATEGORIES = ("Portrait", "Product", "Food", "Hair")
+MODELS = ("model-a", "model-b", "model-c")
+
+
+def calculate_analysis(ratings, total_images):
+    """The dashboard analysis as computed before the incremental engine, from every current score"""
+    if not ratings:
+        return None
+
+    scores = list(ratings.values())
+    average = sum(scores) / len(scores)
+    percentage = (average / 5) * 100
+
+    distribution = {i: scores.count(i) for i in range(1, 6)}
+    total = len(scores)
+    distribution_percent = {i: (distribution[i] / total) * 100 if total > 0 else 0 for i in range(1, 6)}
+
+    high_quality = distribution_percent[4] + distribution_percent[5]
+    low_quality = distribution_percent[1] + distribution_percent[2]
+    passes = average >= 4
+
+    if passes and high_quality >= 80:
+        summary = "The background removal system demonstrates excellent performance with the majority of results meeting production standards. This technology is ready for enterprise deployment with minimal quality concerns."
+    elif passes and high_quality >= 60:
+        summary = "The background removal system shows strong performance with most results approaching production readiness. Minor refinements could further improve consistency across diverse image types."
+    elif average >= 3 and low_quality <= 30:
+        summary = "The background removal system delivers moderately functional results that can accelerate production workflows. Additional development is recommended to achieve consistent enterprise-grade quality standards."
+    elif low_quality >= 50:
+        summary = "The background removal system shows significant limitations with many results requiring substantial manual correction. Major algorithmic improvements are needed before enterprise deployment."
+    else:
+        summary = "The background removal system produces mixed results with inconsistent quality across different image types. Further optimization is required to meet enterprise production standards."
+
+    threshold_text = " The system meets the production readiness threshold with scores exceeding the required 4.0 (80%) standard." if passes else " The system falls below the production readiness threshold, which requires an average score of at least 4.0 (80%)."
+
+    performance_context = " A significant portion of results demonstrate moderate performance, indicating potential for improvement with targeted optimization." if distribution_percent[3] >= 50 else ""
+
+    summary += threshold_text + performance_context
+
+    return {
+        'average': average,
+        'percentage': percentage,
+        'passes': passes,
+        'distribution': distribution,
+        'distribution_percent': distribution_percent,
+        'summary': summary,
+        'rated': total,
+        'total_images': total_images
+    }
+
+
+def expected_snapshot(ratings, records, total_images):
+    """Overall and per-category/per-model analyses recomputed from scratch"""
+    analysis = calculate_analysis(ratings, total_images)
+    if analysis is None:
+        return None
+    analysis["breakdowns"] = {}
+    for field in BREAKDOWN_FIELDS:
+        groups = {}
+        for index, score in ratings.items():
+            groups.setdefault(records[index][field], {})[index] = score
+        analysis["breakdowns"][field] = {key: calculate_analysis(group, total_images) for key, group in groups.items()}
+    return analysis
+
+
+def replay(rng, records, steps):
+    """One random session; returns the first step whose snapshot differs, or None"""
+    engine = AnalyticsEngine(len(records))
+    ratings = {}
+    for step in range(steps):
+        action = rng.random()
+        if not ratings or (action < 0.5 and len(ratings) < len(records)):
+            index = rng.choice([i for i in range(len(records)) if i not in ratings])
+            old, new = None, rng.randint(1, 5)
+        elif action < 0.8:
+            index = rng.choice(list(ratings))
+            old, new = ratings[index], rng.randint(1, 5)
+        else:
+            index = rng.choice(list(ratings))
+            old, new = ratings[index], None
+
+        if new is None:
+            del ratings[index]
+        else:
+            ratings[index] = new
+        engine.update(old, new, records[index])
+        if engine.snapshot() != expected_snapshot(ratings, records, len(records)):
+            return step
+    return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--steps", type=int, default=300, help="actions per session")
+    parser.add_argument("--images", type=int, default=120)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = random.Random(args.seed)
+    records = [{"category": CATEGORIES[i % len(CATEGORIES)], "model": MODELS[i % len(MODELS)]}
+               for i in range(args.images)]
+    failures = []
+    for trial in range(args.trials):
+        step = replay(rng, records, args.steps)
+        if step is not None:
+            failures.append((trial, step))
+
+    print(f"{args.trials} sessions x {args.steps} actions over {args.images} images")
+    print(f"snapshots match calculate_analysis after every action: {not failures}")
+    if failures:
+        trial, step = failures[0]
+        sys.exit(f"{len(failures)} sessions differ, first in session {trial} at action {step}")
+
+
+if __name__ == "__main__":
+    main()
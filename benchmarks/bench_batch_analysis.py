@@ -0,0 +1,224 @@
+"""Throughput of the headless batch analysis, and parity with the dashboard.
+
+Writes a synthetic rating log (many sessions, some images re-rated) as JSONL,
+CSV or Parquet and runs ``batch_analysis.py`` on it once per worker count,
+reporting rating rows per second. It also confirms the CLI never imports
+Streamlit::
+
+    python -m benchmarks.bench_batch_analysis --sessions 2000 --format parquet --workers 1 2 4
+
+``--check-app`` also rates a session through ``app.py`` with ``AppTest``,
+exports that session's rows from the ratings database, and checks that the
+batch analysis and the app's analysis export reproduce the dashboard's
+numbers and summary exactly. It does this twice: once for a plain manifest,
+and once for a manifest with near-duplicates grouped by ``dedupe.py``. There each rating also counts for
+the representative's duplicates, while the session's human-only counts (used
+by the sequential test and the schedulers) hold one rating per click. Each
+check runs in a fresh interpreter, because the app's modules read their paths
+from the environment on import.
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metrics_store import make_pairs  # noqa: E402
+
+ANALYSIS_FIELDS = ("average", "percentage", "passes", "distribution", "distribution_percent", "summary",
+                   "rated", "total_images")
+COLUMNS = ("annotator", "session", "image_index", "image_id", "score", "ts", "category", "model")
+
+
+def make_ratings(path, sessions, images, rerate=0.1, seed=0):
+    """Synthetic rating log in the format implied by ``path``'s extension; returns the row count"""
+    rng = np.random.default_rng(seed)
+    categories = np.array(["Portrait", "Product", "Food", "Hair"])
+    models = np.array(["model-a", "model-b", "model-c"])
+    rows = []
+    for s in range(sessions):
+        rated = rng.integers(1, images + 1)
+        indices = rng.permutation(images)[:rated]
+        indices = np.concatenate([indices, rng.choice(indices, int(rated * rerate))])
+        scores = np.clip(np.round(rng.normal(rng.uniform(2.5, 4.5), 1.0, len(indices))), 1, 5).astype(int)
+        ts = 1.7e9 + s * 3600 + np.arange(len(indices))
+        for index, score, stamp in zip(indices, scores, ts):
+            rows.append((f"annotator-{s % 97}", f"session-{s:06d}", int(index), str(index), int(score), float(stamp),
+                         str(categories[index % len(categories)]), str(models[index % len(models)])))
+
+    if path.endswith(".parquet"):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        table = pa.table({name: [row[i] for row in rows] for i, name in enumerate(COLUMNS)})
+        pq.write_table(table, path, row_group_size=50_000)
+    elif path.endswith(".csv"):
+        import csv
+
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            writer.writerows(rows)
+    else:
+        with open(path, "w") as f:
+            for row in rows:
+                f.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+    return len(rows)
+
+
+def imports_streamlit():
+    out = subprocess.run([sys.executable, "-c", "import sys, batch_analysis; print('streamlit' in sys.modules)"],
+                         check=True, capture_output=True, text=True, cwd=ROOT)
+    return out.stdout.strip() == "True"
+
+
+def add_duplicates(manifest, directory, copies=(0, 3)):
+    """Append resized copies of some pairs to a manifest and group them with ``dedupe.py``"""
+    from PIL import Image
+
+    with open(manifest) as f:
+        records = [json.loads(line) for line in f]
+    with open(manifest, "a") as f:
+        for n, i in enumerate(copies):
+            copy = {"id": len(records) + n, "name": f"copy of pair {i}"}
+            for field in ("original", "processed"):
+                with Image.open(records[i][field]) as im:
+                    resized = im.resize((im.width * 3 // 4, im.height * 3 // 4), Image.LANCZOS)
+                    copy[field] = os.path.join(directory, f"copy_{i}_{os.path.basename(records[i][field])}")
+                    resized.save(copy[field], quality=85) if field == "original" else resized.save(copy[field])
+            f.write(json.dumps(copy) + "\n")
+    subprocess.run([sys.executable, os.path.join(ROOT, "dedupe.py"), "--manifest", manifest, "--workers", "1", "--json"],
+                   check=True, capture_output=True, cwd=ROOT)
+
+
+def check_app(directory, duplicates=False):
+    """Rate a session in the app and compare its dashboard analysis with the batch result"""
+    from streamlit.testing.v1 import AppTest
+
+    manifest = make_pairs(directory, 8 if not duplicates else 6, size=(640, 480))
+    if duplicates:
+        add_duplicates(manifest, directory)
+    db = os.path.join(directory, "ratings.sqlite3")
+    os.environ.update(
+        BRE_MANIFEST=manifest,
+        BRE_CACHE_DIR=os.path.join(directory, "cache"),
+        BRE_PREVIEW_DIR=os.path.join(directory, "previews"),
+        BRE_METRICS_DB=os.path.join(directory, "metrics.sqlite3"),
+        BRE_RATINGS_DB=db,
+    )
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    scores = (5, 4, 2, 4, 3, 5, 4, 1)
+    shown = len(scores) - 2 if duplicates else len(scores)
+    for score in scores[:shown]:
+        current = at.session_state.current_image
+        at.button(f"rating_btn_{current}_{score}").click().run()
+        if current == 2:
+            # Change a rating; only the latest may count
+            at.button(f"rating_btn_{current}_5").click().run()
+        navigation = f"next_{current}" if any(b.key == f"next_{current}" for b in at.button) else f"submit_{current}"
+        at.button(navigation).click().run()
+    at.button[0].click().run()  # View Analysis
+    dashboard = at.session_state.dashboard_cache[2]
+    session = at.session_state.session_id
+    # Copies count in the dashboard totals, but the sequential test and schedulers see one rating per click
+    human = at.session_state.human_analytics.overall.count
+    if human != shown:
+        raise SystemExit(f"{human} ratings counted as independent, {shown} given")
+
+    # The store commits in the background; wait for every rating row to land
+    expected = shown + 1
+    for _ in range(50):
+        with sqlite3.connect(db) as conn:
+            rows = conn.execute("SELECT annotator, session, image_index, image_id, score, ts FROM ratings "
+                                "WHERE session = ?", (session,)).fetchall()
+        if len(rows) >= expected:
+            break
+        time.sleep(0.1)
+    export = os.path.join(directory, "export.jsonl")
+    with open(export, "w") as f:
+        for row in rows:
+            f.write(json.dumps(dict(zip(COLUMNS, row))) + "\n")
+
+    from batch_analysis import analyze, attach_duplicates, latest_ratings, manifest_lookup
+    from dataset import Dataset
+    from dedupe import duplicate_ids, load_dupes
+    from export import analysis_rows
+    from ratings_store import RatingsStore
+
+    lookup, total = manifest_lookup(manifest)
+    latest = latest_ratings([export], workers=1)
+    representative = load_dupes(manifest)
+    groups = None
+    if duplicates:
+        if representative is None or len(set(representative.tolist())) != shown:
+            raise SystemExit("dedupe.py did not group the copied pairs")
+        groups = duplicate_ids(Dataset(manifest), representative)
+        latest = attach_duplicates(latest, groups)
+    result = next(analyze(latest, ["session"], lookup, total))
+    mismatched = [field for field in ANALYSIS_FIELDS if result[field] != dashboard[field]]
+    if mismatched:
+        raise SystemExit(f"batch analysis differs from the dashboard in: {', '.join(mismatched)}")
+
+    # The app's Analysis download reads the ratings database directly
+    store = RatingsStore(db)
+    try:
+        row = next(analysis_rows(store, lookup, [session], groupings=["session"], total_images=total,
+                                 duplicates=groups))[0]
+    finally:
+        store.close()
+    exported = {"rated": row[2], "total_images": row[3], "average": row[4], "percentage": row[5], "passes": row[6],
+                "distribution": dict(zip((1, 2, 3, 4, 5), row[7:12])),
+                "distribution_percent": dict(zip((1, 2, 3, 4, 5), row[12:17])), "summary": row[17]}
+    mismatched = [field for field in ANALYSIS_FIELDS if exported[field] != dashboard[field]]
+    if mismatched:
+        raise SystemExit(f"the analysis export differs from the dashboard in: {', '.join(mismatched)}")
+    print(f"batch analysis and export match the dashboard for session {session[:8]}"
+          f"{' with near-duplicates' if duplicates else ''} "
+          f"(average {result['average']:.2f}, {result['rated']} of {result['total_images']} rated, "
+          f"{'passes' if result['passes'] else 'below standard'})")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--images", type=int, default=200, help="images per evaluation")
+    parser.add_argument("--format", choices=["jsonl", "csv", "parquet"], default="jsonl")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, os.cpu_count()])
+    parser.add_argument("--check-app", action="store_true")
+    args = parser.parse_args(argv)
+
+    print(f"batch_analysis imports streamlit: {imports_streamlit()}")
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, f"ratings.{args.format}")
+        rows = make_ratings(path, args.sessions, args.images)
+        print(f"{rows} rating rows, {args.sessions} sessions ({args.format})")
+        print(f"{'workers':>8} {'seconds':>9} {'rows/s':>10}")
+        for workers in args.workers:
+            started = time.perf_counter()
+            subprocess.run([sys.executable, os.path.join(ROOT, "batch_analysis.py"), path, "--by", "session", "model",
+                            "category", "--workers", str(workers), "--output", os.devnull],
+                           check=True, capture_output=True, cwd=ROOT)
+            seconds = time.perf_counter() - started
+            print(f"{workers:>8} {seconds:>9.2f} {rows / seconds:>10.0f}")
+
+    if args.check_app:
+        for duplicates in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                with ProcessPoolExecutor(1, mp_context=get_context("spawn")) as pool:
+                    pool.submit(check_app, directory, duplicates).result()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Cost of the composite view modes, rendered and from the cache.
+
+Generates a synthetic original/cutout pair at ``--size`` and pre-renders its
+preview pyramid, as ``previews.py`` does. For each composite view and display
+width it times three things:
+
+- rendering from the full-size sources;
+- the first ``composite_for`` call, which composes from the preview level and
+  encodes;
+- a repeat call, which is what switching back to a view costs::
+
+    python -m benchmarks.bench_composites --size 4000 3000 --widths 1920 0
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metrics_store import make_pairs  # noqa: E402
+from composites import COMPOSITE_MODES, composite_for, render  # noqa: E402
+from dataset import Dataset  # noqa: E402
+from previews import render_pyramid  # noqa: E402
+
+
+def timed_ms(function, repeat=1):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return result, (time.perf_counter() - started) * 1000 / repeat
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size", type=int, nargs=2, default=(4000, 3000), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--widths", type=int, nargs="+", default=[1920, 0], help="display widths; 0 is native size")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        record = Dataset(make_pairs(directory, 1, size=tuple(args.size)))[0]
+        original, processed = record["original"], record["processed"]
+        preview_dir = os.path.join(directory, "previews")
+        render_pyramid(original, preview_dir=preview_dir)
+        render_pyramid(processed, preview_dir=preview_dir)
+        print(f"{args.size[0]}x{args.size[1]} pair")
+        print(f"{'view':<14} {'width':>7} {'source ms':>10} {'first ms':>9} {'cached ms':>10}")
+        for width in args.widths:
+            width = width or None
+            for mode in COMPOSITE_MODES:
+                _, render_ms = timed_ms(lambda: render(original, processed, mode, width))
+                path, first_ms = timed_ms(lambda: composite_for(original, processed, mode, width, preview_dir=preview_dir))
+                assert path is not None
+                _, cached_ms = timed_ms(lambda: composite_for(original, processed, mode, width, preview_dir=preview_dir),
+                                        args.repeat)
+                print(f"{mode:<14} {width or 'native':>7} {render_ms:>10.0f} {first_ms:>9.0f} {cached_ms:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
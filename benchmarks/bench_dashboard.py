@@ -0,0 +1,124 @@
+"""Dashboard breakdown cost on a large ratings log.
+
+Fills a ratings database with ``--ratings`` synthetic rows (many annotators,
+images spread over categories and models), then times:
+
+- loading the store-wide latest ratings from scratch and refreshing them after
+  a small batch of new rows;
+- building each breakdown (group counts, figures, and the JSON that
+  ``st.plotly_chart`` sends), uncached and from the figure cache;
+- the equivalent SQL ``GROUP BY`` over the whole log, for reference.
+
+A view after new ratings (incremental refresh + build + JSON) is checked
+against ``--budget-ms``::
+
+    python -m benchmarks.bench_dashboard --ratings 1000000 --budget-ms 1000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dashboard import FigureCache, LatestRatings, breakdown_figures, version_hash  # noqa: E402
+from ratings_store import RatingsStore  # noqa: E402
+
+LABELS = ["1 - Unusable", "2 - Partially Viable", "3 - Moderately Functional", "4 - Near Production Ready",
+          "5 - Production Ready"]
+COLORS = ["#dc2626", "#ea580c", "#ca8a04", "#2563eb", "#16a34a"]
+
+
+def fill(store, ratings, annotators, images, rng, start_ts=1.7e9):
+    rows = rng.integers(0, [annotators, images, 5], size=(ratings, 3))
+    sessions = rng.integers(0, annotators * 20, ratings)
+    batch = [
+        (f"annotator-{a}", f"session-{s}", int(i), str(i), int(score) + 1, start_ts + n)
+        for n, ((a, i, score), s) in enumerate(zip(rows, sessions))
+    ]
+    conn = store._read_conn
+    conn.execute("BEGIN")
+    conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?, ?, ?)", batch)
+    conn.execute("COMMIT")
+
+
+def timed(function):
+    started = time.perf_counter()
+    result = function()
+    return result, (time.perf_counter() - started) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ratings", type=int, default=1_000_000)
+    parser.add_argument("--annotators", type=int, default=800)
+    parser.add_argument("--images", type=int, default=50_000)
+    parser.add_argument("--categories", type=int, default=40)
+    parser.add_argument("--models", type=int, default=300)
+    parser.add_argument("--budget-ms", type=float, default=1000)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(0)
+    category = {str(i): f"category-{i % args.categories}" for i in range(args.images)}
+    model = {str(i): f"model-{(i * 7919) % args.models}" for i in range(args.images)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = RatingsStore(os.path.join(directory, "ratings.sqlite3"))
+        fill(store, args.ratings, args.annotators, args.images, rng)
+        print(f"{args.ratings} ratings, {args.annotators} annotators, {args.images} images")
+
+        latest = LatestRatings()
+        count, ms = timed(lambda: latest.refresh(store))
+        print(f"load latest ratings from scratch:   {ms:8.0f} ms ({count} rows)")
+        fill(store, 500, args.annotators, args.images, rng, start_ts=2e9)
+        count, refresh_ms = timed(lambda: latest.refresh(store))
+        print(f"incremental refresh:                {refresh_ms:8.0f} ms ({count} rows)")
+
+        views = {
+            "annotator": lambda: latest.by_rater(),
+            "category": lambda: latest.by_image().regroup(category.get),
+            "model": lambda: latest.by_image().regroup(model.get),
+        }
+        cache = FigureCache()
+        worst = 0.0
+        print(f"{'breakdown':<10} {'groups':>7} {'build ms':>9} {'json ms':>8} {'KiB':>7} {'cached ms':>10}")
+        for field, grouped in views.items():
+            key = (field, version_hash("all", latest.rowid))
+
+            def build():
+                distribution = grouped()
+                return len(distribution), breakdown_figures(distribution, f"Scores by {field}", LABELS, COLORS)
+
+            (groups, figures), build_ms = timed(lambda: cache.get_or_build(key, build))
+            payload, json_ms = timed(lambda: [fig.to_json() for fig in figures])
+            _, cached_ms = timed(lambda: cache.get_or_build(key, build))
+            worst = max(worst, build_ms + json_ms)
+            print(f"{field:<10} {groups:>7} {build_ms:>9.0f} {json_ms:>8.0f} "
+                  f"{sum(map(len, payload)) / 1024:>7.0f} {cached_ms:>10.3f}")
+
+        query = """
+            WITH latest AS (
+                SELECT CASE WHEN annotator = 'anonymous' THEN session ELSE annotator END AS rater,
+                       image_id, score, MAX(ts)
+                FROM ratings GROUP BY rater, image_id
+            )
+            SELECT rater, score, COUNT(*) FROM latest GROUP BY 1, 2
+        """
+        _, sql_ms = timed(lambda: store._read_conn.execute(query).fetchall())
+        print(f"reference: SQL GROUP BY per view:   {sql_ms:8.0f} ms")
+        store.close()
+
+    view_ms = refresh_ms + worst
+    verdict = "within" if view_ms <= args.budget_ms else "OVER"
+    print(f"view after new ratings: {view_ms:.0f} ms, {verdict} the {args.budget_ms:.0f} ms budget")
+    if view_ms > args.budget_ms:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
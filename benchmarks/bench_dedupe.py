@@ -0,0 +1,151 @@
+"""Throughput and accuracy of perceptual-hash deduplication.
+
+Two parts:
+
+- Images. ``--images`` synthetic originals (smooth random scenes), each
+  followed by ``--copies`` resized and recompressed copies, are hashed with
+  ``--workers`` processes. The benchmark reports how many copies joined
+  their source's cluster, and checks that no two sources were merged. The
+  same originals are then labelled as two models, and no cluster may mix
+  them.
+- Index. ``--hashes`` random 64-bit pHashes are generated in clusters of
+  near-duplicates a few bits apart. Multi-index hashing finds every pair
+  within ``--distance`` bits. On a ``--brute`` subset it is compared with
+  the all-pairs scan, both for time and for the exact same pairs.
+
+Run it as::
+
+    python -m benchmarks.bench_dedupe --images 200 --copies 2 --hashes 200000 --distance 6
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset import Dataset  # noqa: E402
+from dedupe import HammingIndex, hamming, hash_originals, representatives, star_clusters  # noqa: E402
+
+
+def make_originals(directory, count, copies, size=(1024, 768), seed=0):
+    """Smooth random scenes, each followed by resized, recompressed copies
+
+    Returns the manifest and, for every record, the record index of the scene it shows.
+    """
+    rng = np.random.default_rng(seed)
+    manifest = os.path.join(directory, "manifest.jsonl")
+    sources = []
+    with open(manifest, "w") as f:
+        for i in range(count):
+            coarse = rng.integers(0, 256, (6, 8, 3), dtype=np.uint8)
+            scene = np.asarray(Image.fromarray(coarse).resize(size, Image.BICUBIC), dtype=np.int16)
+            scene = np.clip(scene + rng.integers(-8, 9, scene.shape), 0, 255).astype(np.uint8)
+            im = Image.fromarray(scene)
+            path = os.path.join(directory, f"{i:06d}_original.jpg")
+            im.save(path, quality=90)
+            record = {"id": i, "name": f"pair {i}", "original": path, "processed": path}
+            f.write(json.dumps(record) + "\n")
+            source = len(sources)
+            sources.append(source)
+            for c in range(copies):
+                scale = rng.uniform(0.3, 0.9)
+                copy = im.resize((int(im.width * scale), int(im.height * scale)), Image.BILINEAR)
+                path = os.path.join(directory, f"{i:06d}_copy{c}.jpg")
+                copy.save(path, quality=int(rng.integers(40, 90)))
+                f.write(json.dumps({**record, "id": f"{i}-{c}", "original": path}) + "\n")
+                sources.append(source)
+    return manifest, np.array(sources)
+
+
+def clustered_hashes(count, cluster_size, max_flips, seed=0):
+    """Random 64-bit hashes in clusters whose members differ from their seed hash by up to ``max_flips`` bits"""
+    rng = np.random.default_rng(seed)
+    seeds = rng.integers(0, 2 ** 63, count // cluster_size, dtype=np.int64).astype(np.uint64) * np.uint64(2)
+    hashes = np.repeat(seeds, cluster_size)[:count]
+    flips = rng.integers(0, max_flips + 1, len(hashes))
+    for k in range(max_flips):
+        bits = rng.integers(0, 64, len(hashes)).astype(np.uint64)
+        hashes ^= np.where(flips > k, np.uint64(1) << bits, np.uint64(0))
+    return hashes
+
+
+def brute_pairs(hashes, radius, block=2048):
+    """Every pair within ``radius`` bits by comparing all of them"""
+    keys = []
+    for start in range(0, len(hashes), block):
+        distance = hamming(hashes[start:start + block, None], hashes[None, :])
+        first, second = np.nonzero(distance <= radius)
+        first += start
+        keep = first < second
+        keys.append(first[keep] * len(hashes) + second[keep])
+    keys = np.concatenate(keys)
+    return keys // len(hashes), keys % len(hashes)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=200)
+    parser.add_argument("--copies", type=int, default=2)
+    parser.add_argument("--size", type=int, nargs=2, default=(1024, 768), metavar=("WIDTH", "HEIGHT"))
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--hashes", type=int, default=200_000)
+    parser.add_argument("--distance", type=int, default=6)
+    parser.add_argument("--brute", type=int, default=20_000, help="subset size for the all-pairs comparison")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest, sources = make_originals(directory, args.images, args.copies, tuple(args.size))
+        dataset = Dataset(manifest)
+        started = time.perf_counter()
+        phashes, dhashes, pixels = hash_originals(dataset, lambda ref: ref, args.workers, log=lambda message: None)
+        seconds = time.perf_counter() - started
+        representative = representatives(phashes, dhashes, pixels, args.distance)
+    copies = sources != np.arange(len(sources))
+    # Sources are written before their copies and are larger, so each should represent its own copies
+    joined = int((representative[copies] == sources[copies]).sum())
+    merged = int((sources[representative] != sources).sum())
+    print(f"{len(dataset)} originals ({args.images} with {args.copies} copies each): hashed in {seconds:.1f}s "
+          f"({len(dataset) / seconds:.0f} images/s, {args.workers} workers); "
+          f"{joined}/{int(copies.sum())} copies joined their source, {merged} images clustered with another scene")
+    # Every original again under a second model: identical hashes, but a different model's cutout
+    models = np.repeat([0, 1], len(dataset))
+    both = representatives(np.tile(phashes, 2), np.tile(dhashes, 2), np.tile(pixels, 2), args.distance, groups=models)
+    mixed = int((models[both] != models).sum())
+    print(f"same originals under two models: {mixed} images clustered with the other model")
+
+    hashes = clustered_hashes(args.hashes, 4, args.distance)
+    started = time.perf_counter()
+    index = HammingIndex(hashes)
+    first, second = index.pairs(args.distance)
+    index_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    clusters = star_clusters(np.arange(len(hashes)), first, second)
+    cluster_seconds = time.perf_counter() - started
+    print(f"{args.hashes} hashes: multi-index search {index_seconds:.2f}s for {len(first)} pairs, "
+          f"{len(np.unique(clusters))} clusters in {cluster_seconds:.2f}s")
+
+    subset = hashes[:args.brute]
+    started = time.perf_counter()
+    fast = HammingIndex(subset).pairs(args.distance)
+    fast_seconds = time.perf_counter() - started
+    started = time.perf_counter()
+    slow = brute_pairs(subset, args.distance)
+    slow_seconds = time.perf_counter() - started
+    exact = set(zip(*fast)) == set(zip(*slow))
+    print(f"{args.brute} hashes: multi-index {fast_seconds:.2f}s vs all pairs {slow_seconds:.2f}s "
+          f"(all pairs at {args.hashes}: ~{slow_seconds * (args.hashes / args.brute) ** 2:.0f}s); "
+          f"same pairs: {exact}")
+    if merged or mixed or not exact:
+        sys.exit("deduplication results are wrong")
+
+
+if __name__ == "__main__":
+    main()
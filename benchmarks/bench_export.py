@@ -0,0 +1,177 @@
+"""Throughput and peak memory of streaming exports as the ratings log grows.
+
+Fills a ratings database with ``--ratings`` synthetic rows for each size
+given (sessions of 500 ratings over 20,000 images, some re-rated). Each
+table is then exported in each format by a separate ``export.py`` process,
+which reports its time, ratings read per second, output size and peak RSS.
+If memory stays flat, the peak RSS is the same at every size. For comparison,
+a "load all" run reads the whole ratings table into pandas and writes it with
+``to_parquet``. Databases are written and exports checked in a helper
+process, so this script stays small: a child's peak RSS starts from its
+parent's.
+
+It then checks three things. The Parquet and Arrow exports hold every row.
+A filtered export matches the same filter applied in SQL. And
+``batch_analysis.py`` run on the ``--latest`` CSV export reproduces the
+exported overall analysis::
+
+    python -m benchmarks.bench_export --ratings 100000 1000000
+"""
+
+import argparse
+import csv
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from multiprocessing import get_context
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ratings_store import RatingsStore  # noqa: E402
+
+IMAGES = 20_000
+PER_SESSION = 500
+CATEGORIES = ("Portrait", "Product", "Food", "Hair")
+MODELS = ("model-a", "model-b", "model-c")
+
+LOAD_ALL = """
+import resource, sqlite3, sys, pandas as pd
+frame = pd.read_sql_query("SELECT * FROM ratings", sqlite3.connect(sys.argv[1]))
+frame.to_parquet(sys.argv[2])
+print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024)
+"""
+HEADER = f"{'ratings':>9} {'table':>9} {'format':>8} {'rows':>9} {'seconds':>8} {'ratings/s':>10} {'MB':>7} {'peak RSS MiB':>13}"
+
+
+def make_manifest(path, images=IMAGES):
+    with open(path, "w") as f:
+        for i in range(images):
+            f.write(json.dumps({"id": i, "name": f"pair {i}", "original": f"{i}_original.jpg",
+                                "processed": f"{i}_bg_removed.png", "category": CATEGORIES[i % len(CATEGORIES)],
+                                "model": MODELS[i % len(MODELS)]}) + "\n")
+
+
+def make_ratings(path, count, images=IMAGES, seed=0):
+    """Ratings database with ``count`` rows; returns the timestamp halfway through"""
+    RatingsStore(path).close()
+    rng = np.random.default_rng(seed)
+    session = np.arange(count) // PER_SESSION
+    # A tenth of each session's ratings re-rate one of its earlier images
+    index = rng.integers(0, images, count)
+    rerate = rng.random(count) < 0.1
+    rerate[np.arange(count) % PER_SESSION == 0] = False
+    index[rerate] = index[np.flatnonzero(rerate) - 1]
+    score = rng.integers(1, 6, count)
+    ts = 1.7e9 + np.arange(count) * 2.0
+    conn = sqlite3.connect(path)
+    conn.executemany(
+        "INSERT INTO ratings VALUES (?, ?, ?, ?, ?, ?)",
+        ((f"annotator-{s % 97}", f"session-{s:06d}", i, str(i), r, t)
+         for s, i, r, t in zip(session.tolist(), index.tolist(), score.tolist(), ts.tolist())),
+    )
+    conn.commit()
+    conn.close()
+    return float(ts[count // 2])
+
+
+def run_export(args):
+    out = subprocess.run([sys.executable, os.path.join(ROOT, "export.py"), *args, "--json"],
+                         check=True, capture_output=True, text=True, cwd=ROOT)
+    return json.loads(out.stderr.strip().splitlines()[-1])
+
+
+def load_all(db, output):
+    """Peak RSS in MiB of reading the whole ratings table into pandas and writing it as Parquet"""
+    started = time.perf_counter()
+    out = subprocess.run([sys.executable, "-c", LOAD_ALL, db, output], check=True, capture_output=True, text=True)
+    return time.perf_counter() - started, float(out.stdout)
+
+
+def row_count(path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if fmt == "parquet":
+        return pq.ParquetFile(path).metadata.num_rows
+    with pa.OSFile(path) as f:
+        return sum(batch.num_rows for batch in pa.ipc.open_stream(f))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--ratings", type=int, nargs="+", default=[100_000, 1_000_000])
+    parser.add_argument("--formats", nargs="+", default=["csv", "parquet", "arrow"])
+    args = parser.parse_args(argv)
+
+    ok = True
+    helper = ProcessPoolExecutor(1, mp_context=get_context("spawn"))
+    with tempfile.TemporaryDirectory() as directory, helper:
+        manifest = os.path.join(directory, "manifest.jsonl")
+        make_manifest(manifest)
+        print(HEADER)
+        for count in args.ratings:
+            db = os.path.join(directory, f"ratings_{count}.sqlite3")
+            midpoint = helper.submit(make_ratings, db, count).result()
+            common = ["--db", db, "--manifest", manifest]
+            for table in ("ratings", "images", "analysis"):
+                for fmt in args.formats:
+                    output = os.path.join(directory, f"{table}.{fmt}")
+                    stats = run_export([table, "--output", output, "--format", fmt, *common])
+                    print(f"{count:>9} {table:>9} {fmt:>8} {stats['rows']:>9} {stats['seconds']:>8.1f} "
+                          f"{count / stats['seconds']:>10,.0f} {stats['bytes'] / 1e6:>7.1f} {stats['peak_rss_mb']:>13.0f}")
+                    if table == "ratings" and fmt != "csv" and helper.submit(row_count, output, fmt).result() != count:
+                        print(f"  {fmt} export is missing rows")
+                        ok = False
+            seconds, peak = load_all(db, os.path.join(directory, "all.parquet"))
+            print(f"{count:>9} {'ratings':>9} {'load all':>8} {count:>9} {seconds:>8.1f} {count / seconds:>10,.0f} "
+                  f"{'':>7} {peak:>13.0f}")
+
+            # Filters agree with SQL
+            filtered = os.path.join(directory, "filtered.csv")
+            stats = run_export(["ratings", "--output", filtered, *common, "--model", "model-a",
+                                "--since", datetime.fromtimestamp(midpoint, timezone.utc).isoformat(),
+                                "--session", "session-000000",
+                                *(f"session-{s:06d}" for s in range(count // PER_SESSION // 2, count // PER_SESSION))])
+            conn = sqlite3.connect(db)
+            expected = conn.execute(
+                "SELECT COUNT(*) FROM ratings WHERE CAST(image_id AS INTEGER) % 3 = 0 AND ts >= ? "
+                "AND (session = 'session-000000' OR session >= ?)",
+                (midpoint, f"session-{count // PER_SESSION // 2:06d}"),
+            ).fetchone()[0]
+            conn.close()
+            if stats["rows"] != expected:
+                print(f"  filtered export has {stats['rows']} rows, SQL has {expected}")
+                ok = False
+
+            # The latest ratings reproduce the exported analysis through batch_analysis.py
+            latest = os.path.join(directory, "latest.csv")
+            analysis = os.path.join(directory, "analysis.csv")
+            run_export(["ratings", "--latest", "--output", latest, *common])
+            run_export(["analysis", "--by", "overall", "--output", analysis, *common])
+            batch = subprocess.run(
+                [sys.executable, os.path.join(ROOT, "batch_analysis.py"), latest, "--by", "overall",
+                 "--manifest", manifest], check=True, capture_output=True, text=True, cwd=ROOT,
+            )
+            expected = json.loads(batch.stdout)
+            with open(analysis) as f:
+                exported = next(csv.DictReader(f))
+            if not (np.isclose(float(exported["average"]), expected["average"]) and
+                    int(exported["rated"]) == expected["rated"] and exported["summary"] == expected["summary"]):
+                print("  exported analysis differs from batch_analysis.py")
+                ok = False
+    print(f"exports complete, filters match SQL and the analysis matches batch_analysis.py: {ok}")
+    if not ok:
+        sys.exit("export check failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""Latency and payload of a rating click, whole-page rerun vs. fragment rerun.
+
+Drives ``app.py`` headlessly with Streamlit's ``AppTest`` against a synthetic
+local dataset and clicks rating buttons. Each click is measured twice: as a
+whole-script rerun (what every click cost before the page was split into
+fragments) and as a rerun scoped to the rating fragment, the way the browser
+requests it. Reports the median wall time per click and the bytes of
+``ForwardMsg`` deltas sent to the browser::
+
+    python -m benchmarks.bench_fragments --clicks 20
+
+``--baseline REV`` additionally runs ``app.py`` as of a git revision (e.g. the
+commit before fragments were introduced, whose rating buttons also triggered a
+second ``st.rerun()``).
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metrics_store import make_pairs  # noqa: E402
+
+
+class _Recorder:
+    """Counts ForwardMsg bytes and optionally scopes the next run to a fragment"""
+
+    def __init__(self):
+        self.bytes = 0
+        self.fragment_id = None
+        self.page_widgets = None
+
+    def install(self):
+        from streamlit.runtime.scriptrunner import RerunData
+        from streamlit.testing.v1 import local_script_runner
+
+        recorder = self
+        enqueue = local_script_runner.ForwardMsgQueue.enqueue
+
+        def counting_enqueue(queue, msg):
+            recorder.bytes += msg.ByteSize()
+            return enqueue(queue, msg)
+
+        def rerun_data(**kwargs):
+            if recorder.fragment_id is not None:
+                kwargs.update(fragment_id_queue=[recorder.fragment_id], is_fragment_scoped_rerun=True)
+                # AppTest only knows the widgets the fragment just drew; a browser
+                # sends the state of every widget on the page
+                states = kwargs.get("widget_states")
+                if states is not None and recorder.page_widgets is not None:
+                    sent = {widget.id for widget in states.widgets}
+                    states.widgets.extend(w for w in recorder.page_widgets.widgets if w.id not in sent)
+            return RerunData(**kwargs)
+
+        local_script_runner.ForwardMsgQueue.enqueue = counting_enqueue
+        local_script_runner.RerunData = rerun_data
+
+    def reset(self):
+        self.bytes = 0
+
+
+def measure(script, recorder, clicks, scoped):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(script, default_timeout=60)
+    recorder.fragment_id = None
+    at.run()
+    fragment_id = _find_fragment_id(at, recorder) if scoped else None
+    recorder.page_widgets = at._tree.get_widget_states()
+
+    timings, payloads = [], []
+    for i in range(clicks):
+        current = at.session_state.current_image
+        key = f"rating_btn_{current}_{i % 5 + 1}"
+        recorder.fragment_id = fragment_id
+        recorder.reset()
+        started = time.perf_counter()
+        at.button(key).click().run()
+        timings.append(time.perf_counter() - started)
+        payloads.append(recorder.bytes)
+        if at.exception:
+            raise RuntimeError(at.exception[0].message)
+    recorder.fragment_id = recorder.page_widgets = None
+    return statistics.median(timings), statistics.median(payloads)
+
+
+def _find_fragment_id(at, recorder):
+    """Run once more capturing deltas to learn which fragment holds the rating bar"""
+    from streamlit.testing.v1 import local_script_runner
+
+    captured = []
+    enqueue = local_script_runner.ForwardMsgQueue.enqueue
+
+    def capture(queue, msg):
+        captured.append(msg)
+        return enqueue(queue, msg)
+
+    local_script_runner.ForwardMsgQueue.enqueue = capture
+    try:
+        at.run()
+    finally:
+        local_script_runner.ForwardMsgQueue.enqueue = enqueue
+    for msg in captured:
+        if msg.HasField("delta") and msg.delta.HasField("new_element"):
+            element = msg.delta.new_element
+            if element.WhichOneof("type") == "button" and "rating_btn_" in element.button.id:
+                if msg.delta.fragment_id:
+                    return msg.delta.fragment_id
+    raise RuntimeError(f"{at._script_path} renders its rating buttons outside a fragment")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=30)
+    parser.add_argument("--clicks", type=int, default=20)
+    parser.add_argument("--baseline", help="git revision of app.py to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = make_pairs(directory, args.pairs, size=(1600, 1200))
+        os.environ.update(
+            BRE_MANIFEST=manifest,
+            BRE_CACHE_DIR=os.path.join(directory, "cache"),
+            BRE_PREVIEW_DIR=os.path.join(directory, "previews"),
+            BRE_METRICS_DB=os.path.join(directory, "metrics.sqlite3"),
+            BRE_RATINGS_DB=os.path.join(directory, "ratings.sqlite3"),
+        )
+        recorder = _Recorder()
+        recorder.install()
+
+        runs = [("whole page", os.path.join(ROOT, "app.py"), False),
+                ("rating fragment", os.path.join(ROOT, "app.py"), True)]
+        if args.baseline:
+            # Kept next to app.py so its sibling-module imports resolve the same way
+            baseline = os.path.join(ROOT, f".bench_app_{args.baseline.replace('/', '_').replace('~', '_')}.py")
+            source = subprocess.run(["git", "show", f"{args.baseline}:app.py"], check=True,
+                                    capture_output=True, text=True, cwd=ROOT).stdout
+            with open(baseline, "w") as f:
+                f.write(source)
+            runs.insert(0, (f"baseline {args.baseline}", baseline, False))
+
+        print(f"{'run':<22} {'ms/click':>10} {'KiB/click':>10}")
+        try:
+            for label, script, scoped in runs:
+                seconds, payload = measure(script, recorder, args.clicks, scoped)
+                print(f"{label:<22} {seconds * 1000:>10.1f} {payload / 1024:>10.1f}")
+        finally:
+            if args.baseline:
+                os.remove(baseline)
+
+
+if __name__ == "__main__":
+    main()
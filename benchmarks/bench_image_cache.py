@@ -0,0 +1,135 @@
+"""Origin requests made by the image cache, against a local stand-in server that counts them.
+
+Serves ``--files`` random blobs from a thread with ``--latency-ms`` added to
+every response, and counts the requests for each path. The app's access
+pattern is replayed over a manifest of those blobs. Each pair is resolved
+``--reruns`` times, as every rerun does, by ``--threads`` threads at once, and
+the next ``--prefetch`` pairs are prefetched in the background meanwhile.
+The cache is then closed and reopened on the same directory, as after a
+restart, and every ref is resolved again from the reloaded index::
+
+    python -m benchmarks.bench_image_cache --files 200 --reruns 5 --threads 4
+
+Every ref must reach the origin exactly once across both runs, and every
+cached file must match the blob that was served.
+"""
+
+import argparse
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from image_cache import ImageCache, content_digest  # noqa: E402
+
+
+def start_server(blobs, latency):
+    """Serve ``{path: bytes}`` from a background thread; returns the server and its per-path request counter"""
+    requests = Counter()
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            with lock:
+                requests[self.path] += 1
+            time.sleep(latency)
+            data = blobs.get(self.path)
+            self.send_response(200 if data is not None else 404)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("Content-Length", str(len(data or b"")))
+            self.end_headers()
+            self.wfile.write(data or b"")
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, requests
+
+
+def make_pairs(files, size, seed=0):
+    """``[(original path, processed path)]`` and ``{path: bytes}`` of random blobs"""
+    rng = np.random.default_rng(seed)
+    blobs = {f"/{n:06d}.png": rng.integers(0, 256, size, dtype=np.uint8).tobytes() for n in range(files)}
+    paths = sorted(blobs)
+    return list(zip(paths[0::2], paths[1::2])), blobs
+
+
+def replay(cache, pairs, url, reruns, threads, prefetch):
+    """Resolve each pair as the app does while prefetching the next ones; returns seconds per pair"""
+    timings = []
+    with ThreadPoolExecutor(threads) as pool:
+        for i, pair in enumerate(pairs):
+            cache.prefetch(url + path for ahead in pairs[i + 1:i + 1 + prefetch] for path in ahead)
+            started = time.perf_counter()
+            for _ in range(reruns):
+                list(pool.map(cache.resolve, [url + path for path in pair for _ in range(threads)]))
+            timings.append(time.perf_counter() - started)
+    return timings
+
+
+def check(cache, pairs, url, blobs):
+    """Number of refs whose cached file is missing or differs from the served blob"""
+    bad = 0
+    for path in (path for pair in pairs for path in pair):
+        local = cache.cached_path(url + path)
+        if local is None or content_digest(local) != hashlib.sha256(blobs[path]).hexdigest():
+            bad += 1
+    return bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=64)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--reruns", type=int, default=5, help="resolves of each pair, one per rerun")
+    parser.add_argument("--threads", type=int, default=4, help="concurrent resolves of the same ref")
+    parser.add_argument("--prefetch", type=int, default=1, help="pairs warmed ahead of the current one")
+    args = parser.parse_args(argv)
+
+    pairs, blobs = make_pairs(args.files, args.size_kb * 1024)
+    server, requests = start_server(blobs, args.latency_ms / 1000)
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    failures = []
+    with tempfile.TemporaryDirectory() as directory:
+        root = os.path.join(directory, "cache")
+        print(f"{len(pairs)} pairs, {args.size_kb} KB each, {args.latency_ms:.0f} ms latency; "
+              f"{args.reruns} reruns x {args.threads} threads per pair, {args.prefetch} pairs prefetched")
+        for run in ("first run", "after restart"):
+            cache = ImageCache(root, max_bytes=1 << 40)
+            timings = replay(cache, pairs, url, args.reruns, args.threads, args.prefetch)
+            bad = check(cache, pairs, url, blobs)
+            cache.save_index()
+            counts = [requests[path] for path in blobs]
+            print(f"{run:<14} median {np.median(timings) * 1000:6.1f} ms per pair, "
+                  f"origin requests {sum(counts)} for {len(blobs)} refs (max {max(counts)} per ref), {bad} bad files")
+            if bad:
+                failures.append(f"{bad} cached files are missing or corrupt {run}")
+        repeated = sum(count != 1 for count in requests.values()) + sum(path not in requests for path in blobs)
+        if repeated:
+            failures.append(f"{repeated} refs were not requested from the origin exactly once")
+    server.shutdown()
+    if failures:
+        sys.exit("; ".join(failures))
+
+
+if __name__ == "__main__":
+    main()
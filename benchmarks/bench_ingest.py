@@ -0,0 +1,195 @@
+"""Throughput of bulk remote-asset ingestion against a local stand-in server.
+
+Serves ``--files`` random blobs from a separate process. The server speaks
+HTTP/1.1 keep-alive with strong ETags and Range/If-Range support, adds
+``--latency-ms`` to every response, and spreads the files over ``--hosts``
+loopback addresses so per-host limits apply. A fraction ``--fail-rate`` of
+files fail on their first request: half get a 503 and half have the
+connection dropped midway through the body, which the ingester must resume.
+
+The app's one-at-a-time fetch (``ImageCache.resolve``) runs first as a
+baseline, against a server without faults. ``ingest.py`` then runs once per
+``--concurrency`` value. Every run checks that each file arrived intact::
+
+    python -m benchmarks.bench_ingest --files 400 --size-kb 256 --concurrency 8 32 64
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from dataset import Dataset  # noqa: E402
+from image_cache import ImageCache, content_digest  # noqa: E402
+from ingest import ingest, remote_assets  # noqa: E402
+
+
+def serve(directory, port, latency, fail_rate, ready):
+    """Serve every file in ``directory`` at ``/<name>`` until killed"""
+    blobs = {}
+    for name in os.listdir(directory):
+        with open(os.path.join(directory, name), "rb") as f:
+            data = f.read()
+        blobs["/" + name] = (data, f'"{hashlib.sha256(data).hexdigest()[:32]}"')
+    names = sorted(blobs)
+    # Alternate failing files between a 503 and a connection dropped mid-body
+    failing = {name: "drop" if i % 2 else "503" for i, name in enumerate(names[:int(len(names) * fail_rate)])}
+    lock = threading.Lock()
+    last_modified = formatdate(time.time() - 3600, usegmt=True)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            time.sleep(latency)
+            blob = blobs.get(self.path)
+            if blob is None:
+                self.send_response(404)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            data, etag = blob
+            with lock:
+                fault = failing.pop(self.path, None)
+            if fault == "503":
+                self.send_response(503)
+                self.send_header("Retry-After", "0")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+
+            start = 0
+            requested = self.headers.get("Range")
+            if requested and self.headers.get("If-Range") in (etag, last_modified):
+                start = int(requested.split("=")[1].split("-")[0])
+            self.send_response(206 if start else 200)
+            self.send_header("Content-Type", "image/png")
+            self.send_header("ETag", etag)
+            self.send_header("Last-Modified", last_modified)
+            self.send_header("Accept-Ranges", "bytes")
+            if start:
+                self.send_header("Content-Range", f"bytes {start}-{len(data) - 1}/{len(data)}")
+            self.send_header("Content-Length", str(len(data) - start))
+            self.end_headers()
+            if fault:
+                self.wfile.write(data[start:start + (len(data) - start) // 2])
+                self.wfile.flush()
+                self.connection.shutdown(socket.SHUT_RDWR)
+                self.close_connection = True
+                return
+            self.wfile.write(data[start:])
+
+    class Server(ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 256
+
+    server = Server(("0.0.0.0", port), Handler)
+    ready.set()
+    server.serve_forever()
+
+
+def make_manifest(directory, files, size, hosts, port, seed=0):
+    """Random blobs in ``directory/blobs`` and a manifest pointing at them over HTTP, with checksums"""
+    rng = np.random.default_rng(seed)
+    blob_dir = os.path.join(directory, "blobs")
+    os.makedirs(blob_dir)
+    manifest = os.path.join(directory, "manifest.jsonl")
+    with open(manifest, "w") as f:
+        for i in range(0, files, 2):
+            record = {"id": i, "name": f"pair {i}"}
+            for field, n in (("original", i), ("processed", i + 1)):
+                data = rng.integers(0, 256, size, dtype=np.uint8).tobytes()
+                with open(os.path.join(blob_dir, f"{n:06d}.png"), "wb") as out:
+                    out.write(data)
+                record[field] = f"http://127.0.0.{1 + n % hosts}:{port}/{n:06d}.png"
+                record[f"{field}_sha256"] = hashlib.sha256(data).hexdigest()
+            f.write(json.dumps(record) + "\n")
+    return manifest
+
+
+def check(dataset, cache):
+    """Number of references whose cached file is missing or doesn't match its checksum"""
+    bad = 0
+    for record in dataset:
+        for field in ("original", "processed"):
+            path = cache.cached_path(record[field])
+            if path is None or content_digest(path) != record[f"{field}_sha256"]:
+                bad += 1
+    return bad
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--size-kb", type=int, default=256)
+    parser.add_argument("--hosts", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--fail-rate", type=float, default=0.1)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[8, 32, 64])
+    parser.add_argument("--per-host", type=int, default=16)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        # The server port goes into the manifest, so pick it before writing
+        with socket.socket() as s:
+            s.bind(("127.0.0.1", 0))
+            port = s.getsockname()[1]
+        manifest = make_manifest(directory, args.files, args.size_kb * 1024, args.hosts, port)
+        dataset = Dataset(manifest)
+        blob_dir = os.path.join(directory, "blobs")
+        total_mb = args.files * args.size_kb * 1024 / 1e6
+        print(f"{args.files} files, {total_mb:.0f} MB over {args.hosts} hosts, "
+              f"{args.latency_ms:.0f} ms latency, {args.fail_rate:.0%} failing on first request")
+        print(f"{'run':<24} {'seconds':>8} {'MB/s':>7} {'files/s':>8} {'retries':>8} {'resumed':>8} {'bad':>4}")
+
+        def run_server(fail_rate):
+            ready = multiprocessing.Event()
+            process = multiprocessing.Process(target=serve, args=(blob_dir, port, args.latency_ms / 1000, fail_rate, ready),
+                                              daemon=True)
+            process.start()
+            ready.wait(30)
+            return process
+
+        server = run_server(0.0)
+        cache = ImageCache(os.path.join(directory, "cache-sequential"), max_bytes=1 << 40)
+        started = time.perf_counter()
+        for record in dataset:
+            cache.resolve(record["original"])
+            cache.resolve(record["processed"])
+        seconds = time.perf_counter() - started
+        print(f"{'sequential (app fetch)':<24} {seconds:>8.1f} {total_mb / seconds:>7.1f} {args.files / seconds:>8.1f} "
+              f"{0:>8} {0:>8} {check(dataset, cache):>4}")
+        server.terminate()
+        server.join()
+
+        for concurrency in args.concurrency:
+            server = run_server(args.fail_rate)
+            cache = ImageCache(os.path.join(directory, f"cache-{concurrency}"), max_bytes=1 << 40)
+            items, _ = remote_assets(dataset, cache)
+            stats = asyncio.run(ingest(items, cache, concurrency, args.per_host, log=lambda message: None))
+            print(f"{f'ingest, concurrency {concurrency}':<24} {stats['seconds']:>8.1f} {stats['mb_per_second']:>7.1f} "
+                  f"{stats['files_per_second']:>8.1f} {stats['retries']:>8} {stats['resumed']:>8} "
+                  f"{check(dataset, cache) + stats['failed']:>4}")
+            server.terminate()
+            server.join()
+
+
+if __name__ == "__main__":
+    main()
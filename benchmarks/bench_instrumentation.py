@@ -0,0 +1,81 @@
+"""Per-call overhead of the instrumentation hooks, disabled vs. enabled.
+
+Times ``section()``, ``count()`` and a ``measured`` function call in fresh
+interpreters with ``BRE_INSTRUMENT`` unset and set, against the bare
+operation they wrap::
+
+    python -m benchmarks.bench_instrumentation --calls 1000000
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_TIMING = """
+import json, sys, time
+from instrumentation import begin_rerun, count, end_rerun, measured, section
+
+calls = int(sys.argv[1])
+begin_rerun("bench")
+
+def bare():
+    return None
+
+wrapped = measured("bench", lambda: "bench")(bare)
+
+def timed(body):
+    started = time.perf_counter()
+    body()
+    return (time.perf_counter() - started) / calls * 1e9
+
+def loop_bare():
+    for _ in range(calls):
+        bare()
+
+def loop_section():
+    for _ in range(calls):
+        with section("bench"):
+            bare()
+
+def loop_count():
+    for _ in range(calls):
+        count("bench")
+        bare()
+
+def loop_measured():
+    for _ in range(calls):
+        wrapped()
+
+results = {"bare call": timed(loop_bare), "section()": timed(loop_section),
+           "count()": timed(loop_count), "measured fn": timed(loop_measured)}
+end_rerun()
+print(json.dumps(results))
+"""
+
+
+def run(calls, enabled):
+    env = dict(os.environ, BRE_INSTRUMENT="1" if enabled else "")
+    env.pop("BRE_INSTRUMENT_PROM", None)
+    env.pop("BRE_INSTRUMENT_JSONL", None)
+    out = subprocess.run([sys.executable, "-c", _TIMING, str(calls)],
+                         check=True, capture_output=True, text=True, cwd=ROOT, env=env)
+    return json.loads(out.stdout)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    disabled, enabled = run(args.calls, False), run(args.calls, True)
+    print(f"{'ns per call':<14} {'disabled':>10} {'enabled':>10}")
+    for name in disabled:
+        print(f"{name:<14} {disabled[name]:>10.0f} {enabled[name]:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
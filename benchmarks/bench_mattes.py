@@ -0,0 +1,141 @@
+"""Size, latency and exactness of matte storage against the current PNG cutouts.
+
+Uses the sample pairs shipped with the repo, scaled by each of ``--scales``,
+in two forms:
+
+- ``as shipped``: the PNG cutouts as they are. Their colors differ from the
+  decoded JPEG originals, so the mattes carry a residual.
+- ``exact colors``: the same alpha over the original's own pixels, as a
+  matting model that only adds an alpha channel would produce. The mattes
+  hold the alpha channel only.
+
+For each it reports bytes on disk, and bytes over the wire both for fetching
+a pair from remote storage and for the preview the browser receives. It
+times decoding the PNG against rebuilding the cutout from the original and
+matte, both on first use and from the cache. Every rebuilt cutout must match
+the PNG's RGBA pixels exactly::
+
+    python -m benchmarks.bench_mattes --scales 1 4 --repeat 5
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import image_cache  # noqa: E402
+from benchmarks.bench_ratings_store import _percentile  # noqa: E402
+from mattes import cutout_for, write_matte  # noqa: E402
+from previews import preview_for  # noqa: E402
+
+
+def sample_pairs(directory, scale, exact_colors):
+    """Copies of the repo's sample pairs in ``directory``, resized by ``scale``"""
+    pairs = []
+    for processed in sorted(glob.glob(os.path.join(ROOT, "*_bg_removed.png"))):
+        original = processed.replace("_bg_removed.png", "_original.jpg")
+        stem = os.path.basename(processed).replace("_bg_removed.png", "")
+        with Image.open(original) as im:
+            rgb = im.convert("RGB")
+        with Image.open(processed) as im:
+            cutout = im.convert("RGBA")
+        if scale != 1:
+            size = (rgb.width * scale, rgb.height * scale)
+            rgb, cutout = rgb.resize(size, Image.LANCZOS), cutout.resize(size, Image.LANCZOS)
+        original_path = os.path.join(directory, f"{stem}_original.jpg")
+        rgb.save(original_path, quality=90)
+        if exact_colors:
+            with Image.open(original_path) as im:
+                decoded = np.asarray(im.convert("RGB"))
+            alpha = np.asarray(cutout)[..., 3]
+            cutout = Image.fromarray(np.dstack((np.where((alpha > 0)[..., None], decoded, 0).astype(np.uint8), alpha)))
+        processed_path = os.path.join(directory, f"{stem}_bg_removed.png")
+        cutout.save(processed_path, optimize=True)
+        pairs.append((original_path, processed_path))
+    return pairs
+
+
+def measure(pairs, directory, repeat):
+    """Sizes, latencies and exactness for one set of pairs"""
+    sizes = {"original": 0, "png": 0, "matte": 0, "png_preview": 0, "matte_preview": 0}
+    decode, cold, warm = [], [], []
+    exact = True
+    for original, processed in pairs:
+        matte = write_matte(original, processed)
+        if matte is None:
+            sys.exit(f"{processed} was not stored as a matte")
+        with Image.open(processed) as im:
+            reference = np.asarray(im.convert("RGBA"))
+        for _ in range(repeat):
+            started = time.perf_counter()
+            with Image.open(processed) as im:
+                np.asarray(im.convert("RGBA"))
+            decode.append(time.perf_counter() - started)
+
+            cutout_dir = tempfile.mkdtemp(dir=directory)
+            image_cache._digests.clear()
+            started = time.perf_counter()
+            rebuilt = cutout_for(original, matte, cutout_dir)
+            cold.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            cutout_for(original, matte, cutout_dir)
+            warm.append(time.perf_counter() - started)
+            with Image.open(rebuilt) as im:
+                exact &= np.array_equal(np.asarray(im), reference)
+        preview_dir = os.path.join(directory, "previews")
+        sizes["original"] += os.path.getsize(original)
+        sizes["png"] += os.path.getsize(processed)
+        sizes["matte"] += os.path.getsize(matte)
+        png_preview = preview_for(processed, "Side-by-Side", preview_dir)
+        sizes["png_preview"] += os.path.getsize(png_preview)
+        shutil.rmtree(preview_dir)
+        matte_preview = preview_for(rebuilt, "Side-by-Side", preview_dir)
+        sizes["matte_preview"] += os.path.getsize(matte_preview)
+        shutil.rmtree(preview_dir)
+    return sizes, decode, cold, warm, exact
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per pair")
+    args = parser.parse_args(argv)
+
+    exact = True
+    for scale in args.scales:
+        for exact_colors in (False, True):
+            with tempfile.TemporaryDirectory() as directory:
+                pairs = sample_pairs(directory, scale, exact_colors)
+                with Image.open(pairs[0][0]) as im:
+                    size = im.size
+                sizes, decode, cold, warm, pairs_exact = measure(pairs, directory, args.repeat)
+            exact &= pairs_exact
+            png_pairs, matte_pairs = sizes["original"] + sizes["png"], sizes["original"] + sizes["matte"]
+            print(f"{len(pairs)} pairs at {size[0]}x{size[1]}, {'exact colors' if exact_colors else 'as shipped'}:")
+            print(f"  cutouts on disk   PNG {sizes['png'] / 1024:8.1f} KB  matte {sizes['matte'] / 1024:8.1f} KB "
+                  f"({1 - sizes['matte'] / sizes['png']:.0%} smaller)")
+            print(f"  pairs over wire   PNG {png_pairs / 1024:8.1f} KB  matte {matte_pairs / 1024:8.1f} KB "
+                  f"({1 - matte_pairs / png_pairs:.0%} smaller, original included)")
+            print(f"  browser preview   PNG {sizes['png_preview'] / 1024:8.1f} KB  matte {sizes['matte_preview'] / 1024:8.1f} KB")
+            print(f"  PNG decode        p50 {_percentile(decode, 0.50) * 1000:6.1f} ms  "
+                  f"p95 {_percentile(decode, 0.95) * 1000:6.1f} ms")
+            print(f"  rebuild, cold     p50 {_percentile(cold, 0.50) * 1000:6.1f} ms  "
+                  f"p95 {_percentile(cold, 0.95) * 1000:6.1f} ms")
+            print(f"  rebuild, cached   p50 {_percentile(warm, 0.50) * 1000:6.1f} ms  "
+                  f"p95 {_percentile(warm, 0.95) * 1000:6.1f} ms")
+            print(f"  pixel-exact: {pairs_exact}")
+    if not exact:
+        sys.exit("a rebuilt cutout differs from its PNG")
+
+
+if __name__ == "__main__":
+    main()
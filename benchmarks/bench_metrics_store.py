@@ -0,0 +1,70 @@
+"""Throughput and memory of the metrics precompute job across worker counts.
+
+Generates a synthetic manifest of distinct image pairs, then runs
+``metrics_store.py`` once per worker count against a fresh database and
+reports pairs/sec and peak RSS::
+
+    python -m benchmarks.bench_metrics_store --pairs 400 --workers 1 2 4 8
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+from PIL import Image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def make_pairs(directory, count, size=(1024, 768), seed=0):
+    """Write ``count`` synthetic original/cutout pairs and a JSONL manifest for them"""
+    rng = np.random.default_rng(seed)
+    w, h = size
+    yy, xx = np.mgrid[0:h, 0:w]
+    manifest = os.path.join(directory, "manifest.jsonl")
+    with open(manifest, "w") as f:
+        for i in range(count):
+            background = rng.integers(0, 256, 3)
+            rgb = np.empty((h, w, 3), dtype=np.uint8)
+            rgb[:] = background
+            rgb += rng.integers(0, 12, (h, w, 3), dtype=np.uint8)
+            cx, cy, r = rng.integers(w // 4, 3 * w // 4), rng.integers(h // 4, 3 * h // 4), rng.integers(h // 8, h // 3)
+            distance = np.hypot(xx - cx, yy - cy)
+            alpha = np.clip((r - distance) / rng.uniform(0.5, 6), 0, 1)
+            rgb[distance < r] = rng.integers(0, 256, 3)
+            cutout = np.dstack([rgb, (alpha * 255).astype(np.uint8)])
+            original_path = os.path.join(directory, f"{i:06d}_original.jpg")
+            processed_path = os.path.join(directory, f"{i:06d}_bg_removed.png")
+            Image.fromarray(rgb).save(original_path, quality=90)
+            Image.fromarray(cutout, "RGBA").save(processed_path)
+            f.write(json.dumps({"id": i, "name": f"pair {i}", "original": original_path, "processed": processed_path}) + "\n")
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pairs", type=int, default=200)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, os.cpu_count()])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = make_pairs(directory, args.pairs)
+        print(f"{'workers':>8} {'pairs/s':>10} {'main RSS MiB':>13} {'worker RSS MiB':>15}")
+        for workers in args.workers:
+            db = os.path.join(directory, f"metrics_{workers}.sqlite3")
+            out = subprocess.run(
+                [sys.executable, os.path.join(ROOT, "metrics_store.py"),
+                 "--manifest", manifest, "--db", db, "--workers", str(workers), "--json"],
+                check=True, capture_output=True, text=True, cwd=ROOT,
+            )
+            stats = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{workers:>8} {stats['pairs_per_second']:>10.1f} "
+                  f"{stats['peak_rss_mb']:>13.0f} {stats['peak_worker_rss_mb']:>15.0f}")
+
+
+if __name__ == "__main__":
+    main()
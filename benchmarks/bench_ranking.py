@@ -0,0 +1,113 @@
+"""Cost and accuracy of the incremental pairwise model ranking.
+
+Simulates ``--comparisons`` votes between ``--models`` models with known
+Bradley-Terry strengths, arriving in batches of ``--batch``. Each batch is
+folded into ``PairwiseRanking`` and the fit is brought up to date, which is
+what a dashboard view does. That is compared with refitting from the full vote
+history. The benchmark then checks the recovered order against the true
+strengths and times loading every vote from a ratings database::
+
+    python -m benchmarks.bench_ranking --models 40 --comparisons 300000 --batch 100
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ranking import PairwiseRanking  # noqa: E402
+from ratings_store import RatingsStore  # noqa: E402
+
+
+def make_votes(models, comparisons, tie_rate=0.05, seed=0):
+    """Random pairings decided by true Bradley-Terry strengths; returns ``(true strengths, winners, losers, ties)``"""
+    rng = np.random.default_rng(seed)
+    strengths = rng.normal(0, 1, models)
+    first = rng.integers(0, models, comparisons)
+    second = (first + rng.integers(1, models, comparisons)) % models
+    first_wins = rng.random(comparisons) < 1 / (1 + np.exp(strengths[second] - strengths[first]))
+    winners = np.where(first_wins, first, second)
+    losers = np.where(first_wins, second, first)
+    ties = rng.random(comparisons) < tie_rate
+    return strengths, winners, losers, ties
+
+
+def spearman(a, b):
+    rank_a, rank_b = np.argsort(np.argsort(a)), np.argsort(np.argsort(b))
+    return np.corrcoef(rank_a, rank_b)[0, 1]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--models", type=int, default=40)
+    parser.add_argument("--comparisons", type=int, default=300_000)
+    parser.add_argument("--batch", type=int, default=100)
+    parser.add_argument("--refits", type=int, default=5, help="full-history refits to time")
+    args = parser.parse_args(argv)
+
+    strengths, winners, losers, ties = make_votes(args.models, args.comparisons)
+    names = np.array([f"model-{i:03d}" for i in range(args.models)])
+    print(f"{args.models} models, {args.comparisons} comparisons in batches of {args.batch}")
+
+    ranking = PairwiseRanking()
+    update_ms, iterations = [], []
+    for start in range(0, args.comparisons, args.batch):
+        stop = start + args.batch
+        started = time.perf_counter()
+        ranking.add(names[winners[start:stop]], names[losers[start:stop]], ties[start:stop])
+        iterations.append(ranking.fit())
+        update_ms.append((time.perf_counter() - started) * 1000)
+    update_ms = np.array(update_ms)
+    print(f"incremental update: mean {update_ms.mean():.2f} ms, p95 {np.percentile(update_ms, 95):.2f} ms, "
+          f"max {update_ms.max():.2f} ms, {np.mean(iterations):.1f} MM iterations on average")
+
+    # Refit on all history, as a per-rerun recomputation would
+    refit_ms = []
+    for _ in range(args.refits):
+        started = time.perf_counter()
+        full = PairwiseRanking()
+        full.add(names[winners], names[losers], ties)
+        cold_iterations = full.fit()
+        refit_ms.append((time.perf_counter() - started) * 1000)
+    print(f"refit on all {args.comparisons} comparisons: {np.median(refit_ms):.0f} ms "
+          f"({cold_iterations} MM iterations from a cold start)")
+
+    fitted = np.array([ranking.log_strengths[ranking.codes[name]] for name in names])
+    drift = np.abs(fitted - np.array([full.log_strengths[full.codes[name]] for name in names])).max()
+    print(f"Spearman ρ between fitted and true strengths: {spearman(fitted, strengths):.4f}; "
+          f"incremental vs. refit max difference {drift:.2e} (log strength)")
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = RatingsStore(os.path.join(directory, "ratings.sqlite3"))
+        rows = [("annotator", "session", "original", names[w], names[l], int(t), 1.7e9 + i)
+                for i, (w, l, t) in enumerate(zip(winners, losers, ties))]
+        conn = store._read_conn
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO comparisons VALUES (?, ?, ?, ?, ?, ?, ?)", rows[:-args.batch])
+        conn.execute("COMMIT")
+
+        stored = PairwiseRanking()
+        started = time.perf_counter()
+        stored.refresh(store)
+        stored.fit()
+        cold_ms = (time.perf_counter() - started) * 1000
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO comparisons VALUES (?, ?, ?, ?, ?, ?, ?)", rows[-args.batch:])
+        conn.execute("COMMIT")
+        started = time.perf_counter()
+        stored.refresh(store)
+        table = stored.table()
+        warm_ms = (time.perf_counter() - started) * 1000
+        store.close()
+    print(f"ratings database: first load {cold_ms:.0f} ms, then {warm_ms:.1f} ms for {args.batch} new votes "
+          f"(top model {table[0]['model']}, Elo {table[0]['elo']:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Scripted replay of an annotator: ratings per hour, buttons vs. rapid mode.
+
+Replays the same sequence of scores through ``app.py`` with ``AppTest``, once
+clicking the rating and "Next →" buttons (two server round trips per image)
+and once through rapid mode, where the keyboard component sends ratings in
+batches (one round trip per batch). The server time measured per rating is
+added to a fixed human cost per image — ``--think`` seconds to judge the pair
+plus ``--pointer`` seconds per mouse click or ``--keystroke`` seconds per key —
+to estimate ratings per annotator-hour::
+
+    python -m benchmarks.bench_rapid --images 40
+
+AppTest reruns the whole script for every interaction, so the server times are
+an upper bound for both modes.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metrics_store import make_pairs  # noqa: E402
+
+
+def replay_buttons(scores):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    started = time.perf_counter()
+    for score in scores:
+        current = at.session_state.current_image
+        at.button(f"rating_btn_{current}_{score}").click().run()
+        navigation = f"next_{current}" if any(b.key == f"next_{current}" for b in at.button) else f"submit_{current}"
+        at.button(navigation).click().run()
+    elapsed = time.perf_counter() - started
+    assert at.session_state.evaluation_complete, "button replay did not finish the evaluation"
+    return elapsed, 2 * len(scores)
+
+
+def replay_rapid(scores, batch_size):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(os.path.join(ROOT, "app.py"), default_timeout=60)
+    at.run()
+    at.toggle(key="rapid_mode").set_value(True).run()
+    started = time.perf_counter()
+    position = 0
+    for start in range(0, len(scores), batch_size):
+        # The component rates images in the order the server queued them
+        ratings = [[position + i, int(score)] for i, score in enumerate(scores[start:start + batch_size])]
+        position += len(ratings)
+        at.session_state["rapid_annotator"] = {"batches": [{"id": f"batch-{start}", "ratings": ratings}], "sent": start}
+        at.run()
+    elapsed = time.perf_counter() - started
+    assert at.session_state.evaluation_complete, "rapid replay did not finish the evaluation"
+    return elapsed, -(-len(scores) // batch_size)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=5)
+    parser.add_argument("--think", type=float, default=2.0, help="seconds to judge one pair")
+    parser.add_argument("--pointer", type=float, default=0.6, help="seconds to aim and click a button")
+    parser.add_argument("--keystroke", type=float, default=0.2, help="seconds to press a key")
+    args = parser.parse_args(argv)
+
+    scores = np.random.default_rng(0).integers(1, 6, args.images)
+    with tempfile.TemporaryDirectory() as directory:
+        manifest = make_pairs(directory, args.images, size=(1600, 1200))
+        os.environ.update(
+            BRE_MANIFEST=manifest,
+            BRE_CACHE_DIR=os.path.join(directory, "cache"),
+            BRE_PREVIEW_DIR=os.path.join(directory, "previews"),
+            BRE_METRICS_DB=os.path.join(directory, "metrics.sqlite3"),
+            BRE_RATINGS_DB=os.path.join(directory, "ratings.sqlite3"),
+        )
+        results = [
+            ("buttons", *replay_buttons(scores), args.think + 2 * args.pointer),
+            ("rapid mode", *replay_rapid(scores, args.batch_size), args.think + args.keystroke),
+        ]
+
+    print(f"{'mode':<12} {'round trips':>12} {'server s/rating':>16} {'ratings/hour':>13}")
+    for label, elapsed, round_trips, human in results:
+        # Rapid mode sends batches in the background, so the annotator never waits on them
+        waiting = elapsed / args.images if label == "buttons" else 0.0
+        print(f"{label:<12} {round_trips:>12} {elapsed / args.images:>16.3f} {3600 / (human + waiting):>13.0f}")
+
+
+if __name__ == "__main__":
+    main()
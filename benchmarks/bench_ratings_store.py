@@ -0,0 +1,100 @@
+"""Concurrency load test for the ratings store.
+
+Simulates Streamlit server processes, each hosting many annotator sessions on
+their own threads, all writing to one database. Reports rating-click latency
+(the time ``record`` holds the script thread), commit throughput, and checks
+that every submitted rating was persisted::
+
+    python -m benchmarks.bench_ratings_store --processes 4 --sessions 24 --ratings 200
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ratings_store import RatingsStore, new_session_id  # noqa: E402
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def run_server(db_path, sessions, ratings, think_time, results):
+    """One simulated server process: ``sessions`` threads sharing a RatingsStore"""
+    store = RatingsStore(db_path)
+    latencies = []
+    lock = threading.Lock()
+
+    def annotator(n):
+        session = new_session_id()
+        store.start_session(f"annotator-{os.getpid()}-{n}", session)
+        local = []
+        for index in range(ratings):
+            time.sleep(random.uniform(0, think_time))
+            started = time.perf_counter()
+            store.record(f"annotator-{n}", session, index, index, random.randint(1, 5))
+            local.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=annotator, args=(n,)) for n in range(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    store.close()
+    results.put(latencies)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ratings store concurrency load test")
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=24, help="sessions per process")
+    parser.add_argument("--ratings", type=int, default=200, help="ratings per session")
+    parser.add_argument("--think-time", type=float, default=0.002, help="max seconds between clicks")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "ratings.sqlite3")
+        RatingsStore(db_path).close()
+        results = multiprocessing.Queue()
+        started = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=run_server, args=(db_path, args.sessions, args.ratings, args.think_time, results))
+            for _ in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        latencies = []
+        for _ in procs:
+            latencies.extend(results.get())
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - started
+
+        expected = args.processes * args.sessions * args.ratings
+        stored = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM ratings").fetchone()[0]
+
+    print(f"{args.processes} processes x {args.sessions} sessions x {args.ratings} ratings")
+    print(f"stored {stored}/{expected} ratings in {elapsed:.2f}s ({stored / elapsed:,.0f} ratings/s)")
+    print(
+        "record() latency: "
+        f"p50 {_percentile(latencies, 0.50) * 1e6:.0f}us  "
+        f"p99 {_percentile(latencies, 0.99) * 1e6:.0f}us  "
+        f"max {max(latencies) * 1e6:.0f}us"
+    )
+    if stored != expected:
+        sys.exit("ratings were lost")
+
+
+if __name__ == "__main__":
+    main()
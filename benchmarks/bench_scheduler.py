@@ -0,0 +1,116 @@
+"""Offline replay comparing image schedulers.
+
+Builds a synthetic dataset whose categories differ in size and in how much
+human scores vary, with objective metrics that partly predict the score.
+Each scheduler then "rates" images in the order it chooses until the 95%
+confidence interval of the stratified average is narrower than the target,
+which is the confidence the executive summary's average needs. Reports
+ratings needed and per-decision latency::
+
+    python -m benchmarks.bench_scheduler --images 20000 --half-width 0.05
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import AnalyticsEngine  # noqa: E402
+from scheduler import SCHEDULERS, LinearScheduler, SchedulerIndex, difficulty  # noqa: E402
+
+# name: (share of dataset, mean score, score std)
+CATEGORIES = {
+    "Portrait": (0.45, 4.3, 0.5),
+    "Product": (0.35, 4.0, 0.9),
+    "Food": (0.15, 3.4, 1.3),
+    "Hair": (0.05, 2.8, 1.4),
+}
+
+
+def make_dataset(n, rng):
+    names = list(CATEGORIES)
+    shares = np.array([CATEGORIES[name][0] for name in names])
+    codes = rng.choice(len(names), size=n, p=shares / shares.sum())
+    means = np.array([CATEGORIES[name][1] for name in names])[codes]
+    stds = np.array([CATEGORIES[name][2] for name in names])[codes]
+    hardness = rng.normal(size=n)
+    latent = means - 0.6 * stds * hardness + 0.8 * stds * rng.normal(size=n)
+    scores = np.clip(np.rint(latent), 1, 5).astype(int)
+    metric_rows = [
+        {
+            "fringe_ratio": 0.02 + 0.01 * h + 0.01 * e,
+            "halo_bleed": 0.2 + 0.05 * h,
+            "stray_islands": max(0, round(h + e)),
+            "edge_sharpness": 0.3 - 0.03 * h,
+        }
+        for h, e in zip(hardness, rng.normal(size=n))
+    ]
+    return names, codes, scores, metric_rows
+
+
+def half_width(codes, scores, rated, sizes):
+    """95% CI half-width of the stratified mean, or inf until every stratum has 2 ratings"""
+    total = sizes.sum()
+    variance = 0.0
+    for c, size in enumerate(sizes):
+        taken = scores[rated[codes[rated] == c]] if len(rated) else []
+        if len(taken) < 2:
+            return np.inf
+        weight = size / total
+        variance += weight ** 2 * np.var(taken, ddof=1) / len(taken) * (1 - len(taken) / size)
+    return 1.96 * np.sqrt(variance)
+
+
+def replay(scheduler, names, codes, scores, target, check_every):
+    n = len(codes)
+    sizes = np.bincount(codes, minlength=len(names))
+    engine = AnalyticsEngine(n)
+    ratings, cursors = {}, {}
+    order = []
+    current = 0
+    decide = 0.0
+    while True:
+        ratings[current] = scores[current]
+        engine.update(None, int(scores[current]), {"category": names[codes[current]]})
+        order.append(current)
+        if len(order) % check_every == 0 and half_width(codes, scores, np.array(order), sizes) <= target:
+            break
+        started = time.perf_counter()
+        current = scheduler.next_index(current, ratings, cursors, engine, n)
+        decide += time.perf_counter() - started
+        if current is None:
+            break
+    return len(order), decide / max(1, len(order) - 1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Scheduler replay benchmark")
+    parser.add_argument("--images", type=int, default=20000)
+    parser.add_argument("--half-width", type=float, default=0.05)
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--check-every", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"target: 95% CI of the average within ±{args.half_width} on {args.images} images")
+    print(f"{'scheduler':>12} {'ratings':>9} {'of dataset':>11} {'us/decision':>12}")
+    results = {cls.name: [] for cls in SCHEDULERS}
+    for _ in range(args.trials):
+        names, codes, scores, metric_rows = make_dataset(args.images, rng)
+        index = SchedulerIndex(names, codes, difficulty(metric_rows))
+        for cls in SCHEDULERS:
+            scheduler = cls() if cls is LinearScheduler else cls(index)
+            results[cls.name].append(replay(scheduler, names, codes, scores, args.half_width, args.check_every))
+    for name, runs in results.items():
+        used = np.mean([r[0] for r in runs])
+        latency = np.mean([r[1] for r in runs]) * 1e6
+        print(f"{name:>12} {used:>9.0f} {used / args.images:>11.1%} {latency:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
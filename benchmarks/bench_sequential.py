@@ -0,0 +1,77 @@
+"""Simulation of sequential early stopping on synthetic evaluation rounds.
+
+Each trial draws a dataset of ratings from a score distribution whose true
+average sits near the 4.0 threshold, replays it in random order through
+``sequential.assess`` and stops at the first settled verdict. Reports the
+share of ratings saved and how often the early verdict disagrees with the
+verdict from rating every image::
+
+    python -m benchmarks.bench_sequential --images 500 --trials 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from analytics import PASS_THRESHOLD  # noqa: E402
+from sequential import assess  # noqa: E402
+
+# Score distributions with true averages from clearly failing to clearly passing
+SCENARIOS = {
+    "avg 3.0": [0.10, 0.20, 0.35, 0.20, 0.15],
+    "avg 3.6": [0.03, 0.10, 0.25, 0.40, 0.22],
+    "avg 3.9": [0.02, 0.06, 0.20, 0.40, 0.32],
+    "avg 4.1": [0.01, 0.04, 0.15, 0.42, 0.38],
+    "avg 4.5": [0.00, 0.02, 0.06, 0.30, 0.62],
+}
+
+
+def replay(scores, error_rate, check_every):
+    """Ratings consumed and verdict when replaying ``scores`` until the test settles"""
+    histogram = np.zeros(5, dtype=np.int64)
+    for n, score in enumerate(scores, 1):
+        histogram[score - 1] += 1
+        if n % check_every == 0 or n == len(scores):
+            result = assess(histogram, error_rate)
+            if result["decision"] is not None:
+                return n, result["decision"] == "pass"
+    return len(scores), histogram @ np.arange(1, 6) / len(scores) >= PASS_THRESHOLD
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Sequential early-stopping simulation")
+    parser.add_argument("--images", type=int, default=500)
+    parser.add_argument("--trials", type=int, default=200)
+    parser.add_argument("--error-rates", type=float, nargs="+", default=[0.01, 0.05, 0.1])
+    parser.add_argument("--check-every", type=int, default=1, help="re-assess after every N ratings")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    print(f"{'scenario':>9} {'error':>6} {'ratings used':>13} {'saved':>7} {'wrong':>7} {'ms/assess':>10}")
+    for name, probabilities in SCENARIOS.items():
+        for error_rate in args.error_rates:
+            used, wrong, assess_time, assessments = [], 0, 0.0, 0
+            for _ in range(args.trials):
+                scores = rng.choice(np.arange(1, 6), size=args.images, p=probabilities)
+                full_verdict = scores.mean() >= PASS_THRESHOLD
+                started = time.perf_counter()
+                n, verdict = replay(scores, error_rate, args.check_every)
+                assess_time += time.perf_counter() - started
+                assessments += n // args.check_every
+                used.append(n)
+                wrong += verdict != full_verdict
+            mean_used = float(np.mean(used))
+            print(
+                f"{name:>9} {error_rate:>6.2f} {mean_used:>13.1f} {1 - mean_used / args.images:>7.1%} "
+                f"{wrong / args.trials:>7.1%} {assess_time / max(1, assessments) * 1000:>10.2f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Cold-start cost of the Streamlit entry point.
+
+Runs two fresh interpreters against a small synthetic dataset:
+
+- the module-level imports of ``app.py`` under ``python -X importtime``,
+  reporting total import time and the slowest top-level packages;
+- ``app.py`` rendered once through ``AppTest``, reporting first- and
+  second-render latency of the evaluation page.
+
+With ``--check`` the script exits non-zero if the app imports a heavy package
+(pandas, plotly, pyarrow) at startup beyond what ``import streamlit`` already
+loads, or the first render exceeds ``--budget-ms``, so it can guard against
+regressions::
+
+    python -m benchmarks.bench_startup --check --budget-ms 3000
+"""
+
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_metrics_store import make_pairs  # noqa: E402
+
+HEAVY_PACKAGES = ("pandas", "plotly", "pyarrow")
+
+_RENDER = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+loaded = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=120)
+at.run()
+first = time.perf_counter()
+at.run()
+second = time.perf_counter()
+if at.exception:
+    raise SystemExit(at.exception[0].message)
+print(json.dumps({"harness": loaded - started, "first": first - loaded, "second": second - first}))
+"""
+
+
+def module_imports(path):
+    """Source of the module-level import statements of a script"""
+    with open(path) as f:
+        source = f.read()
+    tree = ast.parse(source)
+    return "\n".join(
+        ast.get_source_segment(source, node) for node in tree.body if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_times(code, env):
+    """Cumulative microseconds per directly imported package, and every package loaded, from ``-X importtime``"""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", code],
+                         check=True, capture_output=True, text=True, cwd=ROOT, env=env)
+    packages, loaded = {}, set()
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        loaded.add(name.strip().split(".")[0])
+        # Top-level imports are the ones without indentation in the tree
+        if not name.startswith("  "):
+            package = name.strip().split(".")[0]
+            packages[package] = packages.get(package, 0) + int(cumulative)
+    return packages, loaded
+
+
+def render_times(script, env):
+    out = subprocess.run([sys.executable, "-c", _RENDER, script],
+                         check=True, capture_output=True, text=True, cwd=ROOT, env=env)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--script", default=os.path.join(ROOT, "app.py"))
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--check", action="store_true", help="fail on heavy startup imports or a slow first render")
+    parser.add_argument("--budget-ms", type=float, default=3000)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = dict(
+            os.environ,
+            BRE_MANIFEST=make_pairs(directory, 5, size=(1600, 1200)),
+            BRE_CACHE_DIR=os.path.join(directory, "cache"),
+            BRE_PREVIEW_DIR=os.path.join(directory, "previews"),
+            BRE_METRICS_DB=os.path.join(directory, "metrics.sqlite3"),
+            BRE_RATINGS_DB=os.path.join(directory, "ratings.sqlite3"),
+        )
+        packages, loaded = import_times(module_imports(args.script), env)
+        _, framework = import_times("import streamlit", env)
+        render = render_times(args.script, env)
+
+    total = sum(packages.values())
+    print(f"module-level imports of {os.path.basename(args.script)}: {total / 1000:.0f} ms")
+    for package, micros in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {package:<24} {micros / 1000:>8.1f} ms")
+    print(f"first render:  {render['first'] * 1000:.0f} ms (after {render['harness'] * 1000:.0f} ms loading AppTest)")
+    print(f"second render: {render['second'] * 1000:.0f} ms")
+
+    preloaded = [package for package in HEAVY_PACKAGES if package in framework]
+    if preloaded:
+        print(f"loaded by streamlit itself: {', '.join(preloaded)}")
+    problems = [f"{package} is imported at startup" for package in HEAVY_PACKAGES if package in loaded - framework]
+    if render["first"] * 1000 > args.budget_ms:
+        problems.append(f"first render took {render['first'] * 1000:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    for problem in problems:
+        print(f"REGRESSION: {problem}")
+    if args.check and problems:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Event logging latency and dwell-time aggregation over a large event log.
+
+``--threads`` script threads replay ``--sessions`` annotator sessions into
+one ratings store. Each session shows ``--per-session`` images from a pool
+of ``--images``, with planted dwell times: lognormal around ``--median``
+seconds, three times longer on a tenth of the images, and an occasional long
+break. Every visit logs the image shown, sometimes a view-mode switch, the
+rating, sometimes a changed rating, and next. Event timestamps are synthetic,
+so the replay runs at full speed.
+
+Reports how long ``record_event`` holds the script thread and the write
+throughput. It then times a full refresh and report, and an incremental
+refresh after ``--append`` more sessions. It checks three things: every event
+was stored, the per-image percentiles equal those of the planted dwell
+times, and the slow images lead the ranking::
+
+    python -m benchmarks.bench_telemetry --sessions 2000 --per-session 100 --images 5000
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_ratings_store import _percentile  # noqa: E402
+from ratings_store import RatingsStore  # noqa: E402
+from telemetry import CHANGED, IDLE_SECONDS, NEXT, RATED, SHOWN, VIEW_MODE, DwellTimes  # noqa: E402
+
+
+def plan_sessions(sessions, per_session, images, median, seed=0, first=0):
+    """Planted visits per session: ``(image, dwell seconds, view switch, rating change)`` lists"""
+    rng = np.random.default_rng(seed + first)
+    slowness = np.where(np.arange(images) % 10 == 0, 3.0, 1.0)
+    plans = []
+    for _ in range(sessions):
+        shown = rng.choice(images, per_session, replace=False)
+        dwell = rng.lognormal(np.log(median), 0.5, per_session) * slowness[shown]
+        # An occasional visit left open over a break
+        dwell[rng.random(per_session) < 0.005] += IDLE_SECONDS
+        plans.append(list(zip(shown.tolist(), dwell.tolist(), (rng.random(per_session) < 0.2).tolist(),
+                              (rng.random(per_session) < 0.05).tolist())))
+    return plans
+
+
+def replay(store, session, plan, latencies):
+    """Log one session's events as the app would"""
+    ts = 1_700_000_000.0
+    annotator = f"annotator-{hash(session) % 50}"
+    for image, dwell, switched, changed in plan:
+        events = [(SHOWN, None, ts)]
+        if switched:
+            events.append((VIEW_MODE, "Checkerboard", ts + dwell * 0.3))
+        events.append((RATED, 3, ts + dwell * 0.6))
+        if changed:
+            events.append((CHANGED, 4, ts + dwell * 0.8))
+        events.append((NEXT, None, ts + dwell))
+        for kind, value, at in events:
+            started = time.perf_counter()
+            store.record_event(annotator, session, kind, image, f"image-{image}", value, at)
+            latencies.append(time.perf_counter() - started)
+        ts += dwell
+
+
+def run(store, plans, threads, offset=0):
+    """Replay sessions on ``threads`` script threads; returns record_event latencies"""
+    latencies = [[] for _ in range(threads)]
+
+    def worker(t):
+        for n in range(t, len(plans), threads):
+            replay(store, f"session-{offset + n}", plans[n], latencies[t])
+
+    workers = [threading.Thread(target=worker, args=(t,)) for t in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    store.flush()
+    return [latency for local in latencies for latency in local]
+
+
+def expected_percentiles(plans, images, q):
+    """Per-image quantile of the planted dwell times, breaks left out"""
+    values = [[] for _ in range(images)]
+    for plan in plans:
+        for image, dwell, _, _ in plan:
+            if dwell <= IDLE_SECONDS:
+                values[image].append(dwell)
+    return {f"image-{i}": float(np.quantile(v, q)) for i, v in enumerate(values) if v}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000)
+    parser.add_argument("--per-session", type=int, default=100, help="images shown per session")
+    parser.add_argument("--images", type=int, default=5000)
+    parser.add_argument("--median", type=float, default=8.0, help="median seconds per image")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--append", type=int, default=20, help="sessions added before the incremental refresh")
+    args = parser.parse_args(argv)
+
+    plans = plan_sessions(args.sessions, args.per_session, args.images, args.median)
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "ratings.sqlite3")
+        store = RatingsStore(db_path)
+        started = time.perf_counter()
+        latencies = run(store, plans, args.threads)
+        elapsed = time.perf_counter() - started
+        stored = sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM events").fetchone()[0]
+
+        dwell = DwellTimes()
+        started = time.perf_counter()
+        dwell.refresh(store)
+        refreshed = time.perf_counter()
+        report = dwell.report()
+        reported = time.perf_counter()
+
+        more = plan_sessions(args.append, args.per_session, args.images, args.median, first=args.sessions)
+        run(store, more, args.threads, offset=args.sessions)
+        started_incremental = time.perf_counter()
+        appended = dwell.refresh(store)
+        incremental = time.perf_counter() - started_incremental
+        started_report = time.perf_counter()
+        report = dwell.report()
+        rereported = time.perf_counter() - started_report
+        store.close()
+
+    print(f"{args.sessions} sessions x {args.per_session} images from {args.images}, {args.threads} threads")
+    print(f"stored {stored}/{len(latencies)} events in {elapsed:.2f}s ({stored / elapsed:,.0f} events/s)")
+    print(
+        "record_event() latency: "
+        f"p50 {_percentile(latencies, 0.50) * 1e6:.0f}us  "
+        f"p99 {_percentile(latencies, 0.99) * 1e6:.0f}us  "
+        f"max {max(latencies) * 1e6:.0f}us"
+    )
+    print(f"full refresh {refreshed - started:.2f}s, report {reported - refreshed:.2f}s; "
+          f"+{appended} events: refresh {incremental * 1000:.0f} ms, report {rereported:.2f}s")
+    print(f"{report['visits']} visits, {report['breaks']} breaks; median {report['overall']['p50']:.1f}s, "
+          f"p90 {report['overall']['p90']:.1f}s, {report['ratings_per_hour']:.0f} ratings per active hour")
+
+    expected = expected_percentiles(plans + more, args.images, 0.5)
+    measured = {row["key"]: row["p50"] for row in report["image"]}
+    exact = measured.keys() == expected.keys() and all(np.isclose(measured[key], expected[key]) for key in expected)
+    slow = {f"image-{i}" for i in range(0, args.images, 10)}
+    leading = sum(row["key"] in slow for row in report["image"][:len(slow) // 2])
+    print(f"per-image medians match the planted dwell times: {exact}; "
+          f"slow images among the {len(slow) // 2} slowest: {leading}")
+    if stored != len(latencies) or not exact or leading < len(slow) // 2 * 0.9:
+        sys.exit("dwell times are wrong")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Claim latency and correctness of the shared work queue under many concurrent sessions.
+
+Runs ``--processes`` server processes. Each one has ``--sessions`` session
+threads, and every session is its own rater. Sessions start at staggered
+times. A session claims a batch, rates each image after a random think time,
+and claims again until the queue runs dry. A fraction ``--abandon`` of the
+sessions walk away from their first batch without rating it. Those leases
+lapse after ``--lease`` seconds and go to other sessions. At the end the benchmark checks two things: every image has
+exactly ``--target`` ratings, and no rater rated an image twice::
+
+    python -m benchmarks.bench_work_queue --processes 4 --sessions 100 --images 2000 --target 3
+"""
+
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.bench_ratings_store import _percentile  # noqa: E402
+from work_queue import WorkQueue  # noqa: E402
+
+
+def run_session(queue, name, batch, think_time, abandon, deadline, claim_latencies, complete_latencies, rated):
+    """One annotator: claim, rate, repeat until every image is at target"""
+    rng = random.Random(name)
+    # Annotators don't all open the app in the same millisecond
+    time.sleep(rng.uniform(0, think_time * batch))
+    while time.time() < deadline:
+        started = time.perf_counter()
+        held = queue.claim(name, name, batch)
+        claim_latencies.append(time.perf_counter() - started)
+        if abandon:
+            return
+        if not held:
+            at_target, total, _ = queue.progress()
+            if at_target == total:
+                return
+            # Everything left is leased to someone else; wait for it to be rated or to lapse
+            time.sleep(0.5)
+            continue
+        for index in held:
+            time.sleep(rng.uniform(0, think_time))
+            started = time.perf_counter()
+            queue.complete(name, [index])
+            complete_latencies.append(time.perf_counter() - started)
+            rated.append((name, index))
+
+
+def run_server(db_path, process, target, sessions, batch, think_time, abandon, lease, timeout, results):
+    """One server process: a shared queue connection and a thread per session, as in the app"""
+    queue = WorkQueue(db_path, target, lease)
+    claim_latencies, complete_latencies, rated = [], [], []
+    deadline = time.time() + timeout
+    threads = [
+        threading.Thread(target=run_session, args=(
+            queue, f"rater-{process}-{i}", batch, think_time, i < sessions * abandon, deadline,
+            claim_latencies, complete_latencies, rated,
+        ))
+        for i in range(sessions)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    queue.close()
+    results.put((claim_latencies, complete_latencies, rated))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--sessions", type=int, default=100, help="sessions per process")
+    parser.add_argument("--images", type=int, default=2000)
+    parser.add_argument("--target", type=int, default=3, help="ratings per image")
+    parser.add_argument("--batch", type=int, default=5)
+    parser.add_argument("--think-time", type=float, default=1.0, help="max seconds spent rating one image")
+    parser.add_argument("--abandon", type=float, default=0.05, help="fraction of sessions that abandon their batch")
+    parser.add_argument("--lease", type=float, default=2.0, help="lease length in seconds")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = os.path.join(directory, "queue.sqlite3")
+        queue = WorkQueue(db_path, target=args.target)
+        queue.add_images(args.images)
+        results = multiprocessing.Queue()
+        started = time.perf_counter()
+        procs = [
+            multiprocessing.Process(target=run_server, args=(
+                db_path, p, args.target, args.sessions, args.batch, args.think_time, args.abandon, args.lease, args.timeout, results,
+            ))
+            for p in range(args.processes)
+        ]
+        for proc in procs:
+            proc.start()
+        claim_latencies, complete_latencies, rated = [], [], []
+        for _ in procs:
+            claims, completes, pairs = results.get()
+            claim_latencies.extend(claims)
+            complete_latencies.extend(completes)
+            rated.extend(pairs)
+        for proc in procs:
+            proc.join()
+        elapsed = time.perf_counter() - started
+        at_target, total, leased = queue.progress()
+        queue.close()
+
+    per_image = Counter(index for _, index in rated)
+    repeats = len(rated) - len(set(rated))
+    off_target = sum(1 for index in range(args.images) if per_image[index] != args.target)
+    print(f"{args.processes} processes x {args.sessions} sessions, {args.images} images x {args.target} ratings, "
+          f"batches of {args.batch}, {args.abandon:.0%} of sessions abandon a batch")
+    print(f"{len(rated)} ratings in {elapsed:.1f}s; {at_target}/{total} images at target, {leased} leases left")
+    for label, latencies in (("claim()", claim_latencies), ("complete()", complete_latencies)):
+        print(
+            f"{label:<11} {len(latencies):>6} calls  "
+            f"p50 {_percentile(latencies, 0.50) * 1000:.2f} ms  "
+            f"p95 {_percentile(latencies, 0.95) * 1000:.2f} ms  "
+            f"p99 {_percentile(latencies, 0.99) * 1000:.2f} ms  "
+            f"max {max(latencies) * 1000:.1f} ms"
+        )
+    print(f"images off target: {off_target}, repeat ratings by a rater: {repeats}")
+    if off_target or repeats:
+        sys.exit("the queue handed out an image too often")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""Grouped score distributions and the dashboard figures built from them.
+
+Breakdowns per category, model or annotator are groups x levels count
+matrices built with one ``bincount``, however many ratings there are. The
+store-wide latest score per (rater, image) is kept as sorted NumPy arrays and
+brought up to date from the rows appended since the last refresh, so a
+dashboard view after new ratings costs only the new rows. Figures are built
+without per-bar Python loops and cached under a hash of the ratings version
+they were built from. Breakdowns with many groups show the lowest- and
+highest-scoring groups as bars and every group as a (WebGL, when large)
+scatter, so figure size stays bounded. Plotly is imported only when a figure
+is built; this module has no Streamlit dependency.
+"""
+
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from analytics import SCORE_LEVELS
+
+LEVELS = len(SCORE_LEVELS)
+MAX_BARS = 30
+WEBGL_MIN_POINTS = 1000
+MAX_POINTS = 20000
+FIGURE_CACHE_SIZE = 64
+
+_LEVEL_VALUES = np.asarray(SCORE_LEVELS, dtype=np.float64)
+
+
+def version_hash(*parts):
+    """Short stable hash of whatever identifies a ratings version (scope, session, counters)"""
+    return hashlib.sha1(":".join(str(part) for part in parts).encode()).hexdigest()[:16]
+
+
+class GroupedDistribution:
+    """Score counts per group: ``keys`` and a groups x levels ``counts`` matrix"""
+
+    def __init__(self, keys, counts):
+        self.keys = np.asarray(keys, dtype=object)
+        self.counts = np.asarray(counts, dtype=np.int64).reshape(len(self.keys), LEVELS)
+
+    @classmethod
+    def from_codes(cls, keys, codes, scores):
+        """Counts from parallel arrays of group codes (indices into ``keys``) and 1-5 scores"""
+        flat = np.asarray(codes, dtype=np.int64) * LEVELS + (np.asarray(scores, dtype=np.int64) - 1)
+        return cls(keys, np.bincount(flat, minlength=len(keys) * LEVELS))
+
+    @classmethod
+    def from_aggregates(cls, aggregates):
+        """Counts from ``{key: RatingAggregate}``, e.g. ``AnalyticsEngine.breakdowns[field]``"""
+        items = [(key, aggregate.histogram) for key, aggregate in aggregates.items() if aggregate.count]
+        return cls([key for key, _ in items], [histogram for _, histogram in items] or np.zeros((0, LEVELS)))
+
+    def __len__(self):
+        return len(self.keys)
+
+    @property
+    def ratings(self):
+        return self.counts.sum(axis=1)
+
+    @property
+    def means(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.counts @ _LEVEL_VALUES / self.ratings
+
+    @property
+    def shares(self):
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.counts / self.ratings[:, None] * 100
+
+    def regroup(self, mapping):
+        """Sum counts into new groups, e.g. images into categories; keys mapping to None are dropped"""
+        targets = np.array([mapping(key) for key in self.keys], dtype=object)
+        keep = np.array([target is not None for target in targets], dtype=bool)
+        if not keep.any():
+            return GroupedDistribution([], np.zeros((0, LEVELS)))
+        new_keys, codes = np.unique(targets[keep].astype(str), return_inverse=True)
+        counts = np.zeros((len(new_keys), LEVELS), dtype=np.int64)
+        np.add.at(counts, codes, self.counts[keep])
+        return GroupedDistribution(new_keys, counts)
+
+    def select(self, limit=MAX_BARS):
+        """Indices of every group, or of the lowest- and highest-averaging ones when there are too many"""
+        order = np.argsort(self.means, kind="stable")
+        if len(order) <= limit:
+            return order
+        return np.concatenate([order[:limit // 2], order[-(limit - limit // 2):]])
+
+
+class LatestRatings:
+    """Latest score of every rater for every image in the ratings log, refreshed incrementally
+
+    State is three arrays sorted by a packed ``(rater code, image code)`` key, so
+    a refresh is a vectorized merge of the new rows and grouped counts are one
+    ``bincount``.
+    """
+
+    def __init__(self):
+        self.rowid = 0
+        self.rater_codes, self.image_codes = {}, {}
+        self.rater_names, self.image_ids = [], []
+        self.keys = np.empty(0, dtype=np.int64)
+        self.ts = np.empty(0, dtype=np.float64)
+        self.scores = np.empty(0, dtype=np.int8)
+        self._lock = threading.Lock()
+
+    def _code(self, codes, names, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def refresh(self, store):
+        """Fold in rows appended since the last refresh; returns how many were read"""
+        with self._lock:
+            rows = store.rows_since(self.rowid)
+            if not rows:
+                return 0
+            keys = np.fromiter(
+                ((self._code(self.rater_codes, self.rater_names, rater) << 32)
+                 | self._code(self.image_codes, self.image_ids, image_id)
+                 for _, rater, image_id, _, _ in rows),
+                dtype=np.int64, count=len(rows),
+            )
+            ts = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+            scores = np.fromiter((row[3] for row in rows), dtype=np.int8, count=len(rows))
+            self.rowid = rows[-1][0]
+
+            # Latest row per key within the batch (later rows win ties, as in SQL MAX(ts) over append order)
+            order = np.lexsort((np.arange(len(keys)), ts, keys))
+            last = np.append(keys[order][1:] != keys[order][:-1], True)
+            keys, ts, scores = keys[order][last], ts[order][last], scores[order][last]
+
+            position = np.searchsorted(self.keys, keys)
+            found = position < len(self.keys)
+            found[found] = self.keys[position[found]] == keys[found]
+            newer = found.copy()
+            newer[found] = ts[found] >= self.ts[position[found]]
+            self.ts[position[newer]] = ts[newer]
+            self.scores[position[newer]] = scores[newer]
+
+            fresh = ~found
+            self.keys = np.insert(self.keys, position[fresh], keys[fresh])
+            self.ts = np.insert(self.ts, position[fresh], ts[fresh])
+            self.scores = np.insert(self.scores, position[fresh], scores[fresh])
+            return len(rows)
+
+    def _with_duplicates(self, duplicates):
+        """``(image ids, keys, scores)`` with each rater's score of a representative copied to its near-duplicates
+
+        ``duplicates`` maps representative image ids to near-duplicate ids, as
+        ``dedupe.duplicate_ids`` does. A rater's own score of a near-duplicate
+        wins over the copy. The lock must be held.
+        """
+        if not duplicates:
+            return self.image_ids, self.keys, self.scores
+        extra = {}
+
+        def code(image_id):
+            found = self.image_codes.get(image_id)
+            return found if found is not None else extra.setdefault(image_id, len(self.image_ids) + len(extra))
+
+        pairs = [(self.image_codes[representative], code(member))
+                 for representative, members in duplicates.items() if representative in self.image_codes
+                 for member in members]
+        if not pairs:
+            return self.image_ids, self.keys, self.scores
+        source, target = np.array(pairs, dtype=np.int64).T
+        order = np.argsort(source, kind="stable")
+        source, target = source[order], target[order]
+
+        images = self.keys & 0xFFFFFFFF
+        counts = np.bincount(source, minlength=len(self.image_ids))[images]
+        entries = np.repeat(np.arange(len(self.keys)), counts)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        first = np.repeat(np.searchsorted(source, images), counts)
+        copies = ((self.keys[entries] >> 32) << 32) | target[first + offsets]
+        position = np.searchsorted(self.keys, copies)
+        own = position < len(self.keys)
+        own[own] = self.keys[position[own]] == copies[own]
+        return (self.image_ids + list(extra), np.concatenate([self.keys, copies[~own]]),
+                np.concatenate([self.scores, self.scores[entries][~own]]))
+
+    def by_rater(self, duplicates=None):
+        """Score counts per rater; ``duplicates`` counts each score for the image's near-duplicates too"""
+        with self._lock:
+            _, keys, scores = self._with_duplicates(duplicates)
+            return GroupedDistribution.from_codes(self.rater_names, keys >> 32, scores)
+
+    def by_image(self, duplicates=None):
+        """Score counts per image id; ``duplicates`` as in ``by_rater``"""
+        with self._lock:
+            image_ids, keys, scores = self._with_duplicates(duplicates)
+            return GroupedDistribution.from_codes(image_ids, keys & 0xFFFFFFFF, scores)
+
+
+class FigureCache:
+    """Small LRU of built figures keyed by ``(view, ratings version hash)``"""
+
+    def __init__(self, max_entries=FIGURE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._figures = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_build(self, key, build):
+        with self._lock:
+            if key in self._figures:
+                self._figures.move_to_end(key)
+                return self._figures[key]
+        figures = build()
+        with self._lock:
+            self._figures[key] = figures
+            while len(self._figures) > self.max_entries:
+                self._figures.popitem(last=False)
+        return figures
+
+
+def distribution_figure(histogram, labels, colors):
+    """Bar chart of one rating distribution with percentage labels, as a single trace"""
+    import plotly.graph_objects as go
+
+    counts = np.asarray(histogram, dtype=np.int64)
+    total = counts.sum()
+    percents = counts / total * 100 if total else np.zeros(len(counts))
+    fig = go.Figure(go.Bar(
+        x=labels,
+        y=counts,
+        marker_color=colors,
+        text=[f"{p:.1f}%" if c else "" for c, p in zip(counts, percents)],
+        textposition="outside",
+        textfont=dict(size=12, color="black"),
+        cliponaxis=False,
+    ))
+    fig.update_layout(
+        title="Distribution of Quality Ratings",
+        title_x=0.5,
+        xaxis_title="Rating Category",
+        yaxis_title="Number of Images",
+        showlegend=False,
+        height=400,
+    )
+    return fig
+
+
+def breakdown_figures(grouped, title, labels, colors, max_bars=MAX_BARS):
+    """Stacked score shares per group, plus an average-vs-ratings scatter of every group when they don't all fit"""
+    import plotly.graph_objects as go
+
+    shown = grouped.select(max_bars)
+    keys = [str(key) for key in grouped.keys[shown]]
+    shares = grouped.shares[shown]
+    means = grouped.means[shown]
+    ratings = grouped.ratings[shown]
+    hover = [f"{key}<br>average {mean:.2f} · {n} ratings" for key, mean, n in zip(keys, means, ratings)]
+
+    bars = go.Figure([
+        go.Bar(y=keys, x=shares[:, level], name=labels[level], orientation="h", marker_color=colors[level],
+               customdata=hover, hovertemplate="%{customdata}<br>" + labels[level] + ": %{x:.1f}%<extra></extra>")
+        for level in range(LEVELS)
+    ])
+    subtitle = "" if len(shown) == len(grouped) else f" ({len(shown) // 2} lowest and highest averages of {len(grouped)})"
+    bars.update_layout(
+        title=f"{title}{subtitle}",
+        barmode="stack",
+        xaxis_title="Share of ratings (%)",
+        height=max(300, 24 * len(keys) + 120),
+        legend_orientation="h",
+        yaxis_automargin=True,
+    )
+    if len(shown) == len(grouped):
+        return [bars]
+
+    # Every group as one point; beyond MAX_POINTS keep the most-rated groups
+    points = np.arange(len(grouped))
+    if len(points) > MAX_POINTS:
+        points = np.argsort(-grouped.ratings, kind="stable")[:MAX_POINTS]
+    trace = go.Scattergl if len(points) >= WEBGL_MIN_POINTS else go.Scatter
+    scatter = go.Figure(trace(
+        x=grouped.ratings[points],
+        y=grouped.means[points],
+        text=[str(key) for key in grouped.keys[points]],
+        mode="markers",
+        marker=dict(size=6, opacity=0.6, color=grouped.means[points], colorscale="RdYlGn", cmin=1, cmax=5),
+        hovertemplate="%{text}<br>average %{y:.2f} · %{x} ratings<extra></extra>",
+    ))
+    scatter.update_layout(
+        title=f"{title}: average vs. number of ratings ({len(points)} groups)",
+        xaxis_title="Ratings",
+        yaxis_title="Average score",
+        xaxis_type="log",
+        height=400,
+    )
+    return [bars, scatter]
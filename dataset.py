@@ -0,0 +1,300 @@
+"""Manifest-backed evaluation dataset.
+
+A manifest lists one image pair per record with the fields ``id``, ``name``,
+``original`` and ``processed`` plus optional ``category`` and ``model``, and
+optional ``original_sha256``/``processed_sha256`` checksums that bulk
+ingestion verifies downloads against.
+JSONL, CSV and Parquet manifests are supported. Records are never loaded all
+at once: text manifests get a persistent byte-offset index so any record can be
+reached with a single seek, Parquet manifests are addressed through their row
+group metadata, and only a small window of records around the current position
+is kept in memory. The index is written next to the manifest as ``.idx``, or
+under ``.cache/indexes`` (or ``BRE_INDEX_DIR``) when the manifest's directory
+is read-only. CSV records are found by quote-aware scanning, so quoted fields
+may span lines.
+"""
+
+import bisect
+import csv
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+
+DEFAULT_MANIFEST = os.environ.get(
+    "BRE_MANIFEST",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "manifest.jsonl"),
+)
+DEFAULT_INDEX_DIR = os.environ.get(
+    "BRE_INDEX_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "indexes"),
+)
+DEFAULT_WINDOW = 64
+PARQUET_BATCH_ROWS = 1024
+
+REQUIRED_FIELDS = ("id", "name", "original", "processed")
+OPTIONAL_FIELDS = ("category", "model", "original_sha256", "processed_sha256")
+
+_INDEX_MAGIC = b"BREIDX2\0"
+_INDEX_HEADER = struct.Struct("<8sQdQ")  # magic, source size, source mtime, record count
+_OFFSET = struct.Struct("<Q")
+
+
+def _normalize(raw, base_dir):
+    """Coerce a raw manifest row into the record shape used by the app"""
+    missing = [field for field in REQUIRED_FIELDS if raw.get(field) in (None, "")]
+    if missing:
+        raise ValueError(f"manifest record is missing {', '.join(missing)}: {raw!r}")
+
+    record = {field: raw[field] for field in REQUIRED_FIELDS}
+    if isinstance(record["id"], str) and record["id"].isdigit():
+        record["id"] = int(record["id"])
+    for field in ("original", "processed"):
+        ref = str(record[field])
+        if "://" not in ref and not os.path.isabs(ref):
+            ref = os.path.join(base_dir, ref)
+        record[field] = ref
+    for field in OPTIONAL_FIELDS:
+        value = raw.get(field)
+        record[field] = value if value not in ("", None) else None
+    return record
+
+
+def _records(f, fmt, offset):
+    """Yield ``(offset, bytes)`` for each record from the file position ``offset`` on, skipping blank lines
+
+    A CSV record continues onto the next line while a quoted field is open,
+    i.e. while it has an odd number of quote characters so far.
+    """
+    record, start = b"", offset
+    for line in f:
+        if not record:
+            start = offset
+        offset += len(line)
+        if not record and not line.strip():
+            continue
+        record += line
+        if fmt == "csv" and record.count(b'"') % 2:
+            continue
+        yield start, record
+        record = b""
+    if record:
+        yield start, record
+
+
+def _index_paths(source_path):
+    """Where the offset index may live: next to the manifest, then in the index cache directory"""
+    name = hashlib.sha256(source_path.encode()).hexdigest()[:16] + "-" + os.path.basename(source_path) + ".idx"
+    return [source_path + ".idx", os.path.join(DEFAULT_INDEX_DIR, name)]
+
+
+class _OffsetIndex:
+    """Memory-mapped table of record start offsets, rebuilt when the source changes"""
+
+    def __init__(self, source_path, fmt, first_record_offset=0):
+        st = os.stat(source_path)
+        paths = _index_paths(os.path.abspath(source_path))
+        self.path = next((path for path in paths if self._is_fresh(path, st)), None)
+        if self.path is None:
+            for path in paths:
+                try:
+                    self._build(path, source_path, fmt, st, first_record_offset)
+                except OSError:
+                    # Read-only manifest directory: fall back to the index cache
+                    if path == paths[-1]:
+                        raise
+                    continue
+                self.path = path
+                break
+        self._file = open(self.path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = _INDEX_HEADER.unpack_from(self._map, 0)[3]
+
+    @staticmethod
+    def _is_fresh(path, st):
+        try:
+            with open(path, "rb") as f:
+                header = f.read(_INDEX_HEADER.size)
+        except OSError:
+            return False
+        if len(header) != _INDEX_HEADER.size:
+            return False
+        magic, size, mtime, _ = _INDEX_HEADER.unpack(header)
+        return magic == _INDEX_MAGIC and size == st.st_size and mtime == st.st_mtime
+
+    @staticmethod
+    def _build(path, source_path, fmt, st, first_record_offset):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = path + ".tmp"
+        count = 0
+        with open(source_path, "rb") as src, open(tmp, "wb") as out:
+            out.write(_INDEX_HEADER.pack(_INDEX_MAGIC, 0, 0.0, 0))
+            src.seek(first_record_offset)
+            for offset, _ in _records(src, fmt, first_record_offset):
+                out.write(_OFFSET.pack(offset))
+                count += 1
+            out.seek(0)
+            out.write(_INDEX_HEADER.pack(_INDEX_MAGIC, st.st_size, st.st_mtime, count))
+        os.replace(tmp, path)
+
+    def offset(self, i):
+        return _OFFSET.unpack_from(self._map, _INDEX_HEADER.size + i * _OFFSET.size)[0]
+
+
+class _TextReader:
+    """Random access to line-oriented (JSONL/CSV) manifests through an offset index"""
+
+    def __init__(self, path, fmt):
+        self.path = path
+        self.fmt = fmt
+        self.fieldnames = None
+        header_end = 0
+        if fmt == "csv":
+            with open(path, "rb") as f:
+                header = f.readline()
+            header_end = len(header)
+            self.fieldnames = next(csv.reader([header.decode("utf-8-sig")]))
+        self.index = _OffsetIndex(path, fmt, header_end)
+        self._file = open(path, "rb")
+
+    def __len__(self):
+        return self.index.count
+
+    def read(self, start, stop):
+        """Yield raw rows for records in [start, stop) with a single seek"""
+        if start >= stop:
+            return
+        offset = self.index.offset(start)
+        self._file.seek(offset)
+        for produced, (_, record) in enumerate(_records(self._file, self.fmt, offset), 1):
+            text = record.decode("utf-8")
+            if self.fmt == "jsonl":
+                yield json.loads(text)
+            else:
+                yield dict(zip(self.fieldnames, next(csv.reader(io.StringIO(text)))))
+            if produced == stop - start:
+                break
+
+
+class _ParquetReader:
+    """Random access to Parquet manifests through row group metadata
+
+    Rows are decoded in batches of ``PARQUET_BATCH_ROWS``, never a whole row
+    group at once. Reading on from the last batch is cheap, so sequential scans
+    and nearby windows don't re-decode the start of the group.
+    """
+
+    def __init__(self, path):
+        import pyarrow.parquet as pq
+
+        self._file = pq.ParquetFile(path)
+        metadata = self._file.metadata
+        self._starts = []
+        total = 0
+        for group in range(metadata.num_row_groups):
+            self._starts.append(total)
+            total += metadata.row_group(group).num_rows
+        self._count = total
+        self._stops = self._starts[1:] + [total]
+        self._cursor = (None, 0, None, None)
+
+    def __len__(self):
+        return self._count
+
+    def read(self, start, stop):
+        group = bisect.bisect_right(self._starts, start) - 1
+        position = start
+        while position < stop and group < len(self._starts):
+            if position >= self._stops[group]:
+                group += 1
+                continue
+            first = self._starts[group]
+            batch_start, batch = self._batch(group, position - first)
+            rows = batch.slice(position - first - batch_start, stop - position).to_pylist()
+            yield from rows
+            position += len(rows)
+
+    def _batch(self, group, offset):
+        """``(first row, batch)`` of row group ``group`` holding row ``offset``, reading on from the last batch"""
+        cached_group, batch_start, batch, batches = self._cursor
+        if cached_group != group or offset < batch_start:
+            batches = self._file.iter_batches(batch_size=PARQUET_BATCH_ROWS, row_groups=[group])
+            batch_start, batch = 0, next(batches)
+        while offset >= batch_start + batch.num_rows:
+            batch_start += batch.num_rows
+            batch = next(batches)
+        self._cursor = (group, batch_start, batch, batches)
+        return batch_start, batch
+
+
+def _detect_format(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".jsonl", ".ndjson"):
+        return "jsonl"
+    if ext == ".csv":
+        return "csv"
+    if ext in (".parquet", ".pq"):
+        return "parquet"
+    raise ValueError(f"unsupported manifest format: {path}")
+
+
+def open_reader(path):
+    """Raw row reader for a JSONL, CSV or Parquet file: ``len()`` and ``read(start, stop)``"""
+    fmt = _detect_format(path)
+    return _ParquetReader(path) if fmt == "parquet" else _TextReader(path, fmt)
+
+
+class Dataset:
+    """Sequence of image pair records read lazily from a manifest"""
+
+    def __init__(self, path=DEFAULT_MANIFEST, window=DEFAULT_WINDOW):
+        self.path = os.path.abspath(path)
+        self.window = window
+        self._base_dir = os.path.dirname(self.path)
+        self._reader = open_reader(self.path)
+        self._resident = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._reader)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        with self._lock:
+            record = self._resident.get(i)
+            if record is None:
+                self._load_window(i)
+                record = self._resident[i]
+            else:
+                self._resident.move_to_end(i)
+            return record
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def _load_window(self, center):
+        """Page in the records around ``center`` and drop the least recently used ones"""
+        start = max(0, center - self.window // 2)
+        stop = min(len(self), start + self.window)
+        for i, raw in enumerate(self._reader.read(start, stop), start):
+            self._resident[i] = _normalize(raw, self._base_dir)
+            self._resident.move_to_end(i)
+        self._resident.move_to_end(center)
+        while len(self._resident) > self.window:
+            self._resident.popitem(last=False)
+
+    def iter_chunks(self, chunk_size=1024):
+        """Stream ``(start, records)`` chunks without touching the resident window"""
+        for start in range(0, len(self), chunk_size):
+            stop = min(len(self), start + chunk_size)
+            with self._lock:
+                rows = list(self._reader.read(start, stop))
+            yield start, [_normalize(raw, self._base_dir) for raw in rows]
@@ -0,0 +1,377 @@
+"""Near-duplicate originals found with perceptual hashes, so each is rated once.
+
+Generated evaluation sets often hold the same shot several times, resized or
+recompressed. This command hashes every ``original`` in a manifest and groups
+near-duplicates::
+
+    python dedupe.py --manifest manifest.jsonl --workers 8 --distance 6
+
+Worker processes decode chunks of images to 32x32 grayscale and compute a
+64-bit pHash (a DCT done as two matrix products over the whole stack) and a
+64-bit dHash (signs of horizontal gradients). Pairs are found with
+multi-index hashing. Each pHash is split into four 16-bit substrings, each
+with a bucket table. Two hashes within ``d`` bits must agree to within
+``d // 4`` bits on at least one substring. So only buckets that close are
+probed, rather than comparing every pair. Candidates within ``--distance``
+on pHash and ``--dhash-distance`` on dHash are near-duplicates. Clusters are
+grown greedily from the largest image not yet in one, which becomes the
+representative. Each cluster takes every unclustered near-duplicate of its
+representative. Members are therefore all close to the image that is rated,
+and a chain of small differences never joins two distinct shots. Only records
+of the same ``model`` are grouped, since a rating judges one model's cutout:
+the same original processed by two models stays two images to rate.
+
+The result is saved next to the manifest as ``<manifest>.dupes.npz``. While
+it matches the manifest, the app shows only representatives, and
+``batch_analysis.py`` counts a representative's rating for every member of
+its cluster. Delete the file to rate every image again.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from image_cache import ImageCache
+
+DEFAULT_DISTANCE = 6
+DEFAULT_DHASH_DISTANCE = 10
+HASH_SIZE = 8
+DCT_SIZE = 32
+SUBSTRINGS = 4
+SUBSTRING_BITS = 64 // SUBSTRINGS
+
+_N = np.arange(DCT_SIZE)
+# Orthonormal DCT-II basis: coefficients of a stack X are _DCT @ X @ _DCT.T
+_DCT = np.sqrt(2 / DCT_SIZE) * np.cos(np.pi * (2 * _N[None, :] + 1) * _N[:, None] / (2 * DCT_SIZE))
+_DCT[0] /= np.sqrt(2)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dupes_path(manifest):
+    """Where ``dedupe.py`` saves the clusters of a manifest"""
+    return os.path.abspath(manifest) + ".dupes.npz"
+
+
+def pack_bits(bits):
+    """Rows of 64 booleans as uint64 hashes, first bit most significant"""
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def phash(stack):
+    """pHash of each (32, 32) grayscale image: low DCT frequencies above their median"""
+    low = (_DCT @ stack @ _DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(stack), -1)
+    # The DC term is the mean brightness; leaving it out of the median keeps the hash contrast-only
+    return pack_bits(low > np.median(low[:, 1:], axis=1, keepdims=True))
+
+
+def dhash(stack):
+    """dHash of each (8, 9) grayscale image: whether brightness rises left to right"""
+    return pack_bits((stack[:, :, 1:] > stack[:, :, :-1]).reshape(len(stack), -1))
+
+
+def hamming(a, b):
+    """Bitwise distance between uint64 hash arrays"""
+    x = np.bitwise_xor(a, b)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(x)
+    return _POPCOUNT[x.view(np.uint8).reshape(*x.shape, 8)].sum(axis=-1)
+
+
+def _load_gray(path):
+    with Image.open(path) as im:
+        pixels = im.width * im.height
+        im.draft("L", (2 * DCT_SIZE, 2 * DCT_SIZE))
+        im = im.convert("L")
+        large = np.asarray(im.resize((DCT_SIZE, DCT_SIZE), Image.LANCZOS, reducing_gap=2.0), dtype=np.float32)
+        small = np.asarray(im.resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS, reducing_gap=2.0), dtype=np.float32)
+    return large, small, pixels
+
+
+def _hash_task(paths):
+    """Worker entry point: ``(phash, dhash, pixels)`` arrays for a chunk of local paths; 0 pixels where unreadable"""
+    large = np.zeros((len(paths), DCT_SIZE, DCT_SIZE), dtype=np.float32)
+    small = np.zeros((len(paths), HASH_SIZE, HASH_SIZE + 1), dtype=np.float32)
+    pixels = np.zeros(len(paths), dtype=np.int64)
+    for i, path in enumerate(paths):
+        if path is None:
+            continue
+        try:
+            large[i], small[i], pixels[i] = _load_gray(path)
+        except (OSError, ValueError):
+            pass
+    return phash(large), dhash(small), pixels
+
+
+class HammingIndex:
+    """Multi-index hashing over 64-bit hashes: exact radius search by probing 16-bit substring tables"""
+
+    def __init__(self, hashes):
+        self.hashes = np.asarray(hashes, dtype=np.uint64)
+        self.tables = []
+        for j in range(SUBSTRINGS):
+            part = ((self.hashes >> np.uint64(j * SUBSTRING_BITS)) & np.uint64(0xFFFF)).astype(np.int64)
+            order = np.argsort(part, kind="stable")
+            starts = np.zeros(2 ** SUBSTRING_BITS + 1, dtype=np.int64)
+            np.cumsum(np.bincount(part, minlength=2 ** SUBSTRING_BITS), out=starts[1:])
+            self.tables.append((part, order, starts))
+
+    @staticmethod
+    def _masks(radius):
+        """Every 16-bit flip pattern of at most ``radius`` bits"""
+        values = np.arange(2 ** SUBSTRING_BITS)
+        return values[hamming(values.astype(np.uint64), np.uint64(0)) <= radius]
+
+    def pairs(self, radius, block=16384):
+        """``(first, second)`` index arrays of every pair within ``radius`` bits, first < second, each pair once"""
+        masks = self._masks(radius // SUBSTRINGS)
+        found = []
+        for start in range(0, len(self.hashes), block):
+            queries = np.arange(start, min(start + block, len(self.hashes)))
+            block_pairs = []
+            for part, order, starts in self.tables:
+                for mask in masks:
+                    keys = part[queries] ^ mask
+                    lo, counts = starts[keys], starts[keys + 1] - starts[keys]
+                    total = int(counts.sum())
+                    if not total:
+                        continue
+                    first = np.repeat(queries, counts)
+                    offsets = np.arange(total) - np.repeat(np.cumsum(counts) - counts, counts)
+                    second = order[np.repeat(lo, counts) + offsets]
+                    keep = first < second
+                    first, second = first[keep], second[keep]
+                    close = hamming(self.hashes[first], self.hashes[second]) <= radius
+                    block_pairs.append(first[close] * len(self.hashes) + second[close])
+            if block_pairs:
+                found.append(np.unique(np.concatenate(block_pairs)))
+        if not found:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        keys = np.concatenate(found)
+        return keys // len(self.hashes), keys % len(self.hashes)
+
+
+def star_clusters(priority, first, second):
+    """Representative of every item: items in ``priority`` order claim their unclaimed neighbours
+
+    ``first``/``second`` are the edges. Items without edges represent themselves.
+    """
+    representative = np.arange(len(priority))
+    if not len(first):
+        return representative
+    sources = np.concatenate([first, second])
+    targets = np.concatenate([second, first])
+    by_source = np.argsort(sources, kind="stable")
+    sources, targets = sources[by_source], targets[by_source]
+    starts = np.searchsorted(sources, np.arange(len(priority) + 1))
+    claimed = np.zeros(len(priority), dtype=bool)
+    linked = np.zeros(len(priority), dtype=bool)
+    linked[sources] = True
+    for item in np.asarray(priority)[linked[priority]]:
+        if claimed[item]:
+            continue
+        neighbours = targets[starts[item]:starts[item + 1]]
+        free = neighbours[~claimed[neighbours]]
+        representative[free] = item
+        claimed[free] = True
+        claimed[item] = True
+    return representative
+
+
+def representatives(phashes, dhashes, pixels, distance=DEFAULT_DISTANCE, dhash_distance=DEFAULT_DHASH_DISTANCE,
+                    groups=None):
+    """Representative index of every image; the largest image of each near-duplicate cluster represents it
+
+    With ``groups`` (one label per image, e.g. from ``model_groups``), only images with equal labels are clustered.
+    """
+    readable = np.flatnonzero(pixels > 0)
+    first, second = HammingIndex(phashes[readable]).pairs(distance)
+    confirmed = hamming(dhashes[readable][first], dhashes[readable][second]) <= dhash_distance
+    if groups is not None:
+        labels = np.asarray(groups)[readable]
+        confirmed &= labels[first] == labels[second]
+    # Largest first, manifest order breaking ties
+    priority = np.lexsort((readable, -pixels[readable]))
+    representative = np.arange(len(pixels))
+    representative[readable] = readable[star_clusters(priority, first[confirmed], second[confirmed])]
+    return representative
+
+
+def hash_originals(dataset, resolve, workers=None, chunk_size=256, log=print):
+    """pHash, dHash and pixel count of every record's original; returns ``(phashes, dhashes, pixels)``"""
+    phashes = np.zeros(len(dataset), dtype=np.uint64)
+    dhashes = np.zeros(len(dataset), dtype=np.uint64)
+    pixels = np.zeros(len(dataset), dtype=np.int64)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        chunks = []
+        for start, records in dataset.iter_chunks(chunk_size):
+            paths = []
+            for record in records:
+                try:
+                    paths.append(resolve(record["original"]))
+                except OSError as e:
+                    log(f"skip {record['id']}: {e}")
+                    paths.append(None)
+            chunks.append((start, pool.submit(_hash_task, paths)))
+        for start, future in chunks:
+            p, d, n = future.result()
+            phashes[start:start + len(p)], dhashes[start:start + len(p)], pixels[start:start + len(p)] = p, d, n
+            log(f"{start + len(p)}/{len(dataset)} originals hashed")
+    return phashes, dhashes, pixels
+
+
+def model_groups(dataset):
+    """Integer label of every record's ``model``, so near-duplicates are only grouped within one model"""
+    labels = np.zeros(len(dataset), dtype=np.int64)
+    codes = {}
+    for start, records in dataset.iter_chunks(4096):
+        labels[start:start + len(records)] = [codes.setdefault(record.get("model"), len(codes)) for record in records]
+    return labels
+
+
+def save_dupes(manifest, representative, phashes, dhashes):
+    """Write clusters next to the manifest, stamped with its size and mtime"""
+    st = os.stat(manifest)
+    path = dupes_path(manifest)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        np.savez(f, representative=representative, phash=phashes, dhash=dhashes,
+                 source_size=st.st_size, source_mtime=st.st_mtime)
+    os.replace(tmp, path)
+    return path
+
+
+def load_dupes(manifest):
+    """Representative index of every record, or None if the manifest has no up-to-date clusters"""
+    try:
+        st = os.stat(manifest)
+        with np.load(dupes_path(manifest)) as data:
+            if int(data["source_size"]) != st.st_size or float(data["source_mtime"]) != st.st_mtime:
+                return None
+            return data["representative"]
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+class DedupedDataset:
+    """The records of a dataset that represent a near-duplicate cluster, in manifest order"""
+
+    def __init__(self, dataset, representative):
+        self.dataset = dataset
+        self.path = dataset.path
+        self.representative = representative = np.asarray(representative, dtype=np.int64)
+        self.indices = np.flatnonzero(representative == np.arange(len(representative)))
+        self._position = np.full(len(representative), -1, dtype=np.int64)
+        self._position[self.indices] = np.arange(len(self.indices))
+        cluster = self._position[representative]
+        self._members = np.argsort(cluster, kind="stable")
+        self._bounds = np.searchsorted(cluster[self._members], np.arange(len(self.indices) + 1))
+
+    def __len__(self):
+        return len(self.indices)
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.dataset[int(self.indices[i])]
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def manifest_index(self, i):
+        """Manifest index of the ``i``-th representative"""
+        return int(self.indices[i])
+
+    def view_index(self, manifest_index):
+        """Position of a manifest record among the representatives, or None if it is a hidden near-duplicate"""
+        if not 0 <= manifest_index < len(self._position) or self._position[manifest_index] < 0:
+            return None
+        return int(self._position[manifest_index])
+
+    def duplicates(self, i):
+        """Manifest indices of the other members of representative ``i``'s cluster"""
+        members = self._members[self._bounds[i]:self._bounds[i + 1]]
+        return members[members != self.indices[i]]
+
+    def iter_chunks(self, chunk_size=1024):
+        """Stream ``(start, records)`` chunks of representatives, reading the manifest in order"""
+        start, pending = 0, []
+        for base, records in self.dataset.iter_chunks(chunk_size):
+            lo, hi = np.searchsorted(self.indices, [base, base + len(records)])
+            pending += [records[k - base] for k in self.indices[lo:hi]]
+            while len(pending) >= chunk_size:
+                yield start, pending[:chunk_size]
+                start, pending = start + chunk_size, pending[chunk_size:]
+        if pending:
+            yield start, pending
+
+
+def load_deduplicated(dataset):
+    """The dataset as the app shows it: representatives only while ``dedupe.py`` output is up to date"""
+    representative = load_dupes(dataset.path)
+    if representative is None or len(representative) != len(dataset):
+        return dataset
+    return DedupedDataset(dataset, representative)
+
+
+def duplicate_ids(dataset, representative):
+    """``{representative id: [ids of its near-duplicates]}`` for clusters with more than one image"""
+    ids = np.empty(len(dataset), dtype=object)
+    for start, records in dataset.iter_chunks(4096):
+        ids[start:start + len(records)] = [str(record["id"]) for record in records]
+    duplicates = {}
+    for member in np.flatnonzero(representative != np.arange(len(representative))):
+        duplicates.setdefault(ids[representative[member]], []).append(ids[member])
+    return duplicates
+
+
+def main(argv=None):
+    from dataset import DEFAULT_MANIFEST, Dataset
+
+    parser = argparse.ArgumentParser(description="Group near-duplicate originals in a manifest by perceptual hash")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--distance", type=int, default=DEFAULT_DISTANCE, help="max pHash distance in bits")
+    parser.add_argument("--dhash-distance", type=int, default=DEFAULT_DHASH_DISTANCE, help="max dHash distance in bits")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--json", action="store_true", help="print run stats as one JSON line")
+    args = parser.parse_args(argv)
+
+    log = (lambda message: None) if args.json else print
+    started = time.perf_counter()
+    dataset = Dataset(args.manifest)
+    phashes, dhashes, pixels = hash_originals(dataset, ImageCache().resolve, args.workers, args.chunk_size, log)
+    hashed = time.perf_counter()
+    representative = representatives(phashes, dhashes, pixels, args.distance, args.dhash_distance,
+                                     model_groups(dataset))
+    save_dupes(args.manifest, representative, phashes, dhashes)
+    clusters = len(np.unique(representative))
+    stats = {
+        "images": len(dataset),
+        "unreadable": int((pixels == 0).sum()),
+        "representatives": clusters,
+        "duplicates": len(dataset) - clusters,
+        "hash_seconds": hashed - started,
+        "cluster_seconds": time.perf_counter() - hashed,
+    }
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print(
+            f"{stats['images']} originals, {stats['duplicates']} near-duplicates of {stats['representatives']} "
+            f"representatives ({stats['unreadable']} unreadable); hashed in {stats['hash_seconds']:.1f}s, "
+            f"clustered in {stats['cluster_seconds']:.2f}s"
+        )
+
+
+if __name__ == "__main__":
+    main()
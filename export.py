@@ -0,0 +1,356 @@
+"""Streaming export of ratings, per-image scores and analysis results.
+
+Three tables can be exported from the ratings database:
+
+- ``ratings``: stored rating rows with the image's category and model from the
+  manifest. By default this is every row of the append-only log. With
+  ``--latest`` it is each session's current rating of an image, in the
+  columns ``batch_analysis.py`` reads.
+- ``images``: per image id, the number of ratings, the average, the count of
+  each score and the times of the oldest and newest rating. Each session's
+  current rating counts once.
+- ``analysis``: what the dashboard shows (average, pass status, distribution
+  and executive summary) overall and per session, annotator, category and
+  model. If ``dedupe.py`` has grouped the manifest's near-duplicates, each
+  representative's rating also counts for the images it stands for.
+
+Output is CSV, Parquet or Arrow IPC (stream format). Ratings are read from
+SQLite ``CHUNK_ROWS`` at a time, and each chunk is encoded and written before
+the next is read: one Parquet row group or Arrow record batch per chunk. Per-image
+scores are grouped by SQLite, and the analysis keeps one running aggregate per
+group. Memory therefore stays flat however many ratings are exported. Exports
+can be filtered by session, by a date range and by model or category. pyarrow
+is imported only for Parquet and Arrow output.
+
+The Export section of the analysis page writes the same files to
+``.cache/exports`` (or ``BRE_EXPORT_DIR``) and offers them for download. They
+are named after the table, the filters and the ratings version, so repeat
+downloads are not rebuilt. This module has no Streamlit dependency::
+
+    python export.py ratings --output ratings.parquet --since 2026-10-01 --model u2net isnet
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from analytics import SCORE_LEVELS
+from batch_analysis import GROUPINGS, analyze, with_duplicates
+from ratings_store import EXPORT_CHUNK_ROWS
+
+TABLES = ("ratings", "images", "analysis")
+FORMATS = ("csv", "parquet", "arrow")
+EXTENSIONS = {"csv": ".csv", "parquet": ".parquet", "arrow": ".arrow"}
+MIME_TYPES = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+CHUNK_ROWS = EXPORT_CHUNK_ROWS
+DEFAULT_EXPORT_DIR = os.environ.get(
+    "BRE_EXPORT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "exports"),
+)
+EXPORT_CACHE_FILES = 16
+
+# Column names and Arrow type names per table
+COLUMNS = {
+    "ratings": (
+        ("annotator", "string"), ("session", "string"), ("image_index", "int64"), ("image_id", "string"),
+        ("category", "string"), ("model", "string"), ("score", "int64"), ("ts", "float64"),
+    ),
+    "images": (
+        ("image_id", "string"), ("category", "string"), ("model", "string"), ("ratings", "int64"),
+        ("average", "float64"), *((f"score_{level}", "int64") for level in SCORE_LEVELS),
+        ("first_ts", "float64"), ("last_ts", "float64"),
+    ),
+    "analysis": (
+        ("group", "string"), ("key", "string"), ("rated", "int64"), ("total_images", "int64"),
+        ("average", "float64"), ("percentage", "float64"), ("passes", "bool_"),
+        *((f"score_{level}", "int64") for level in SCORE_LEVELS),
+        *((f"score_{level}_percent", "float64") for level in SCORE_LEVELS),
+        ("summary", "string"),
+    ),
+}
+
+
+def parse_time(text, end=False):
+    """Timestamp of an ISO date or date-time; a bare date as an ``end`` bound covers that whole day"""
+    moment = datetime.fromisoformat(text)
+    if end and len(text) == len("YYYY-MM-DD"):
+        moment += timedelta(days=1)
+    return moment.timestamp()
+
+
+def _attributes(lookup, image_id, models, categories):
+    """``(category, model)`` of an image id, or None when the model or category filter leaves it out"""
+    category, model = lookup.get(image_id, (None, None)) if lookup is not None else (None, None)
+    if models is not None and model not in models:
+        return None
+    if categories is not None and category not in categories:
+        return None
+    return category, model
+
+
+def _require_lookup(lookup, models, categories):
+    if lookup is None and (models is not None or categories is not None):
+        raise ValueError("filtering by model or category needs the manifest")
+
+
+def rating_rows(store, lookup=None, sessions=None, since=None, until=None, models=None, categories=None,
+                latest=False, chunk_rows=CHUNK_ROWS):
+    """Chunks of ``ratings`` table rows; ``lookup`` maps image ids to ``(category, model)``"""
+    _require_lookup(lookup, models, categories)
+    for chunk in store.iter_ratings(sessions, since, until, latest, chunk_rows):
+        rows = []
+        for annotator, session, image_index, image_id, score, ts in chunk:
+            attributes = _attributes(lookup, image_id, models, categories)
+            if attributes is not None:
+                rows.append((annotator, session, image_index, image_id, *attributes, score, ts))
+        if rows:
+            yield rows
+
+
+def image_rows(store, lookup=None, sessions=None, since=None, until=None, models=None, categories=None,
+               chunk_rows=CHUNK_ROWS):
+    """Chunks of ``images`` table rows, ordered by image id"""
+    _require_lookup(lookup, models, categories)
+    for chunk in store.iter_image_scores(sessions, since, until, chunk_rows):
+        rows = []
+        for image_id, *scores in chunk:
+            attributes = _attributes(lookup, image_id, models, categories)
+            if attributes is not None:
+                rows.append((image_id, *attributes, *scores))
+        if rows:
+            yield rows
+
+
+def analysis_rows(store, lookup=None, sessions=None, since=None, until=None, models=None, categories=None,
+                  groupings=GROUPINGS, total_images=None, duplicates=None, chunk_rows=CHUNK_ROWS):
+    """``analysis`` table rows, one per group, as a single chunk
+
+    Only one aggregate per group is kept while the current ratings stream
+    past. ``total_images`` defaults to the number of images rated.
+    ``duplicates`` (``dedupe.duplicate_ids``) counts each representative's
+    rating for its near-duplicates too, as the dashboard does.
+    """
+    _require_lookup(lookup, models, categories)
+    current = (
+        ((session, image_id), (ts, score, annotator, None, None))
+        for chunk in store.iter_ratings(sessions, since, until, True, chunk_rows)
+        for annotator, session, _, image_id, score, ts in chunk
+    )
+    if duplicates:
+        current = with_duplicates(current, duplicates)
+
+    def latest():
+        # Filtered after attaching, so a near-duplicate is kept or left out by its own model and category
+        for (session, image_id), (ts, score, annotator, _, _) in current:
+            attributes = _attributes(lookup, image_id, models, categories)
+            if attributes is not None:
+                yield (session, image_id), (ts, score, annotator, *attributes)
+
+    rows = [
+        (
+            result["group"], str(result["key"]), result["rated"], result["total_images"], result["average"],
+            result["percentage"], result["passes"], *(result["distribution"][level] for level in SCORE_LEVELS),
+            *(result["distribution_percent"][level] for level in SCORE_LEVELS), result["summary"],
+        )
+        for result in analyze(latest(), groupings, total_images=total_images)
+    ]
+    if rows:
+        yield rows
+
+
+class _Chunks(io.RawIOBase):
+    """Write-only file that collects what pyarrow writes until it is drained"""
+
+    def __init__(self):
+        self._parts = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+def _arrow_schema(columns):
+    import pyarrow as pa
+
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in columns])
+
+
+def encode(chunks, columns, fmt):
+    """Yield the bytes of a CSV, Parquet or Arrow IPC stream file, one piece per chunk of row tuples"""
+    if fmt == "csv":
+        text = io.StringIO()
+        writer = csv.writer(text, lineterminator="\n")
+        writer.writerow([name for name, _ in columns])
+        for rows in chunks:
+            writer.writerows(rows)
+            yield text.getvalue().encode()
+            text.seek(0)
+            text.truncate()
+        yield text.getvalue().encode()
+        return
+
+    import pyarrow as pa
+
+    schema = _arrow_schema(columns)
+    sink = _Chunks()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+
+        writer = pq.ParquetWriter(sink, schema)
+    elif fmt == "arrow":
+        writer = pa.ipc.new_stream(sink, schema)
+    else:
+        raise ValueError(f"unsupported export format: {fmt}")
+    try:
+        for rows in chunks:
+            # Each chunk becomes one Parquet row group or Arrow record batch
+            arrays = [pa.array(values, type=field.type) for values, field in zip(zip(*rows), schema)]
+            writer.write_batch(pa.record_batch(arrays, schema=schema))
+            yield sink.drain()
+    finally:
+        writer.close()
+    yield sink.drain()
+
+
+def table_rows(table, store, lookup=None, sessions=None, since=None, until=None, models=None, categories=None,
+               latest=False, groupings=GROUPINGS, total_images=None, duplicates=None, chunk_rows=CHUNK_ROWS):
+    """Chunks of rows for one of ``TABLES``"""
+    filters = (store, lookup, sessions, since, until, models, categories)
+    if table == "ratings":
+        return rating_rows(*filters, latest, chunk_rows)
+    if table == "images":
+        return image_rows(*filters, chunk_rows)
+    if table == "analysis":
+        return analysis_rows(*filters, groupings, total_images, duplicates, chunk_rows)
+    raise ValueError(f"unknown export table: {table}")
+
+
+def export(table, fmt, out, store, **options):
+    """Write one table to a binary file object; returns ``{"rows", "bytes"}``
+
+    ``options`` are the filters and settings of ``table_rows``.
+    """
+    stats = {"rows": 0, "bytes": 0}
+
+    def counted(chunks):
+        for rows in chunks:
+            stats["rows"] += len(rows)
+            yield rows
+
+    for data in encode(counted(table_rows(table, store, **options)), COLUMNS[table], fmt):
+        out.write(data)
+        stats["bytes"] += len(data)
+    return stats
+
+
+def export_file(name, table, fmt, store, directory=DEFAULT_EXPORT_DIR, **options):
+    """Path of an export file in ``directory``, written first unless a file of that name is there
+
+    Files are written atomically. Only the ``EXPORT_CACHE_FILES`` most recent
+    are kept, so names should identify the table, filters and ratings version.
+    """
+    path = os.path.join(directory, name)
+    if os.path.exists(path):
+        os.utime(path)
+        return path
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            export(table, fmt, f, store, **options)
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+    exports = sorted((entry for entry in os.scandir(directory) if not entry.name.endswith(".tmp")),
+                     key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in exports[EXPORT_CACHE_FILES:]:
+        os.unlink(entry.path)
+    return path
+
+
+def format_for(path):
+    """Export format implied by a file name, CSV when there is none"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in (".parquet", ".pq"):
+        return "parquet"
+    if extension in (".arrow", ".arrows", ".ipc"):
+        return "arrow"
+    return "csv"
+
+
+def main(argv=None):
+    from batch_analysis import manifest_lookup
+    from dataset import DEFAULT_MANIFEST, Dataset
+    from dedupe import duplicate_ids, load_dupes
+    from metrics_store import _peak_rss_mb
+    from ratings_store import DEFAULT_DB_PATH, RatingsStore
+
+    parser = argparse.ArgumentParser(description="Stream ratings, per-image scores or analysis results to a file")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("--output", default="-", help="output file (default: stdout)")
+    parser.add_argument("--format", choices=FORMATS, help="default: from the output file name, else csv")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="ratings database")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="categories, models and the image count")
+    parser.add_argument("--session", nargs="+", help="only these sessions")
+    parser.add_argument("--since", help="only ratings from this ISO date or time on")
+    parser.add_argument("--until", help="only ratings before this ISO time, or up to the end of this date")
+    parser.add_argument("--model", nargs="+", help="only images of these models")
+    parser.add_argument("--category", nargs="+", help="only images in these categories")
+    parser.add_argument("--latest", action="store_true", help="ratings: only each session's current rating of an image")
+    parser.add_argument("--by", nargs="+", choices=GROUPINGS, default=list(GROUPINGS), help="analysis groupings")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--json", action="store_true", help="print run stats as one JSON line")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    fmt = args.format or format_for(args.output)
+    lookup, total_images = manifest_lookup(args.manifest) if args.manifest else (None, None)
+    representative = load_dupes(args.manifest) if args.manifest else None
+    duplicates = duplicate_ids(Dataset(args.manifest), representative) if representative is not None else None
+    store = RatingsStore(args.db)
+    out = sys.stdout.buffer if args.output == "-" else open(args.output, "wb")
+    try:
+        stats = export(
+            args.table, fmt, out, store, lookup=lookup, sessions=args.session,
+            since=parse_time(args.since) if args.since else None,
+            until=parse_time(args.until, end=True) if args.until else None,
+            models=set(args.model) if args.model else None,
+            categories=set(args.category) if args.category else None,
+            latest=args.latest, groupings=args.by, total_images=total_images, duplicates=duplicates,
+            chunk_rows=args.chunk_rows,
+        )
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        store.close()
+    stats["seconds"] = time.perf_counter() - started
+    stats["peak_rss_mb"] = _peak_rss_mb()[0]
+
+    if args.json:
+        print(json.dumps(stats), file=sys.stderr)
+    else:
+        print(f"{stats['rows']} {args.table} rows, {stats['bytes'] / 1e6:.1f} MB of {fmt} in {stats['seconds']:.1f}s "
+              f"(peak RSS {stats['peak_rss_mb']:.0f} MiB)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
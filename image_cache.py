@@ -0,0 +1,302 @@
+"""Content-addressed on-disk cache for evaluation images.
+
+Remote ``original``/``processed`` references are fetched once, stored under
+the SHA-256 of their bytes and served from local disk afterwards. The store is
+bounded in size and evicts least-recently-used blobs first, but never one used
+in the last ``EVICTION_GRACE`` seconds (by default), so the images being fetched for the
+pairs on screen cannot push each other out. The ref index is written at most
+every ``INDEX_SAVE_INTERVAL`` seconds and at exit; a ref lost in a crash is
+fetched again.
+"""
+
+import atexit
+import hashlib
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BRE_CACHE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "images"),
+)
+DEFAULT_MAX_BYTES = int(os.environ.get("BRE_CACHE_MAX_BYTES", 512 * 1024 * 1024))
+FETCH_TIMEOUT = 30
+CHUNK_SIZE = 64 * 1024
+INDEX_SAVE_INTERVAL = 2.0
+EVICTION_GRACE = 60.0
+
+
+_digests = {}
+
+
+def content_digest(path):
+    """SHA-256 of a local file, memoized on (path, size, mtime)"""
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime)
+    digest = _digests.get(key)
+    if digest is None:
+        name = os.path.splitext(os.path.basename(path))[0]
+        if len(name) == 64 and all(c in "0123456789abcdef" for c in name):
+            # Cache blobs are already named by their content hash
+            digest = name
+        else:
+            h = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    h.update(chunk)
+            digest = h.hexdigest()
+        _digests[key] = digest
+    return digest
+
+
+def is_remote(ref):
+    """Return True if the reference points at an http(s) resource"""
+    return urllib.parse.urlsplit(ref).scheme in ("http", "https")
+
+
+def _guess_extension(ref, content_type):
+    """Pick a file extension so downstream readers can sniff the format"""
+    ext = os.path.splitext(urllib.parse.urlsplit(ref).path)[1].lower()
+    if ext:
+        return ext
+    if content_type:
+        ext = mimetypes.guess_extension(content_type.split(";")[0].strip())
+        if ext:
+            return ext
+    return ".img"
+
+
+class ImageCache:
+    """Size-bounded, content-addressed image store with background prefetch"""
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, max_workers=4, eviction_grace=EVICTION_GRACE):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.eviction_grace = eviction_grace
+        self._blob_dir = os.path.join(root, "blobs")
+        self._index_path = os.path.join(root, "refs.json")
+        os.makedirs(self._blob_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="image-cache")
+
+        self._refs = self._load_index()
+        self._names = {}  # blob name -> refs stored under it
+        for ref, name in self._refs.items():
+            self._names.setdefault(name, set()).add(ref)
+        self._blobs = self._scan_blobs()
+        self._touched = {}  # blob name -> monotonic time of last use in this process
+        self._total_bytes = sum(self._blobs.values())
+        self._dirty = False
+        self._save_timer = None
+        atexit.register(self.save_index)
+
+    # Index management
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        self._dirty = False
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(self._refs, f)
+        os.replace(tmp, self._index_path)
+
+    def _scan_blobs(self):
+        """Rebuild LRU order from blob access times left by previous processes"""
+        entries = []
+        for name in os.listdir(self._blob_dir):
+            if name.endswith(".tmp"):
+                continue
+            path = os.path.join(self._blob_dir, name)
+            st = os.stat(path)
+            entries.append((st.st_mtime, name, st.st_size))
+        entries.sort()
+        return OrderedDict((name, size) for _, name, size in entries)
+
+    def _blob_path(self, name):
+        return os.path.join(self._blob_dir, name)
+
+    # Public API
+
+    def cached_path(self, ref):
+        """Return the local path for an already-cached reference, or None"""
+        if not is_remote(ref):
+            return ref if os.path.exists(ref) else None
+        with self._lock:
+            name = self._refs.get(ref)
+            if name is None or name not in self._blobs:
+                return None
+            self._blobs.move_to_end(name)
+            self._touched[name] = time.monotonic()
+        path = self._blob_path(name)
+        try:
+            os.utime(path)
+        except OSError:
+            return None
+        return path
+
+    def resolve(self, ref):
+        """Return a local file path for the reference, fetching it at most once"""
+        path = self.cached_path(ref)
+        if path is not None:
+            return path
+        if not is_remote(ref):
+            raise FileNotFoundError(ref)
+
+        with self._lock:
+            future = self._inflight.get(ref)
+            if future is None:
+                future = self._executor.submit(self._fetch, ref)
+                self._inflight[ref] = future
+        try:
+            return future.result()
+        finally:
+            with self._lock:
+                if self._inflight.get(ref) is future:
+                    del self._inflight[ref]
+
+    def prefetch(self, refs):
+        """Warm the cache for the given references without blocking the caller"""
+        for ref in refs:
+            if not ref or not is_remote(ref) or self.cached_path(ref) is not None:
+                continue
+            with self._lock:
+                if ref in self._inflight:
+                    continue
+                future = self._executor.submit(self._fetch, ref)
+                self._inflight[ref] = future
+            future.add_done_callback(lambda f, ref=ref: self._forget(ref, f))
+
+    def _forget(self, ref, future):
+        with self._lock:
+            if self._inflight.get(ref) is future:
+                del self._inflight[ref]
+
+    def store_bytes(self, ref, data, content_type=None):
+        """Record already-downloaded bytes for a reference and return the local path"""
+        digest = hashlib.sha256(data).hexdigest()
+        name = digest + _guess_extension(ref, content_type)
+        path = self._blob_path(name)
+        if not os.path.exists(path):
+            fd, tmp = tempfile.mkstemp(dir=self._blob_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        self._record(ref, name, len(data))
+        return path
+
+    def store_file(self, ref, path, content_type=None, digest=None, save_index=True):
+        """Move an already-downloaded file into the store for a reference and return the local path
+
+        ``digest`` is the file's SHA-256 when the caller has already computed it.
+        Bulk imports pass ``save_index=False`` and call ``save_index()`` themselves.
+        """
+        if digest is None:
+            digest = content_digest(path)
+        name = digest + _guess_extension(ref, content_type)
+        target = self._blob_path(name)
+        size = os.path.getsize(path)
+        if os.path.exists(target):
+            os.unlink(path)
+        else:
+            os.replace(path, target)
+        self._record(ref, name, size, save_index)
+        return target
+
+    def save_index(self):
+        """Write the ref index now if it has changed since the last write
+
+        Also runs from a timer and at exit, so a cache directory that has been
+        removed is not an error; refs missing from the index are fetched again.
+        """
+        with self._lock:
+            self._save_timer = None
+            if self._dirty:
+                try:
+                    self._save_index()
+                except FileNotFoundError:
+                    self._dirty = True
+
+    def _fetch(self, ref):
+        request = urllib.request.Request(ref, headers={"User-Agent": "background-removal-evaluator"})
+        hasher = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=self._blob_dir, suffix=".tmp")
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as f, urllib.request.urlopen(request, timeout=FETCH_TIMEOUT) as resp:
+                content_type = resp.headers.get("Content-Type")
+                while True:
+                    chunk = resp.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            name = hasher.hexdigest() + _guess_extension(ref, content_type)
+            os.replace(tmp, self._blob_path(name))
+        except BaseException:
+            if os.path.exists(tmp):
+                os.unlink(tmp)
+            raise
+        self._record(ref, name, size)
+        return self._blob_path(name)
+
+    def _record(self, ref, name, size, save_index=True):
+        with self._lock:
+            if name not in self._blobs:
+                self._total_bytes += size
+            self._blobs[name] = size
+            self._blobs.move_to_end(name)
+            self._touched[name] = time.monotonic()
+            previous = self._refs.get(ref)
+            if previous != name:
+                if previous is not None:
+                    self._names[previous].discard(ref)
+                self._refs[ref] = name
+                self._names.setdefault(name, set()).add(ref)
+                self._dirty = True
+            self._evict_locked(keep=name)
+            if save_index and self._dirty and self._save_timer is None:
+                self._save_timer = threading.Timer(INDEX_SAVE_INTERVAL, self.save_index)
+                self._save_timer.daemon = True
+                self._save_timer.start()
+
+    def _evict_locked(self, keep=None):
+        """Drop least-recently-used blobs until the store fits within max_bytes
+
+        Blobs are in order of last use, so eviction stops at ``keep`` or the first
+        blob used within ``eviction_grace`` seconds; the store may stay over budget until they age.
+        """
+        recent = time.monotonic() - self.eviction_grace
+        while self._total_bytes > self.max_bytes and self._blobs:
+            name, size = next(iter(self._blobs.items()))
+            if name == keep or self._touched.get(name, 0.0) > recent:
+                break
+            del self._blobs[name]
+            self._touched.pop(name, None)
+            self._total_bytes -= size
+            try:
+                os.unlink(self._blob_path(name))
+            except FileNotFoundError:
+                pass
+            for ref in self._names.pop(name, ()):
+                del self._refs[ref]
+                self._dirty = True
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
@@ -0,0 +1,316 @@
+"""Bulk download of a manifest's remote images into the local image cache.
+
+Run before an evaluation round so the app never waits on a remote fetch::
+
+    python ingest.py --manifest manifest.jsonl --concurrency 32 --per-host 8 --rate 50
+
+Downloads are scheduled on an asyncio event loop. At most ``--concurrency``
+run at once, and each host gets at most ``--per-host`` connections and
+``--rate`` request starts per second. Transfers share one pooled urllib3
+client, so connections stay open and are reused. The blocking reads run on a
+thread per concurrent download.
+
+Each download streams to a partial file under the cache. If it is
+interrupted, the next attempt (in this run or a later one) resumes with an
+HTTP Range request, validated by ``If-Range``. A completed file is checked
+against the Content-Length, and against the manifest's
+``original_sha256``/``processed_sha256`` when given, then moved into the
+content-addressed store the app reads from. Connection errors, 429 and 5xx
+responses are retried with exponential backoff, honouring ``Retry-After`` up
+to ``RETRY_AFTER_MAX`` seconds. References already in the cache are skipped.
+Throughput counts the bytes actually received, so resumed files only count
+their remainder.
+"""
+
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import time
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+
+import urllib3
+
+from image_cache import CHUNK_SIZE, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES, FETCH_TIMEOUT, ImageCache, is_remote
+
+DEFAULT_CONCURRENCY = 32
+DEFAULT_PER_HOST = 8
+DEFAULT_RETRIES = 5
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_AFTER_MAX = 120.0
+INDEX_SAVE_INTERVAL = 2.0
+RETRY_STATUSES = frozenset((408, 425, 429, 500, 502, 503, 504))
+USER_AGENT = "background-removal-evaluator"
+
+
+class RetryableError(OSError):
+    """A failed attempt worth repeating
+
+    ``retry_after`` is the delay the server asked for, if any, and
+    ``transferred`` the body bytes received before the attempt failed.
+    """
+
+    def __init__(self, message, retry_after=None, transferred=0):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.transferred = transferred
+
+
+class HostLimiter:
+    """Connection slots and evenly spaced request starts for one host"""
+
+    def __init__(self, connections, rate=None):
+        self._slots = asyncio.Semaphore(connections)
+        self._interval = 1 / rate if rate else 0.0
+        self._next_start = 0.0
+
+    def pause(self, seconds):
+        """Hold back every new request to this host, e.g. after a 429"""
+        self._next_start = max(self._next_start, asyncio.get_running_loop().time() + seconds)
+
+    async def __aenter__(self):
+        await self._slots.acquire()
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def __aexit__(self, *exc_info):
+        self._slots.release()
+
+
+def partial_paths(cache, ref):
+    """Partial download file and its metadata sidecar for a reference"""
+    stem = os.path.join(cache.root, "partial", hashlib.sha1(ref.encode()).hexdigest())
+    return stem + ".part", stem + ".json"
+
+
+def _discard(*paths):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def _retry_after(resp):
+    try:
+        return float(resp.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _content_range(resp):
+    """``(first byte, complete length or None)`` from a 206 response's Content-Range"""
+    try:
+        _, _, spec = resp.headers["Content-Range"].partition(" ")
+        span, _, total = spec.partition("/")
+        return int(span.split("-")[0]), None if total == "*" else int(total)
+    except (KeyError, ValueError):
+        return None, None
+
+
+def download(pool, cache, ref, sha256=None, timeout=FETCH_TIMEOUT):
+    """Fetch one reference into the cache, resuming a partial download; returns ``(size, transferred, resumed)``"""
+    part, sidecar = partial_paths(cache, ref)
+    os.makedirs(os.path.dirname(part), exist_ok=True)
+    meta, offset = {}, 0
+    if os.path.exists(part):
+        try:
+            with open(sidecar) as f:
+                meta = json.load(f)
+            offset = os.path.getsize(part)
+        except (OSError, ValueError):
+            meta = {}
+    validator = meta.get("etag") or meta.get("last_modified")
+    headers = {"User-Agent": USER_AGENT}
+    if offset and validator:
+        headers.update({"Range": f"bytes={offset}-", "If-Range": validator})
+    else:
+        offset = 0
+
+    try:
+        resp = pool.request("GET", ref, headers=headers, preload_content=False, timeout=timeout)
+    except urllib3.exceptions.HTTPError as e:
+        raise RetryableError(f"{ref}: {e}") from e
+    hasher = hashlib.sha256()
+    received = 0
+    try:
+        if resp.status == 206 and offset and _content_range(resp)[0] == offset:
+            total, mode = _content_range(resp)[1], "ab"
+            with open(part, "rb") as f:
+                for chunk in iter(lambda: f.read(1 << 20), b""):
+                    hasher.update(chunk)
+        elif resp.status == 200:
+            length = resp.headers.get("Content-Length")
+            total, mode, offset = int(length) if length else None, "wb", 0
+        else:
+            resp.drain_conn()
+            if resp.status in RETRY_STATUSES or resp.status in (206, 416):
+                if resp.status in (206, 416):
+                    _discard(part, sidecar)
+                raise RetryableError(f"{ref}: HTTP {resp.status}", _retry_after(resp))
+            raise OSError(f"{ref}: HTTP {resp.status}")
+
+        # A weak ETag can't validate a range request; fall back to Last-Modified
+        etag = resp.headers.get("ETag")
+        meta = {
+            "etag": etag if etag and not etag.startswith("W/") else None,
+            "last_modified": resp.headers.get("Last-Modified"),
+            "content_type": resp.headers.get("Content-Type"),
+        }
+        with open(sidecar, "w") as f:
+            json.dump(meta, f)
+        with open(part, mode) as f:
+            for chunk in resp.stream(CHUNK_SIZE):
+                hasher.update(chunk)
+                f.write(chunk)
+                received += len(chunk)
+    except urllib3.exceptions.HTTPError as e:
+        # Dropped mid-body: keep what arrived so the next attempt resumes from there
+        raise RetryableError(f"{ref}: {e}", transferred=received) from e
+    finally:
+        resp.release_conn()
+
+    size = os.path.getsize(part)
+    if total is not None and size != total:
+        if size > total:
+            _discard(part, sidecar)
+        raise RetryableError(f"{ref}: got {size} of {total} bytes", transferred=received)
+    digest = hasher.hexdigest()
+    if sha256 and digest != sha256.lower():
+        _discard(part, sidecar)
+        raise RetryableError(f"{ref}: checksum mismatch", transferred=received)
+    cache.store_file(ref, part, meta["content_type"], digest, save_index=False)
+    _discard(sidecar)
+    return size, received, offset > 0
+
+
+def remote_assets(dataset, cache, chunk_size=1024):
+    """``(ref, sha256 or None)`` for remote originals and cutouts not yet cached, once each, and the remote total"""
+    seen, items = set(), []
+    for _, records in dataset.iter_chunks(chunk_size):
+        for record in records:
+            for field in ("original", "processed"):
+                ref = record[field]
+                if not is_remote(ref) or ref in seen:
+                    continue
+                seen.add(ref)
+                if cache.cached_path(ref) is None:
+                    items.append((ref, record.get(f"{field}_sha256")))
+    return items, len(seen)
+
+
+async def ingest(items, cache, concurrency=DEFAULT_CONCURRENCY, per_host=DEFAULT_PER_HOST, rate=None,
+                 retries=DEFAULT_RETRIES, timeout=FETCH_TIMEOUT, log=print):
+    """Download every ``(ref, sha256)`` item into the cache; returns run stats"""
+    loop = asyncio.get_running_loop()
+    pool = urllib3.PoolManager(num_pools=64, maxsize=per_host, block=True, retries=False)
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="ingest")
+    limiters = {}
+    stats = {"downloaded": 0, "failed": 0, "resumed": 0, "retries": 0, "bytes": 0, "stored_bytes": 0}
+    pending = list(reversed(items))
+    started = time.perf_counter()
+
+    async def fetch(ref, sha256):
+        host = urllib.parse.urlsplit(ref).netloc
+        limiter = limiters.get(host)
+        if limiter is None:
+            limiter = limiters[host] = HostLimiter(per_host, rate)
+        for attempt in range(retries + 1):
+            try:
+                async with limiter:
+                    size, received, resumed = await loop.run_in_executor(
+                        executor, download, pool, cache, ref, sha256, timeout
+                    )
+            except RetryableError as e:
+                stats["bytes"] += e.transferred
+                if attempt == retries:
+                    log(f"failed: {e}")
+                    break
+                stats["retries"] += 1
+                if e.retry_after is not None:
+                    delay = min(max(e.retry_after, 0.0), RETRY_AFTER_MAX)
+                    limiter.pause(delay)
+                else:
+                    delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.5)
+                await asyncio.sleep(delay)
+            except OSError as e:
+                log(f"failed: {e}")
+                break
+            else:
+                stats["downloaded"] += 1
+                stats["bytes"] += received
+                stats["stored_bytes"] += size
+                stats["resumed"] += resumed
+                return
+        stats["failed"] += 1
+
+    async def worker():
+        while pending:
+            await fetch(*pending.pop())
+
+    async def save_index_periodically():
+        while True:
+            await asyncio.sleep(INDEX_SAVE_INTERVAL)
+            await loop.run_in_executor(None, cache.save_index)
+
+    saver = asyncio.create_task(save_index_periodically())
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(concurrency, len(items)))))
+    finally:
+        saver.cancel()
+        cache.save_index()
+        executor.shutdown()
+        pool.clear()
+    seconds = time.perf_counter() - started
+    stats["seconds"] = seconds
+    stats["mb_per_second"] = stats["bytes"] / 1e6 / seconds if seconds else 0.0
+    stats["files_per_second"] = stats["downloaded"] / seconds if seconds else 0.0
+    return stats
+
+
+def main(argv=None):
+    from dataset import DEFAULT_MANIFEST, Dataset
+
+    parser = argparse.ArgumentParser(description="Download a manifest's remote images into the local image cache")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--max-bytes", type=int, default=DEFAULT_MAX_BYTES,
+                        help="cache size bound; least recently used images are evicted beyond it")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--per-host", type=int, default=DEFAULT_PER_HOST, help="connections per host")
+    parser.add_argument("--rate", type=float, help="request starts per second per host (default: unlimited)")
+    parser.add_argument("--retries", type=int, default=DEFAULT_RETRIES)
+    parser.add_argument("--timeout", type=float, default=FETCH_TIMEOUT)
+    parser.add_argument("--json", action="store_true", help="print run stats as one JSON line")
+    args = parser.parse_args(argv)
+
+    # Every blob is written once and nothing is on screen, so there is no recent use to protect from eviction
+    cache = ImageCache(args.cache_dir, args.max_bytes, eviction_grace=0)
+    items, total = remote_assets(Dataset(args.manifest), cache)
+    log = (lambda message: None) if args.json else print
+    stats = asyncio.run(ingest(items, cache, args.concurrency, args.per_host, args.rate, args.retries, args.timeout, log))
+    stats["skipped"] = total - len(items)
+    if stats["stored_bytes"] > args.max_bytes:
+        log(f"warning: downloaded {stats['stored_bytes'] / 1e6:.0f} MB into a {args.max_bytes / 1e6:.0f} MB cache; "
+            "raise --max-bytes / BRE_CACHE_MAX_BYTES to keep everything")
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print(
+            f"downloaded {stats['downloaded']} ({stats['stored_bytes'] / 1e6:.1f} MB, {stats['bytes'] / 1e6:.1f} MB "
+            f"transferred), skipped {stats['skipped']}, "
+            f"failed {stats['failed']}, resumed {stats['resumed']}, {stats['retries']} retries "
+            f"in {stats['seconds']:.1f}s ({stats['mb_per_second']:.1f} MB/s, {stats['files_per_second']:.1f} files/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
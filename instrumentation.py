@@ -0,0 +1,244 @@
+"""Opt-in timers and counters for the app's reruns.
+
+Set ``BRE_INSTRUMENT=1`` to enable. Every rerun (a whole-script run or a
+fragment rerun) records the wall time of named sections such as CSS
+injection, image resolution, ``st.image`` serialization, the analysis and the
+Plotly figure, plus counters such as bytes sent. The last ``HISTORY`` reruns
+of each session are kept for the debug panel, for at most ``MAX_SESSIONS``
+sessions and until a session has been idle for ``SESSION_TTL`` seconds.
+Process-wide totals, without per-session labels, can be
+written in Prometheus text format to ``BRE_INSTRUMENT_PROM``, e.g. for a
+node_exporter textfile collector. Every rerun can also be appended as a JSON
+line to ``BRE_INSTRUMENT_JSONL``.
+
+When disabled, ``section`` returns a shared no-op context manager, ``count``
+returns immediately and ``measured`` leaves functions undecorated. This module
+has no Streamlit dependency; the current rerun is tracked per thread, which
+matches Streamlit's one script thread per run.
+"""
+
+import contextlib
+import functools
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+
+ENABLED = os.environ.get("BRE_INSTRUMENT", "") not in ("", "0")
+PROM_PATH = os.environ.get("BRE_INSTRUMENT_PROM")
+JSONL_PATH = os.environ.get("BRE_INSTRUMENT_JSONL")
+HISTORY = 50
+MAX_SESSIONS = 500
+SESSION_TTL = 3600.0
+PROM_INTERVAL = 5.0
+
+_NULL = contextlib.nullcontext()
+_local = threading.local()
+
+
+class Rerun:
+    """Timings and counters of one rerun"""
+
+    __slots__ = ("session", "kind", "started", "wall_start", "last_activity", "seconds", "sections", "counters")
+
+    def __init__(self, session, kind):
+        self.session = session
+        self.kind = kind
+        self.started = self.last_activity = time.perf_counter()
+        self.wall_start = time.time()
+        self.seconds = None
+        self.sections = {}
+        self.counters = {}
+
+    def add_time(self, name, seconds):
+        self.sections[name] = self.sections.get(name, 0.0) + seconds
+        self.last_activity = time.perf_counter()
+
+    def add_count(self, name, value):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def as_dict(self):
+        return {
+            "ts": self.wall_start,
+            "session": self.session,
+            "kind": self.kind,
+            "seconds": self.seconds,
+            "sections": self.sections,
+            "counters": self.counters,
+        }
+
+
+class Recorder:
+    """Process-wide totals plus the recent reruns of each session"""
+
+    def __init__(self, prom_path=None, jsonl_path=None, history=HISTORY, prom_interval=PROM_INTERVAL,
+                 max_sessions=MAX_SESSIONS, session_ttl=SESSION_TTL):
+        self.prom_path = prom_path
+        self.jsonl_path = jsonl_path
+        self.history = history
+        self.prom_interval = prom_interval
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self._lock = threading.Lock()
+        self._rerun_totals = {}    # kind -> [count, seconds]
+        self._section_totals = {}  # section -> [count, seconds]
+        self._counters = {}        # name -> total
+        self._recent = OrderedDict()  # session -> (last rerun time, deque of rerun dicts), least recent first
+        self._last_prom = 0.0
+
+    def record(self, rerun):
+        entry = rerun.as_dict()
+        with self._lock:
+            totals = self._rerun_totals.setdefault(rerun.kind, [0, 0.0])
+            totals[0] += 1
+            totals[1] += rerun.seconds
+            for name, seconds in rerun.sections.items():
+                totals = self._section_totals.setdefault(name, [0, 0.0])
+                totals[0] += 1
+                totals[1] += seconds
+            for name, value in rerun.counters.items():
+                self._counters[name] = self._counters.get(name, 0) + value
+            now = time.monotonic()
+            reruns = self._recent.pop(rerun.session, (None, None))[1] or deque(maxlen=self.history)
+            reruns.append(entry)
+            self._recent[rerun.session] = (now, reruns)
+            self._evict(now)
+            if self.jsonl_path:
+                with open(self.jsonl_path, "a") as f:
+                    f.write(json.dumps(entry) + "\n")
+            due = self.prom_path and time.monotonic() - self._last_prom >= self.prom_interval
+            if due:
+                self._last_prom = time.monotonic()
+        if due:
+            self.write_prometheus(self.prom_path)
+
+    def _evict(self, now):
+        """Forget the least recent sessions beyond ``max_sessions`` and any idle for ``session_ttl``"""
+        while self._recent:
+            last, _ = next(iter(self._recent.values()))
+            if len(self._recent) <= self.max_sessions and now - last < self.session_ttl:
+                break
+            self._recent.popitem(last=False)
+
+    def recent(self, session):
+        """The session's last reruns, newest first"""
+        with self._lock:
+            return list(reversed(self._recent.get(session, (None, ()))[1]))
+
+    def prometheus_text(self):
+        """Totals in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP bre_rerun_seconds Wall time of app and fragment reruns",
+                "# TYPE bre_rerun_seconds summary",
+            ]
+            for kind, (count, seconds) in sorted(self._rerun_totals.items()):
+                lines.append(f'bre_rerun_seconds_count{{kind="{kind}"}} {count}')
+                lines.append(f'bre_rerun_seconds_sum{{kind="{kind}"}} {seconds:.6f}')
+            lines += ["# HELP bre_section_seconds Wall time of instrumented sections", "# TYPE bre_section_seconds summary"]
+            for name, (count, seconds) in sorted(self._section_totals.items()):
+                lines.append(f'bre_section_seconds_count{{section="{name}"}} {count}')
+                lines.append(f'bre_section_seconds_sum{{section="{name}"}} {seconds:.6f}')
+            lines += ["# HELP bre_events_total Instrumentation counters", "# TYPE bre_events_total counter"]
+            for name, value in sorted(self._counters.items()):
+                lines.append(f'bre_events_total{{name="{name}"}} {value}')
+            lines += ["# HELP bre_sessions Sessions whose recent reruns are kept for the debug panel",
+                      "# TYPE bre_sessions gauge", f"bre_sessions {len(self._recent)}"]
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically replace ``path`` with the current totals"""
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp, path)
+
+
+_recorder = Recorder(PROM_PATH, JSONL_PATH) if ENABLED else None
+
+
+def enabled():
+    return _recorder is not None
+
+
+def recorder():
+    """The process-wide recorder, or None when instrumentation is disabled"""
+    return _recorder
+
+
+def begin_rerun(session, kind="app"):
+    """Start timing a rerun on this thread
+
+    A rerun still open on this thread was cut short by ``st.rerun()``; it is
+    recorded as ending at its last instrumented activity.
+    """
+    if _recorder is None:
+        return
+    end_rerun(stale=True)
+    _local.rerun = Rerun(session, kind)
+
+
+def end_rerun(stale=False):
+    if _recorder is None:
+        return
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return
+    _local.rerun = None
+    rerun.seconds = (rerun.last_activity if stale else time.perf_counter()) - rerun.started
+    _recorder.record(rerun)
+
+
+@contextlib.contextmanager
+def _timed(rerun, name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        rerun.add_time(name, time.perf_counter() - started)
+
+
+def section(name):
+    """Context manager timing a named section of the current rerun"""
+    if _recorder is None:
+        return _NULL
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return _NULL
+    return _timed(rerun, name)
+
+
+def count(name, value=1):
+    """Add to a named counter of the current rerun"""
+    if _recorder is None:
+        return
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        rerun.add_count(name, value)
+
+
+def measured(kind, session):
+    """Decorator for fragment functions: their own rerun when run alone, a section of the enclosing run otherwise
+
+    ``session`` is called to get the session key when a rerun starts.
+    """
+    def decorate(function):
+        if _recorder is None:
+            return function
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if getattr(_local, "rerun", None) is not None:
+                with section(kind):
+                    return function(*args, **kwargs)
+            _local.rerun = Rerun(session(), kind)
+            try:
+                return function(*args, **kwargs)
+            finally:
+                end_rerun()
+        return wrapper
+    return decorate
@@ -0,0 +1,289 @@
+"""Compact storage of cutouts as an alpha matte over their original.
+
+A background-removal cutout repeats most of its original's pixels next to a
+new alpha channel, yet it is stored as a full RGBA PNG. This command rewrites
+the processed images of a manifest as ``.matte.webp`` files next to them and
+writes a manifest that points at those::
+
+    python mattes.py --manifest manifest.jsonl --output manifest.mattes.jsonl --workers 8
+
+A matte file is a lossless WebP. When the cutout's colors are the original's
+wherever it is visible, it holds only the single-channel alpha matte.
+Otherwise (a cutout re-encoded from a JPEG original, or with decontaminated
+edge colors) it also holds the per-channel difference from the original, which
+is zero over most of the image. Colors under fully transparent pixels are
+predicted by one fill color. The fill color, the SHA-256 of the original file and
+the SHA-256 of the cutout's pixels are kept in the file's XMP metadata. A
+matte is only kept if it decodes back to exactly the cutout's RGBA pixels and
+is smaller than the PNG; otherwise the record keeps its PNG.
+
+The app rebuilds a cutout from its original and matte on first use, checks it
+against the stored pixel hash and caches it as a lossless WebP under
+``.cache/cutouts`` (or ``BRE_CUTOUT_DIR``). That cache can be deleted at any
+time.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+from image_cache import content_digest, is_remote
+
+DEFAULT_CUTOUT_DIR = os.environ.get(
+    "BRE_CUTOUT_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "cutouts"),
+)
+MATTE_SUFFIX = ".matte.webp"
+WEBP_METHOD = 4
+
+_NS = "urn:background-removal-evaluator:matte:1"
+_RDF = "http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+
+
+def is_matte(path):
+    return path.endswith(MATTE_SUFFIX)
+
+
+def matte_path(processed_path):
+    """Where the matte for a processed image is written: next to it"""
+    return os.path.splitext(processed_path)[0] + MATTE_SUFFIX
+
+
+def cutout_path(digest, cutout_dir=DEFAULT_CUTOUT_DIR):
+    return os.path.join(cutout_dir, digest[:2], f"{digest}.webp")
+
+
+def pixel_digest(pixels):
+    """SHA-256 of an image's decoded pixels and shape"""
+    h = hashlib.sha256("x".join(map(str, pixels.shape)).encode())
+    h.update(np.ascontiguousarray(pixels).data)
+    return h.hexdigest()
+
+
+def _fill_color(hidden):
+    """Most common color under fully transparent pixels"""
+    if not len(hidden):
+        return (0, 0, 0)
+    packed = (hidden[:, 0].astype(np.uint32) << 16) | (hidden[:, 1].astype(np.uint32) << 8) | hidden[:, 2]
+    colors, counts = np.unique(packed, return_counts=True)
+    color = int(colors[counts.argmax()])
+    return (color >> 16, (color >> 8) & 255, color & 255)
+
+
+def _predict(original, alpha, fill):
+    """The cutout's colors as the original's where visible and the fill color elsewhere"""
+    return np.where((alpha > 0)[..., None], original, np.asarray(fill, dtype=np.uint8))
+
+
+def encode(original, cutout):
+    """Matte image and fill color for an RGBA cutout of an RGB original, both uint8 arrays"""
+    alpha = cutout[..., 3]
+    fill = _fill_color(cutout[alpha == 0, :3])
+    # uint8 arithmetic wraps, so rebuild() undoes this exactly
+    residual = cutout[..., :3] - _predict(original, alpha, fill)
+    if residual.any():
+        return Image.fromarray(np.dstack((residual, alpha))), fill
+    return Image.fromarray(np.ascontiguousarray(alpha)), fill
+
+
+def rebuild(original, matte, fill):
+    """RGBA cutout from a matte image and the original decoded to an RGBA array, which it overwrites
+
+    Pixels are handled as 32-bit words: the original's alpha byte is cleared,
+    hidden pixels take the fill color, then the matte's residual and alpha are
+    added bytewise on top.
+    """
+    planes = np.asarray(matte)
+    if matte.mode == "RGBA":
+        alpha = planes[..., 3]
+    else:
+        # An alpha-only matte, which WebP decodes as gray RGB
+        alpha = planes if planes.ndim == 2 else planes[..., 0]
+    words = original.view("<u4")[..., 0]
+    words &= np.uint32(0x00FFFFFF)
+    np.copyto(words, np.uint32(fill[0] | fill[1] << 8 | fill[2] << 16), where=alpha == 0)
+    if matte.mode == "RGBA":
+        original += planes
+    else:
+        original[..., 3] = alpha
+    return original
+
+
+def _xmp(original_digest, cutout_digest, fill):
+    return (
+        f'<x:xmpmeta xmlns:x="adobe:ns:meta/"><rdf:RDF xmlns:rdf="{_RDF}">'
+        f'<rdf:Description xmlns:matte="{_NS}" matte:original="{original_digest}" '
+        f'matte:cutout="{cutout_digest}" matte:fill="{",".join(map(str, fill))}"/>'
+        f"</rdf:RDF></x:xmpmeta>"
+    ).encode()
+
+
+def matte_info(matte):
+    """``{"original", "cutout", "fill"}`` from an open matte image's metadata"""
+    xmp = matte.info.get("xmp")
+    description = None if not xmp else ET.fromstring(xmp).find(f".//{{{_RDF}}}Description")
+    if description is None or description.get(f"{{{_NS}}}cutout") is None:
+        raise ValueError("not a matte file")
+    return {
+        "original": description.get(f"{{{_NS}}}original"),
+        "cutout": description.get(f"{{{_NS}}}cutout"),
+        "fill": tuple(int(c) for c in description.get(f"{{{_NS}}}fill").split(",")),
+    }
+
+
+def _load(path, mode):
+    with Image.open(path) as im:
+        return np.array(im.convert(mode))
+
+
+def write_matte(original_path, processed_path, target=None):
+    """Encode a cutout as a matte file; returns its path, or None if the PNG is kept
+
+    The PNG is kept when the images differ in size, or when the matte is not
+    smaller or does not decode back to the exact same pixels.
+    """
+    target = target or matte_path(processed_path)
+    original = _load(original_path, "RGBA")
+    cutout = _load(processed_path, "RGBA")
+    if original.shape != cutout.shape:
+        return None
+    image, fill = encode(original[..., :3], cutout)
+    xmp = _xmp(content_digest(original_path), pixel_digest(cutout), fill)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(target)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, "WEBP", lossless=True, quality=100, method=WEBP_METHOD, exact=True, xmp=xmp)
+        with Image.open(tmp) as matte:
+            exact = np.array_equal(rebuild(original, matte, fill), cutout)
+        if not exact or os.path.getsize(tmp) >= os.path.getsize(processed_path):
+            return None
+        os.chmod(tmp, 0o644)
+        os.replace(tmp, target)
+        return target
+    finally:
+        if os.path.exists(tmp):
+            os.unlink(tmp)
+
+
+def cutout_for(original_path, processed_path, cutout_dir=DEFAULT_CUTOUT_DIR):
+    """Local path of a processed image, rebuilding it from its original when it is stored as a matte
+
+    Raises ValueError when the original is not the one the matte was made
+    from, or the rebuilt pixels don't match (e.g. a different JPEG decoder).
+    """
+    if not is_matte(processed_path):
+        return processed_path
+    with Image.open(processed_path) as matte:
+        info = matte_info(matte)
+        path = cutout_path(info["cutout"], cutout_dir)
+        if os.path.exists(path):
+            return path
+        if content_digest(original_path) != info["original"]:
+            raise ValueError(f"{processed_path} was not made from {original_path}")
+        cutout = rebuild(_load(original_path, "RGBA"), matte, info["fill"])
+    if pixel_digest(cutout) != info["cutout"]:
+        raise ValueError(f"{processed_path} does not rebuild its cutout exactly from {original_path}")
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        # Lossless at the fastest setting: this is a cache, so encode time matters more than size
+        Image.fromarray(cutout).save(f, "WEBP", lossless=True, quality=0, method=0, exact=True)
+    os.replace(tmp, path)
+    return path
+
+
+def _convert_task(task):
+    """Worker entry point: write the matte for one resolved pair"""
+    original_path, processed_path = task
+    try:
+        return write_matte(original_path, processed_path)
+    except (OSError, ValueError):
+        return None
+
+
+def _relative(ref, directory):
+    return ref if is_remote(ref) else os.path.relpath(ref, directory)
+
+
+def convert(dataset, output, resolve, workers=None, chunk_size=256, log=print):
+    """Write mattes for every local processed PNG and a manifest using them; returns run stats and the replaced PNGs"""
+    stats = {"pairs": len(dataset), "converted": 0, "kept": 0, "png_bytes": 0, "matte_bytes": 0}
+    replaced = []
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(fd, "w") as f, ProcessPoolExecutor(max_workers=workers) as pool:
+        for start, records in dataset.iter_chunks(chunk_size):
+            tasks = []
+            for record in records:
+                try:
+                    local = not is_remote(record["processed"]) and not is_matte(record["processed"])
+                    tasks.append((resolve(record["original"]), record["processed"]) if local else None)
+                except OSError as e:
+                    log(f"skip {record['id']}: {e}")
+                    tasks.append(None)
+            pending = [task for task in tasks if task is not None]
+            mattes = dict(zip(pending, pool.map(_convert_task, pending, chunksize=8)))
+            for record, task in zip(records, tasks):
+                matte = mattes.get(task)
+                if matte is not None:
+                    stats["converted"] += 1
+                    stats["png_bytes"] += os.path.getsize(record["processed"])
+                    stats["matte_bytes"] += os.path.getsize(matte)
+                    replaced.append(record["processed"])
+                    record = {**record, "processed": matte, "processed_sha256": None}
+                elif task is not None:
+                    stats["kept"] += 1
+                record = {**record, "original": _relative(record["original"], directory),
+                          "processed": _relative(record["processed"], directory)}
+                f.write(json.dumps(record) + "\n")
+            log(f"{start + len(records)}/{len(dataset)} pairs processed")
+    os.chmod(tmp, 0o644)
+    os.replace(tmp, output)
+    return stats, replaced
+
+
+def main(argv=None):
+    from dataset import DEFAULT_MANIFEST, Dataset
+    from image_cache import ImageCache
+
+    parser = argparse.ArgumentParser(description="Store a manifest's cutouts as alpha mattes over their originals")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--output", help="manifest to write (default: <manifest>.mattes.jsonl)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--remove", action="store_true", help="delete each PNG once its matte is written")
+    parser.add_argument("--json", action="store_true", help="print run stats as one JSON line")
+    args = parser.parse_args(argv)
+
+    log = (lambda message: None) if args.json else print
+    output = args.output or os.path.splitext(args.manifest)[0] + ".mattes.jsonl"
+    started = time.perf_counter()
+    stats, replaced = convert(Dataset(args.manifest), output, ImageCache().resolve, args.workers, args.chunk_size, log)
+    stats["seconds"] = time.perf_counter() - started
+    stats["removed"] = 0
+    if args.remove:
+        # Only once the new manifest is in place, so an interrupted run never loses a cutout
+        for path in set(replaced):
+            os.unlink(path)
+            stats["removed"] += 1
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print(
+            f"{stats['converted']}/{stats['pairs']} cutouts stored as mattes ({stats['kept']} kept as PNG), "
+            f"{stats['png_bytes'] / 1e6:.1f} MB -> {stats['matte_bytes'] / 1e6:.1f} MB in {stats['seconds']:.1f}s; "
+            f"wrote {output}" + (f", removed {stats['removed']} PNGs" if args.remove else "")
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""Objective mask-quality metrics for background removal results.
+
+All metrics are computed on whole NumPy arrays; there are no per-pixel Python
+loops. Inputs are downscaled to ``MAX_SIDE`` before scoring so memory per pair
+stays bounded regardless of source resolution.
+"""
+
+import numpy as np
+from PIL import Image
+
+try:
+    from scipy import ndimage as _ndimage
+except ImportError:  # scipy is optional; fall back to the NumPy labeller below
+    _ndimage = None
+
+MAX_SIDE = 1024
+
+# Alpha thresholds (0-1) separating background, fringe and solid foreground
+BACKGROUND_ALPHA = 0.05
+FOREGROUND_ALPHA = 0.95
+EDGE_GRADIENT = 0.02
+# Band width in pixels, and islands smaller than this fraction of the image are ignored
+HALO_BAND = 3
+MIN_ISLAND_FRACTION = 1e-4
+
+METRIC_NAMES = ("coverage", "edge_sharpness", "fringe_ratio", "halo_bleed", "stray_islands")
+METRIC_LABELS = {
+    "coverage": "Foreground Coverage",
+    "edge_sharpness": "Edge Sharpness",
+    "fringe_ratio": "Fringe Area",
+    "halo_bleed": "Halo Bleed",
+    "stray_islands": "Stray Islands",
+}
+
+
+def load_pair(original_path, processed_path, max_side=MAX_SIDE):
+    """Load an original and its cutout as float32 arrays of matching size
+
+    Returns ``(rgb, cutout_rgb, alpha)`` with colors in 0-255 and alpha in 0-1.
+    """
+    with Image.open(processed_path) as processed:
+        processed = processed.convert("RGBA")
+        scale = min(1.0, max_side / max(processed.size))
+        size = (max(1, round(processed.width * scale)), max(1, round(processed.height * scale)))
+        if size != processed.size:
+            processed = processed.resize(size, Image.BILINEAR)
+        cutout = np.asarray(processed, dtype=np.float32)
+    with Image.open(original_path) as original:
+        original = original.convert("RGB")
+        if original.size != size:
+            original = original.resize(size, Image.BILINEAR)
+        rgb = np.asarray(original, dtype=np.float32)
+    return rgb, cutout[..., :3], cutout[..., 3] / 255.0
+
+
+def _dilate(mask, radius):
+    """Binary dilation with a square structuring element using shifted ORs"""
+    out = mask.copy()
+    for _ in range(radius):
+        grown = out.copy()
+        grown[1:] |= out[:-1]
+        grown[:-1] |= out[1:]
+        grown[:, 1:] |= out[:, :-1]
+        grown[:, :-1] |= out[:, 1:]
+        out = grown
+    return out
+
+
+def label_components(mask):
+    """Label 4-connected components of a boolean mask; returns ``(labels, count)``"""
+    if _ndimage is not None:
+        return _ndimage.label(mask)
+
+    h, w = mask.shape
+    sentinel = h * w + 1
+    labels = np.where(mask, np.arange(1, h * w + 1, dtype=np.int64).reshape(h, w), sentinel)
+    while True:
+        # Propagate the smallest neighbouring label, then pointer-jump to collapse chains
+        smallest = labels.copy()
+        np.minimum(smallest[1:], labels[:-1], out=smallest[1:])
+        np.minimum(smallest[:-1], labels[1:], out=smallest[:-1])
+        np.minimum(smallest[:, 1:], labels[:, :-1], out=smallest[:, 1:])
+        np.minimum(smallest[:, :-1], labels[:, 1:], out=smallest[:, :-1])
+        smallest = np.where(mask, smallest, sentinel)
+        flat = smallest.ravel()
+        inside = flat < sentinel
+        flat[inside] = np.minimum(flat[inside], flat[flat[inside] - 1])
+        if np.array_equal(smallest, labels):
+            break
+        labels = smallest
+    roots, dense = np.unique(labels[mask], return_inverse=True)
+    out = np.zeros((h, w), dtype=np.int32)
+    out[mask] = dense + 1
+    return out, len(roots)
+
+
+def compute_metrics(rgb, cutout_rgb, alpha):
+    """Score one pair from arrays produced by :func:`load_pair`"""
+    total = alpha.size
+    foreground = alpha >= 0.5
+    background = alpha < BACKGROUND_ALPHA
+    fringe = ~background & (alpha < FOREGROUND_ALPHA)
+
+    coverage = float(foreground.mean())
+
+    gy, gx = np.gradient(alpha)
+    gradient = np.hypot(gx, gy)
+    edges = gradient > EDGE_GRADIENT
+    edge_sharpness = float(gradient[edges].mean()) if edges.any() else 1.0
+
+    fringe_ratio = float(fringe.sum() / max(1, (~background).sum()))
+
+    # Halo: how much the kept pixels next to the cut resemble the removed background
+    halo_bleed = 0.0
+    if background.any() and (~background).any():
+        bg_pixels = rgb[background]
+        bg_mean = bg_pixels.mean(axis=0)
+        spread = max(float(bg_pixels.std(axis=0).mean()), 10.0)
+        band = _dilate(background, HALO_BAND) & ~background
+        if band.any():
+            distance = np.linalg.norm(cutout_rgb[band] - bg_mean, axis=1)
+            similarity = np.exp(-0.5 * (distance / spread) ** 2)
+            halo_bleed = float(np.average(similarity, weights=alpha[band]))
+
+    labels, count = label_components(foreground)
+    stray_islands = 0
+    if count > 1:
+        sizes = np.bincount(labels.ravel())[1:]
+        significant = sizes >= max(1, MIN_ISLAND_FRACTION * total)
+        stray_islands = int(max(0, significant.sum() - 1))
+
+    return {
+        "coverage": coverage,
+        "edge_sharpness": edge_sharpness,
+        "fringe_ratio": fringe_ratio,
+        "halo_bleed": halo_bleed,
+        "stray_islands": stray_islands,
+    }
+
+
+def score_pair(original_path, processed_path, max_side=MAX_SIDE):
+    """Load and score one original/cutout pair"""
+    return compute_metrics(*load_pair(original_path, processed_path, max_side))
+
+
+def score_dataset(dataset, resolve, chunk_size=64, max_side=MAX_SIDE):
+    """Yield ``(index, metrics)`` for every pair, one manifest chunk at a time
+
+    ``resolve`` maps an image reference to a local path. Only one chunk of
+    records and one pair of decoded images are held in memory at a time.
+    """
+    for start, records in dataset.iter_chunks(chunk_size):
+        for offset, record in enumerate(records):
+            try:
+                metrics = score_pair(resolve(record["original"]), resolve(record["processed"]), max_side)
+            except (OSError, ValueError):
+                metrics = None
+            yield start + offset, metrics
+
+
+def _rank(values):
+    """Average ranks (ties share the mean rank) for Spearman correlation"""
+    order = np.argsort(values, kind="mergesort")
+    ranks = np.empty(len(values), dtype=np.float64)
+    ranks[order] = np.arange(1, len(values) + 1)
+    _, inverse, counts = np.unique(values, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+
+def metric_correlations(metric_rows, scores):
+    """Spearman correlation between each metric and the human scores
+
+    ``metric_rows`` and ``scores`` are parallel sequences; rows that are None
+    are skipped. Metrics without enough variation report None.
+    """
+    pairs = [(row, score) for row, score in zip(metric_rows, scores) if row is not None]
+    if len(pairs) < 3:
+        return {name: None for name in METRIC_NAMES}
+    human = _rank(np.array([score for _, score in pairs], dtype=np.float64))
+    table = np.array([[row[name] for name in METRIC_NAMES] for row, _ in pairs], dtype=np.float64)
+    result = {}
+    for column, name in enumerate(METRIC_NAMES):
+        ranked = _rank(table[:, column])
+        if ranked.std() == 0 or human.std() == 0:
+            result[name] = None
+        else:
+            result[name] = float(np.corrcoef(ranked, human)[0, 1])
+    return result
@@ -0,0 +1,222 @@
+"""Persistent, content-addressed store of precomputed pair metrics.
+
+Metrics are computed offline by the batch command below and written to a
+SQLite database keyed by a hash of both images' contents, so the app only
+performs indexed reads while rendering. Runs are incremental: pairs whose
+content hash is already stored are skipped, and every chunk is committed as
+it finishes so an interrupted run resumes where it stopped::
+
+    python metrics_store.py --manifest manifest.jsonl --workers 8
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import resource
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from image_cache import ImageCache, content_digest
+from mattes import cutout_for
+from metrics import METRIC_NAMES, score_pair
+
+DEFAULT_DB_PATH = os.environ.get(
+    "BRE_METRICS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "metrics.sqlite3"),
+)
+
+# Bump when metric definitions change so stored rows are recomputed
+METRICS_VERSION = 1
+
+_SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS pair_metrics (
+    pair_hash TEXT PRIMARY KEY,
+    {", ".join(f"{name} REAL" for name in METRIC_NAMES)},
+    computed_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS pair_refs (
+    original TEXT NOT NULL,
+    processed TEXT NOT NULL,
+    pair_hash TEXT NOT NULL,
+    PRIMARY KEY (original, processed)
+);
+"""
+
+
+def pair_hash(original_digest, processed_digest):
+    """Key for a pair: both content hashes plus the metric definition version"""
+    key = f"{METRICS_VERSION}:{original_digest}:{processed_digest}"
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+class MetricsStore:
+    """SQLite-backed map from image pair to its precomputed metrics"""
+
+    def __init__(self, path=DEFAULT_DB_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def has(self, hashes):
+        """Return the subset of pair hashes that already have stored metrics"""
+        found = set()
+        hashes = list(hashes)
+        with self._lock:
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT pair_hash FROM pair_metrics WHERE pair_hash IN ({placeholders})", batch
+                )
+                found.update(row[0] for row in rows)
+        return found
+
+    def put_many(self, rows, refs=()):
+        """Insert ``(pair_hash, metrics)`` rows and ``(original, processed, pair_hash)`` refs in one transaction"""
+        now = time.time()
+        columns = ", ".join(METRIC_NAMES)
+        placeholders = ", ".join("?" * (len(METRIC_NAMES) + 2))
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                self._conn.executemany(
+                    f"INSERT OR REPLACE INTO pair_metrics (pair_hash, {columns}, computed_at) VALUES ({placeholders})",
+                    [(key, *(metrics[name] for name in METRIC_NAMES), now) for key, metrics in rows],
+                )
+                self._conn.executemany("INSERT OR REPLACE INTO pair_refs VALUES (?, ?, ?)", list(refs))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def get(self, original, processed):
+        """Precomputed metrics for a pair of references, or None if not computed yet"""
+        return self.get_many([(original, processed)])[0]
+
+    def get_many(self, pairs):
+        """Metrics for each ``(original, processed)`` reference pair, None where missing
+
+        Pairs are looked up 250 at a time (500 bound values), not one query each.
+        """
+        pairs = [(str(original), str(processed)) for original, processed in pairs]
+        columns = ", ".join(f"m.{name}" for name in METRIC_NAMES)
+        found = {}
+        with self._lock:
+            for start in range(0, len(pairs), 250):
+                batch = list(dict.fromkeys(pairs[start:start + 250]))
+                placeholders = ",".join("(?, ?)" for _ in batch)
+                rows = self._conn.execute(
+                    f"WITH wanted (original, processed) AS (VALUES {placeholders}) "
+                    f"SELECT r.original, r.processed, {columns} FROM wanted w "
+                    "JOIN pair_refs r ON r.original = w.original AND r.processed = w.processed "
+                    "JOIN pair_metrics m ON m.pair_hash = r.pair_hash",
+                    [value for pair in batch for value in pair],
+                )
+                found.update(((row[0], row[1]), dict(zip(METRIC_NAMES, row[2:]))) for row in rows)
+        return [found.get(pair) for pair in pairs]
+
+    def all_metrics(self):
+        """Every stored pair as ``{(original, processed): metrics}``, in one query"""
+        columns = ", ".join(f"m.{name}" for name in METRIC_NAMES)
+        query = f"SELECT r.original, r.processed, {columns} FROM pair_refs r JOIN pair_metrics m ON m.pair_hash = r.pair_hash"
+        with self._lock:
+            rows = self._conn.execute(query).fetchall()
+        return {(row[0], row[1]): dict(zip(METRIC_NAMES, row[2:])) for row in rows}
+
+
+def _score_task(task):
+    """Worker entry point: score one resolved pair"""
+    key, original_path, processed_path = task
+    try:
+        return key, score_pair(original_path, cutout_for(original_path, processed_path))
+    except (OSError, ValueError):
+        return key, None
+
+
+def precompute(dataset, store, resolve, workers=None, chunk_size=256, log=print):
+    """Score every pair in ``dataset`` that the store doesn't have yet; returns run stats"""
+    stats = {"scored": 0, "skipped": 0, "failed": 0}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for start, records in dataset.iter_chunks(chunk_size):
+            tasks, refs = [], []
+            for record in records:
+                try:
+                    original_path = resolve(record["original"])
+                    processed_path = resolve(record["processed"])
+                    key = pair_hash(content_digest(original_path), content_digest(processed_path))
+                except OSError as e:
+                    log(f"skip {record['id']}: {e}")
+                    stats["failed"] += 1
+                    continue
+                tasks.append((key, original_path, processed_path))
+                refs.append((record["original"], record["processed"], key))
+
+            known = store.has(task[0] for task in tasks)
+            pending = [task for task in tasks if task[0] not in known]
+            stats["skipped"] += len(tasks) - len(pending)
+
+            rows = []
+            for key, metrics in pool.map(_score_task, pending, chunksize=8):
+                if metrics is None:
+                    stats["failed"] += 1
+                else:
+                    rows.append((key, metrics))
+            scored = {key for key, _ in rows} | known
+            store.put_many(rows, [ref for ref in refs if ref[2] in scored])
+            stats["scored"] += len(rows)
+            log(f"{start + len(records)}/{len(dataset)} pairs processed")
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["pairs_per_second"] = stats["scored"] / stats["seconds"] if stats["seconds"] else 0.0
+    return stats
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process and of its largest worker, in MiB"""
+    scale = 1 if sys.platform == "darwin" else 1024
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    workers = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * scale
+    return own / 2**20, workers / 2**20
+
+
+def main(argv=None):
+    from dataset import DEFAULT_MANIFEST, Dataset
+
+    parser = argparse.ArgumentParser(description="Precompute pair metrics for a manifest")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--db", default=DEFAULT_DB_PATH)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=256)
+    parser.add_argument("--json", action="store_true", help="print run stats as one JSON line")
+    args = parser.parse_args(argv)
+
+    store = MetricsStore(args.db)
+    log = (lambda message: None) if args.json else print
+    stats = precompute(Dataset(args.manifest), store, ImageCache().resolve, args.workers, args.chunk_size, log)
+    stats["peak_rss_mb"], stats["peak_worker_rss_mb"] = _peak_rss_mb()
+    stats["workers"] = args.workers
+    store.close()
+
+    if args.json:
+        print(json.dumps(stats))
+    else:
+        print(
+            f"scored {stats['scored']}, skipped {stats['skipped']}, failed {stats['failed']} "
+            f"in {stats['seconds']:.1f}s ({stats['pairs_per_second']:.1f} pairs/s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
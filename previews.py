@@ -0,0 +1,155 @@
+"""Display-sized preview derivatives for the evaluation page.
+
+Each source image is rendered into a small pyramid of WebP variants keyed by
+the SHA-256 of the source bytes and the target width. The page sends the
+smallest variant that covers the width of the slot it is shown in, and only
+ships the full-resolution file when the annotator asks for it.
+
+Run as a batch job to pre-render every pair in a manifest::
+
+    python previews.py --manifest manifest.jsonl --workers 8
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from PIL import Image
+
+from image_cache import content_digest
+
+DEFAULT_PREVIEW_DIR = os.environ.get(
+    "BRE_PREVIEW_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "previews"),
+)
+
+# Pyramid levels, and the level each view mode needs to fill its slot on a wide layout
+PREVIEW_WIDTHS = (480, 960, 1920)
+VIEW_MODE_WIDTHS = {
+    "Side-by-Side": 960,
+    "Original Only": 1920,
+    "Processed Only": 1920,
+}
+WEBP_QUALITY = 85
+
+def width_for_view_mode(view_mode):
+    """Smallest pyramid level wide enough for the given view mode"""
+    target = VIEW_MODE_WIDTHS.get(view_mode, PREVIEW_WIDTHS[-1])
+    for width in PREVIEW_WIDTHS:
+        if width >= target:
+            return width
+    return PREVIEW_WIDTHS[-1]
+
+
+def variant_path(digest, width, preview_dir=DEFAULT_PREVIEW_DIR):
+    return os.path.join(preview_dir, digest[:2], f"{digest}_{width}.webp")
+
+
+def render_variant(source_path, width, preview_dir=DEFAULT_PREVIEW_DIR):
+    """Render one pyramid level and return the path of the file to serve
+
+    Levels wider than the source share a single full-size re-encode, and the
+    source itself is served when re-encoding would not make it smaller.
+    """
+    digest = content_digest(source_path)
+    path = variant_path(digest, width, preview_dir)
+    if os.path.exists(path):
+        return path
+    if os.path.exists(path + ".source"):
+        return source_path
+
+    with Image.open(source_path) as im:
+        target = path
+        if im.width <= width:
+            target = variant_path(digest, "native", preview_dir)
+        if not os.path.exists(target) and not os.path.exists(target + ".source"):
+            _encode(im, width, source_path, target)
+
+    if not os.path.exists(target):
+        if target != path:
+            open(path + ".source", "w").close()
+        return source_path
+    if target != path:
+        try:
+            os.link(target, path)
+        except FileExistsError:
+            pass
+        except OSError:
+            return target
+    return path
+
+
+def _encode(im, width, source_path, target):
+    """Write a WebP rendition of ``im`` at most ``width`` wide, or a skip marker if it isn't smaller"""
+    im.load()
+    if im.mode not in ("RGB", "RGBA"):
+        im = im.convert("RGBA" if "A" in im.getbands() or "transparency" in im.info else "RGB")
+    if im.width > width:
+        height = max(1, round(im.height * width / im.width))
+        im = im.resize((width, height), Image.LANCZOS)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(target), suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        im.save(f, "WEBP", quality=WEBP_QUALITY, method=4)
+    if os.path.getsize(tmp) >= os.path.getsize(source_path):
+        os.unlink(tmp)
+        open(target + ".source", "w").close()
+    else:
+        os.replace(tmp, target)
+
+
+def render_pyramid(source_path, widths=PREVIEW_WIDTHS, preview_dir=DEFAULT_PREVIEW_DIR):
+    """Render every pyramid level for one source; used by the batch job"""
+    return [render_variant(source_path, width, preview_dir) for width in widths]
+
+
+def preview_for(source_path, view_mode, preview_dir=DEFAULT_PREVIEW_DIR):
+    """Path of the smallest adequate variant for a local source, or the source on failure"""
+    try:
+        return render_variant(source_path, width_for_view_mode(view_mode), preview_dir)
+    except (OSError, ValueError):
+        return source_path
+
+
+def main(argv=None):
+    from dataset import DEFAULT_MANIFEST, Dataset
+    from image_cache import ImageCache
+    from mattes import cutout_for
+
+    parser = argparse.ArgumentParser(description="Pre-render preview derivatives for a manifest")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=256)
+    args = parser.parse_args(argv)
+
+    dataset = Dataset(args.manifest)
+    cache = ImageCache()
+    done = failed = 0
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        for _, records in dataset.iter_chunks(args.chunk_size):
+            futures = []
+            for record in records:
+                try:
+                    original = cache.resolve(record["original"])
+                    sources = [original, cutout_for(original, cache.resolve(record["processed"]))]
+                except (OSError, ValueError) as e:
+                    print(f"skip {record['id']}: {e}")
+                    failed += 2
+                    continue
+                futures.extend(pool.submit(render_pyramid, source) for source in sources)
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                    done += 1
+                except (OSError, ValueError) as e:
+                    print(f"failed: {e}")
+                    failed += 1
+    elapsed = time.perf_counter() - started
+    print(f"rendered {done} sources ({failed} failed) in {elapsed:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
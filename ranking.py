@@ -0,0 +1,126 @@
+"""Model ranking from pairwise preferences between background-removal results.
+
+A comparison set is every manifest record that shares one original, one
+record per model. Each preference is a win of one model over another (a tie
+counts as half a win each way). Votes only ever add to a models x models win
+matrix, so new votes cost O(votes) and the ranking never revisits history.
+Bradley-Terry strengths are fitted on that matrix with the MM algorithm,
+warm-started from the previous fit, which needs a handful of O(models²)
+iterations per update however many comparisons there are. Strengths are
+reported on the Elo scale. A small symmetric prior keeps models with no wins
+or losses finite. This module has no Streamlit dependency.
+"""
+
+import threading
+
+import numpy as np
+
+ELO_BASE = 1500
+ELO_SCALE = 400 / np.log(10)
+PRIOR_GAMES = 1.0
+TOLERANCE = 1e-7
+MAX_ITERATIONS = 500
+
+
+def comparison_sets(dataset, chunk_size=4096):
+    """Record indices of every original with results from two or more models, in manifest order
+
+    Records without a ``model`` are compared under their ``name``.
+    """
+    by_original = {}
+    for start, records in dataset.iter_chunks(chunk_size):
+        for index, record in enumerate(records, start):
+            models = by_original.setdefault(record["original"], {})
+            models.setdefault(record["model"] or record["name"], index)
+    return [sorted(models.values()) for models in by_original.values() if len(models) > 1]
+
+
+class PairwiseRanking:
+    """Incremental Bradley-Terry fit over a growing set of models"""
+
+    def __init__(self, prior=PRIOR_GAMES):
+        self.prior = prior
+        self.names = []
+        self.codes = {}
+        self.wins = np.zeros((0, 0))
+        self.log_strengths = np.zeros(0)
+        self.comparisons = 0
+        self.rowid = 0
+        self._fitted = True
+        self._lock = threading.RLock()
+
+    def _codes(self, names):
+        """Codes for model names, growing the win matrix for new ones"""
+        for name in names:
+            if name not in self.codes:
+                self.codes[name] = len(self.names)
+                self.names.append(name)
+        grow = len(self.names) - len(self.wins)
+        if grow:
+            self.wins = np.pad(self.wins, ((0, grow), (0, grow)))
+            self.log_strengths = np.append(self.log_strengths, np.zeros(grow))
+        return np.fromiter((self.codes[name] for name in names), dtype=np.int64, count=len(names))
+
+    def add(self, winners, losers, ties=None):
+        """Fold in votes given as parallel sequences of winning and losing model names"""
+        with self._lock:
+            if not len(winners):
+                return
+            winner, loser = self._codes(list(winners)), self._codes(list(losers))
+            tie = np.zeros(len(winner)) if ties is None else np.asarray(ties, dtype=np.float64)
+            np.add.at(self.wins, (winner, loser), 1 - tie / 2)
+            np.add.at(self.wins, (loser, winner), tie / 2)
+            self.comparisons += len(winner)
+            self._fitted = False
+
+    def refresh(self, store):
+        """Fold in comparisons appended to the store since the last refresh; returns how many were read"""
+        with self._lock:
+            rows = store.comparisons_since(self.rowid)
+            if rows:
+                self.add([row[1] for row in rows], [row[2] for row in rows], [row[3] for row in rows])
+                self.rowid = rows[-1][0]
+            return len(rows)
+
+    def fit(self, tolerance=TOLERANCE, max_iterations=MAX_ITERATIONS):
+        """Bring the strengths up to date with the votes; returns the MM iterations used"""
+        with self._lock:
+            models = len(self.names)
+            if self._fitted or models < 2:
+                self._fitted = True
+                return 0
+            wins = self.wins + self.prior / (2 * (models - 1)) * (1 - np.eye(models))
+            games = wins + wins.T
+            won = wins.sum(axis=1)
+            strengths = np.exp(self.log_strengths)
+            for iteration in range(1, max_iterations + 1):
+                strengths = won / (games / (strengths[:, None] + strengths[None, :])).sum(axis=1)
+                log_strengths = np.log(strengths)
+                log_strengths -= log_strengths.mean()
+                strengths = np.exp(log_strengths)
+                change = np.abs(log_strengths - self.log_strengths).max()
+                self.log_strengths = log_strengths
+                if change < tolerance:
+                    break
+            self._fitted = True
+            return iteration
+
+    def win_probability(self, a, b):
+        """Fitted probability that model ``a`` is preferred over model ``b``"""
+        with self._lock:
+            difference = self.log_strengths[self.codes[a]] - self.log_strengths[self.codes[b]]
+        return 1 / (1 + np.exp(-difference))
+
+    def table(self):
+        """Models ordered best first, with Elo rating, win rate and comparison count"""
+        with self._lock:
+            self.fit()
+            played = self.wins.sum(axis=1) + self.wins.sum(axis=0)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                win_rate = self.wins.sum(axis=1) / played
+            elo = ELO_BASE + ELO_SCALE * self.log_strengths
+            return [
+                {"model": self.names[i], "elo": float(elo[i]), "win_rate": float(win_rate[i]),
+                 "comparisons": int(played[i])}
+                for i in np.argsort(-self.log_strengths, kind="stable")
+            ]
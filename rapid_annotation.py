@@ -0,0 +1,88 @@
+"""Keyboard-driven rapid annotation component.
+
+The browser side (``components/rapid_annotation/index.html``) holds a window of
+preloaded image pairs and rates them with the 1-5 keys, without a server round
+trip per image. Ratings are queued in the browser's localStorage and sent back
+in batches, every ``batch_size`` ratings or ``flush_interval`` seconds. Each
+render acknowledges the batch ids the server has applied; the browser keeps
+resending unacknowledged batches, so a dropped connection or a page reload
+loses no ratings and a resent batch is applied only once. Each rating carries
+the times its pair was shown and rated, for dwell-time telemetry.
+
+Each pair's images are sent to the browser once: ``items`` the browser has
+already received carry no image URLs. A page that lacks them (after a reload)
+lists their indices under ``missing`` in its value, and the app sends them again.
+"""
+
+import base64
+import mimetypes
+import os
+
+import streamlit.components.v1 as components
+
+BATCH_SIZE = 5
+FLUSH_INTERVAL = 5.0
+WINDOW = 15
+ACK_HISTORY = 256
+
+_component = components.declare_component(
+    "rapid_annotation",
+    path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "rapid_annotation"),
+)
+
+
+def data_url(path):
+    """Inline a local image as a data URL so the browser can preload it inside the component"""
+    mime = mimetypes.guess_type(path)[0] or "application/octet-stream"
+    with open(path, "rb") as f:
+        return f"data:{mime};base64,{base64.b64encode(f.read()).decode('ascii')}"
+
+
+def rapid_annotator(items, session, acked, rated, total, scale,
+                    batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL, key=None):
+    """Render the component; returns the unacknowledged batches the browser last sent, or None
+
+    ``items`` are ``{"index", "name", "original", "processed"}`` dicts with
+    image URLs, in the order they should be shown; ``original`` and
+    ``processed`` are left out for pairs the browser already has.
+    """
+    return _component(
+        items=items,
+        session=session,
+        acked=list(acked),
+        rated=rated,
+        total=total,
+        scale=scale,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        key=key,
+        default=None,
+    )
+
+
+def missing_items(value, handled):
+    """Indices the browser asked to be sent again, or an empty list if that request was already handled
+
+    ``handled`` is the send time of the last handled request, as returned in the second item.
+    """
+    value = value or {}
+    if not value.get("missing") or value.get("sent") == handled:
+        return [], handled
+    return [int(index) for index in value["missing"]], value.get("sent")
+
+
+def unapplied_ratings(value, acked):
+    """``(index, score, shown_at, rated_at)`` rows from batches not applied yet, in order; records their ids in ``acked``
+
+    The times are the browser's clock, in seconds, or None for ratings queued by an older page.
+    """
+    rows = []
+    for batch in (value or {}).get("batches", []):
+        if batch["id"] in acked:
+            continue
+        acked.append(batch["id"])
+        for index, score, *times in batch["ratings"]:
+            shown_at, rated_at = (times + [None, None])[:2]
+            rows.append((int(index), int(score), shown_at, rated_at))
+    del acked[:-ACK_HISTORY]
+    return rows
@@ -0,0 +1,331 @@
+"""Durable, shared storage for annotator ratings.
+
+Every rating is appended to a SQLite database in WAL mode as one row of
+``(annotator, session, image index, image id, score, timestamp)``; the latest
+row per session and image is the current rating. The image index is the
+record's position in the manifest, not in the app's deduplicated view. Rating clicks never touch the
+database directly: they enqueue the row and a single writer thread per process
+commits queued rows in batches, at most ``FLUSH_INTERVAL`` seconds or
+``FLUSH_SIZE`` rows apart. Sessions can be resumed from the stored rows.
+Pairwise preferences between models from the comparison mode are appended to
+a ``comparisons`` table the same way, and annotator interaction events (see
+``telemetry.py``) to an ``events`` table. Exports (see ``export.py``) stream
+ratings out in chunks on a connection of their own.
+"""
+
+import atexit
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+
+DEFAULT_DB_PATH = os.environ.get(
+    "BRE_RATINGS_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "ratings.sqlite3"),
+)
+FLUSH_INTERVAL = 0.5
+FLUSH_SIZE = 256
+EXPORT_CHUNK_ROWS = 50_000
+BUSY_TIMEOUT_MS = 5000
+ANONYMOUS = "anonymous"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS ratings (
+    annotator TEXT NOT NULL,
+    session TEXT NOT NULL,
+    image_index INTEGER NOT NULL,
+    image_id TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS ratings_session ON ratings (session, image_index, ts);
+CREATE TABLE IF NOT EXISTS sessions (
+    session TEXT PRIMARY KEY,
+    annotator TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    completed_at REAL
+);
+CREATE TABLE IF NOT EXISTS comparisons (
+    annotator TEXT NOT NULL,
+    session TEXT NOT NULL,
+    original TEXT NOT NULL,
+    winner TEXT NOT NULL,
+    loser TEXT NOT NULL,
+    tie INTEGER NOT NULL,
+    ts REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    annotator TEXT NOT NULL,
+    session TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    image_index INTEGER,
+    image_id TEXT,
+    value TEXT,
+    ts REAL NOT NULL
+);
+"""
+
+
+def new_session_id():
+    return uuid.uuid4().hex
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+class RatingsStore:
+    """Append-only ratings log with a batched background writer"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, flush_interval=FLUSH_INTERVAL, flush_size=FLUSH_SIZE):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.flush_size = flush_size
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        conn = _connect(path)
+        conn.executescript(_SCHEMA)
+        conn.close()
+
+        self._read_conn = _connect(path)
+        self._read_lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._writer = threading.Thread(target=self._run_writer, name="ratings-writer", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    # Writes
+
+    def record(self, annotator, session, image_index, image_id, score, ts=None):
+        """Queue one rating; returns immediately"""
+        row = (annotator, session, int(image_index), str(image_id), int(score), ts or time.time())
+        self._queue.put(("rating", row))
+
+    def record_comparison(self, annotator, session, original, winner, loser, tie=False, ts=None):
+        """Queue one preference of model ``winner`` over ``loser`` (or a tie) on an original; returns immediately"""
+        row = (annotator, session, str(original), str(winner), str(loser), int(bool(tie)), ts or time.time())
+        self._queue.put(("comparison", row))
+
+    def record_event(self, annotator, session, kind, image_index=None, image_id=None, value=None, ts=None):
+        """Queue one interaction event, e.g. an image shown or a rating changed; returns immediately"""
+        row = (
+            annotator, session, kind,
+            None if image_index is None else int(image_index),
+            None if image_id is None else str(image_id),
+            None if value is None else str(value),
+            ts or time.time(),
+        )
+        self._queue.put(("event", row))
+
+    def start_session(self, annotator, session):
+        self._queue.put(("session", (session, annotator, time.time())))
+
+    def complete_session(self, session):
+        self._queue.put(("complete", (time.time(), session)))
+
+    def flush(self, timeout=None):
+        """Block until everything queued so far is committed; returns False on timeout"""
+        done = threading.Event()
+        self._queue.put(("flush", done))
+        return done.wait(timeout)
+
+    def close(self):
+        if not self._writer.is_alive():
+            return
+        self.flush()
+        self._queue.put(("stop", None))
+        self._writer.join()
+        self._read_conn.close()
+
+    def _run_writer(self):
+        conn = _connect(self.path)
+        pending, waiters = [], []
+        deadline = None
+        stopping = False
+        while True:
+            timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+            try:
+                kind, payload = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                kind, payload = "tick", None
+
+            if kind == "flush":
+                waiters.append(payload)
+            elif kind == "stop":
+                stopping = True
+            elif kind in ("rating", "comparison", "event", "session", "complete"):
+                pending.append((kind, payload))
+                if deadline is None:
+                    deadline = time.monotonic() + self.flush_interval
+
+            due = deadline is not None and time.monotonic() >= deadline
+            if pending and (due or waiters or len(pending) >= self.flush_size or stopping):
+                if self._commit(conn, pending):
+                    pending, deadline = [], None
+                else:
+                    # Keep the batch and retry on the next tick rather than dropping ratings
+                    deadline = time.monotonic() + self.flush_interval
+            # Flushes and stop only complete once the batch is actually committed
+            if not pending:
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                if stopping:
+                    break
+        conn.close()
+
+    def _commit(self, conn, pending):
+        """Write one batch in a single transaction; returns False if the database stayed locked"""
+        ratings = [payload for kind, payload in pending if kind == "rating"]
+        comparisons = [payload for kind, payload in pending if kind == "comparison"]
+        events = [payload for kind, payload in pending if kind == "event"]
+        sessions = [payload for kind, payload in pending if kind == "session"]
+        completed = [payload for kind, payload in pending if kind == "complete"]
+        for attempt in range(5):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("INSERT OR IGNORE INTO sessions (session, annotator, created_at) VALUES (?, ?, ?)", sessions)
+                conn.executemany("INSERT INTO ratings VALUES (?, ?, ?, ?, ?, ?)", ratings)
+                conn.executemany("INSERT INTO comparisons VALUES (?, ?, ?, ?, ?, ?, ?)", comparisons)
+                conn.executemany("INSERT INTO events VALUES (?, ?, ?, ?, ?, ?, ?)", events)
+                conn.executemany("UPDATE sessions SET completed_at = ? WHERE session = ?", completed)
+                conn.execute("COMMIT")
+                return True
+            except sqlite3.OperationalError:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                time.sleep(0.05 * (attempt + 1))
+        return False
+
+    # Reads
+
+    def session_ratings(self, session):
+        """Current score per image index for a session, as ``{index: score}``"""
+        query = """
+            SELECT image_index, score FROM ratings r
+            WHERE session = ? AND ts = (
+                SELECT MAX(ts) FROM ratings WHERE session = r.session AND image_index = r.image_index
+            )
+        """
+        with self._read_lock:
+            return {index: score for index, score in self._read_conn.execute(query, (session,))}
+
+    def session_info(self, session):
+        """``(annotator, created_at, completed_at)`` for a session, or None if unknown"""
+        with self._read_lock:
+            return self._read_conn.execute(
+                "SELECT annotator, created_at, completed_at FROM sessions WHERE session = ?", (session,)
+            ).fetchone()
+
+    def latest_ratings(self):
+        """Current rating of every rater for every image, as parallel ``(raters, image_ids, scores)`` lists
+
+        Named annotators are one rater across sessions; anonymous sessions each count as their own rater.
+        """
+        query = f"""
+            SELECT CASE WHEN annotator = '{ANONYMOUS}' THEN session ELSE annotator END AS rater,
+                   image_id, score, MAX(ts)
+            FROM ratings GROUP BY rater, image_id
+        """
+        with self._read_lock:
+            rows = self._read_conn.execute(query).fetchall()
+        return [row[0] for row in rows], [row[1] for row in rows], [row[2] for row in rows]
+
+    def version(self):
+        """Id of the newest rating row; the log is append-only, so this changes whenever it does"""
+        with self._read_lock:
+            return self._read_conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM ratings").fetchone()[0]
+
+    def rows_since(self, rowid):
+        """``(rowid, rater, image_id, score, ts)`` for rows appended after ``rowid``, oldest first
+
+        Raters are named as in ``latest_ratings``.
+        """
+        query = f"""
+            SELECT rowid, CASE WHEN annotator = '{ANONYMOUS}' THEN session ELSE annotator END,
+                   image_id, score, ts
+            FROM ratings WHERE rowid > ? ORDER BY rowid
+        """
+        with self._read_lock:
+            return self._read_conn.execute(query, (rowid,)).fetchall()
+
+    def comparisons_since(self, rowid):
+        """``(rowid, winner, loser, tie)`` for comparisons appended after ``rowid``, oldest first"""
+        with self._read_lock:
+            return self._read_conn.execute(
+                "SELECT rowid, winner, loser, tie FROM comparisons WHERE rowid > ? ORDER BY rowid", (rowid,)
+            ).fetchall()
+
+    def events_since(self, rowid):
+        """``(rowid, rater, session, kind, image_id, value, ts)`` for events appended after ``rowid``, oldest first
+
+        Raters are named as in ``latest_ratings``.
+        """
+        query = f"""
+            SELECT rowid, CASE WHEN annotator = '{ANONYMOUS}' THEN session ELSE annotator END,
+                   session, kind, image_id, value, ts
+            FROM events WHERE rowid > ? ORDER BY rowid
+        """
+        with self._read_lock:
+            return self._read_conn.execute(query, (rowid,)).fetchall()
+
+    def _rating_query(self, columns, sessions, since, until, latest):
+        """SQL and parameters selecting rating rows by session and ``[since, until)`` time range"""
+        where, params = [], []
+        if sessions is not None:
+            where.append(f"session IN ({', '.join('?' * len(sessions))})")
+            params += [str(session) for session in sessions]
+        if since is not None:
+            where.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            where.append("ts < ?")
+            params.append(until)
+        clause = f"WHERE {' AND '.join(where)}" if where else ""
+        if latest:
+            # SQLite takes the bare columns from the row holding MAX(ts)
+            return f"SELECT {columns}, MAX(ts) AS ts FROM ratings {clause} GROUP BY session, image_index", params
+        return f"SELECT {columns}, ts FROM ratings {clause} ORDER BY rowid", params
+
+    def _stream(self, query, params, chunk_rows):
+        """Rows of a query, ``chunk_rows`` at a time, read on a connection of their own"""
+        conn = _connect(self.path)
+        try:
+            cursor = conn.execute(query, params)
+            while True:
+                rows = cursor.fetchmany(chunk_rows)
+                if not rows:
+                    break
+                yield rows
+        finally:
+            conn.close()
+
+    def iter_ratings(self, sessions=None, since=None, until=None, latest=False, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Lists of ``(annotator, session, image_index, image_id, score, ts)`` rows, oldest first
+
+        Only ratings of the given sessions and timestamps in ``[since, until)``
+        are read; with ``latest``, only each session's current rating of an
+        image. A long export never holds up the app's reads.
+        """
+        query, params = self._rating_query("annotator, session, image_index, image_id, score",
+                                           sessions, since, until, latest)
+        yield from self._stream(query, params, chunk_rows)
+
+    def iter_image_scores(self, sessions=None, since=None, until=None, chunk_rows=EXPORT_CHUNK_ROWS):
+        """Lists of ``(image_id, ratings, average, count of 1s .. count of 5s, first ts, last ts)`` rows by image id
+
+        Each session's current rating of an image counts once; filters are as in ``iter_ratings``.
+        """
+        latest, params = self._rating_query("session, image_index, image_id, score", sessions, since, until, True)
+        counts = ", ".join(f"SUM(score = {level})" for level in range(1, 6))
+        query = f"""
+            SELECT image_id, COUNT(*), AVG(score), {counts}, MIN(ts), MAX(ts)
+            FROM ({latest}) GROUP BY image_id ORDER BY image_id
+        """
+        yield from self._stream(query, params, chunk_rows)
@@ -0,0 +1,202 @@
+"""Pluggable schedulers that choose which image an annotator sees next.
+
+Schedulers are stateless and shared by every session; per-session progress
+lives in a ``cursors`` dict kept in session state. Cursors only move past
+rated images, so an image that was skipped unrated comes round again. Stratified and
+uncertainty scheduling read a :class:`SchedulerIndex` built once per process
+(category of every image, ordered by precomputed metric difficulty), so a
+decision is a handful of dictionary and array lookups rather than a scan of
+the dataset.
+"""
+
+import numpy as np
+
+from analytics import SCORE_LEVELS
+
+UNCATEGORIZED = ""
+# Pseudo-observations for a category's score spread before it has ratings
+PRIOR_STD = 1.0
+PRIOR_WEIGHT = 2.0
+
+_LEVELS = np.asarray(SCORE_LEVELS, dtype=np.float64)
+
+
+def difficulty(metric_rows):
+    """Vectorized difficulty score per image from objective metrics; 0 where metrics are missing
+
+    Higher means more fringe, halo and stray islands and softer edges, i.e.
+    the pairs a human verdict is least predictable for.
+    """
+    known = np.array([row is not None for row in metric_rows], dtype=bool)
+    scores = np.zeros(len(metric_rows), dtype=np.float32)
+    if not known.any():
+        return scores
+    rows = [row for row in metric_rows if row is not None]
+    table = np.array(
+        [[row["fringe_ratio"], row["halo_bleed"], np.log1p(row["stray_islands"]), -row["edge_sharpness"]] for row in rows],
+        dtype=np.float64,
+    )
+    spread = table.std(axis=0)
+    spread[spread == 0] = 1.0
+    scores[known] = ((table - table.mean(axis=0)) / spread).sum(axis=1)
+    return scores
+
+
+class SchedulerIndex:
+    """Per-category image orderings for the whole dataset"""
+
+    def __init__(self, categories, codes, priority):
+        self.categories = list(categories)
+        codes = np.asarray(codes, dtype=np.int32)
+        priority = np.asarray(priority, dtype=np.float32)
+        self.sizes = np.bincount(codes, minlength=len(self.categories))
+        # Hardest first within each category; stable so ties keep manifest order
+        order = np.lexsort((np.arange(len(codes)), -priority, codes))
+        bounds = np.concatenate([[0], np.cumsum(self.sizes)])
+        self.order = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.categories))]
+
+    @classmethod
+    def build(cls, dataset, metrics_lookup=None, chunk_size=4096):
+        """Stream the dataset once; ``metrics_lookup`` maps (original, processed) to metrics"""
+        categories = {}
+        codes, rows = [], []
+        for _, records in dataset.iter_chunks(chunk_size):
+            for record in records:
+                name = record.get("category") or UNCATEGORIZED
+                codes.append(categories.setdefault(name, len(categories)))
+                if metrics_lookup is not None:
+                    rows.append(metrics_lookup.get((record["original"], record["processed"])))
+        priority = difficulty(rows) if metrics_lookup is not None else np.zeros(len(codes), dtype=np.float32)
+        return cls(categories, codes, priority)
+
+
+class Scheduler:
+    """Base class; subclasses return the next unrated image index or None when all are rated"""
+
+    name = None
+
+    def next_index(self, current, ratings, cursors, analytics, total):
+        raise NotImplementedError
+
+    def peek(self, current, ratings, cursors, analytics, total, count):
+        """Up to ``count`` images that would follow ``current``, without moving the session's cursors"""
+        ratings, cursors = dict(ratings), dict(cursors)
+        ahead = []
+        ratings[current] = None
+        while len(ahead) < count:
+            index = self.next_index(current, ratings, cursors, analytics, total)
+            if index is None:
+                break
+            ahead.append(index)
+            ratings[index] = None
+            current = index
+        return ahead
+
+
+class LinearScheduler(Scheduler):
+    """Manifest order, skipping images that already have a rating
+
+    ``cursors["unrated"]`` holds the sorted indices that were unrated when last
+    looked at; rated ones are dropped as they are met, so each image is passed
+    over at most once instead of on every call.
+    """
+
+    name = "Linear"
+
+    def next_index(self, current, ratings, cursors, analytics, total):
+        unrated = cursors.get("unrated")
+        if unrated is None:
+            mask = np.ones(total, dtype=bool)
+            mask[np.fromiter(ratings, dtype=np.int64, count=len(ratings))] = False
+            unrated = np.flatnonzero(mask)
+        start = int(np.searchsorted(unrated, current, side="right"))
+        found, stale = None, []
+        for step in range(len(unrated)):
+            position = (start + step) % len(unrated)
+            index = int(unrated[position])
+            if index in ratings:
+                stale.append(position)
+            elif index != current:
+                found = index
+                break
+        # A new array, so the copies of cursors that look ahead leave the session's own alone
+        cursors["unrated"] = np.delete(unrated, stale) if stale else unrated
+        return found
+
+
+class _IndexedScheduler(Scheduler):
+    """Shared machinery for schedulers that pick a category, then the next image within it"""
+
+    def __init__(self, index):
+        self.index = index
+
+    def _rated_per_category(self, analytics):
+        groups = analytics.breakdowns["category"]
+        rated = np.array(
+            [groups[name].count if name in groups else 0 for name in self.index.categories], dtype=np.float64
+        )
+        if UNCATEGORIZED in self.index.categories:
+            position = self.index.categories.index(UNCATEGORIZED)
+            rated[position] = analytics.overall.count - rated.sum()
+        return rated
+
+    def _category_std(self, analytics):
+        """Posterior-ish std of scores per category, shrunk towards PRIOR_STD"""
+        groups = analytics.breakdowns["category"]
+        std = np.full(len(self.index.categories), PRIOR_STD)
+        for c, name in enumerate(self.index.categories):
+            group = groups.get(name)
+            if group is None or not group.count:
+                continue
+            histogram = np.asarray(group.histogram, dtype=np.float64)
+            mean = histogram @ _LEVELS / group.count
+            sum_sq = histogram @ (_LEVELS - mean) ** 2
+            std[c] = np.sqrt((sum_sq + PRIOR_WEIGHT * PRIOR_STD ** 2) / (group.count + PRIOR_WEIGHT))
+        return std
+
+    def _priority(self, rated, analytics):
+        raise NotImplementedError
+
+    def _next_in(self, category, current, ratings, cursors):
+        order = self.index.order[category]
+        position = cursors.get(category, 0)
+        while position < len(order) and order[position] in ratings:
+            position += 1
+        cursors[category] = position
+        # Look past the current image without moving the cursor, which stays on it until it is rated
+        while position < len(order) and (order[position] in ratings or order[position] == current):
+            position += 1
+        return int(order[position]) if position < len(order) else None
+
+    def next_index(self, current, ratings, cursors, analytics, total):
+        rated = self._rated_per_category(analytics)
+        priority = self._priority(rated, analytics)
+        for category in np.argsort(-priority, kind="stable"):
+            index = self._next_in(int(category), current, ratings, cursors)
+            if index is not None:
+                return index
+        return None
+
+
+class StratifiedScheduler(_IndexedScheduler):
+    """Keeps each category's share of ratings proportional to its share of the dataset"""
+
+    name = "Stratified"
+
+    def _priority(self, rated, analytics):
+        return -(rated / np.maximum(self.index.sizes, 1))
+
+
+class UncertaintyScheduler(_IndexedScheduler):
+    """Neyman allocation: rate where category size x score spread per rating is largest
+
+    Within a category the hardest pairs by objective metrics come first.
+    """
+
+    name = "Uncertainty"
+
+    def _priority(self, rated, analytics):
+        return self.index.sizes * self._category_std(analytics) / (rated + 1)
+
+
+SCHEDULERS = (LinearScheduler, StratifiedScheduler, UncertaintyScheduler)
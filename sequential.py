@@ -0,0 +1,56 @@
+"""Bayesian sequential test for the pass/fail verdict.
+
+The verdict is ``average >= 4``. Ratings are modelled as draws from an
+unknown distribution over the five levels with a Dirichlet posterior; the
+posterior of the mean score and of the high-quality (4-5) share is estimated
+by sampling that posterior. The cost depends only on the number of draws, not
+on how many ratings have been collected, so it can be re-evaluated after every
+rating. Once the verdict is settled at the chosen error rate the evaluation can
+stop early.
+"""
+
+import numpy as np
+
+from analytics import PASS_THRESHOLD, SCORE_LEVELS
+
+PRIOR = 0.5  # Jeffreys-style pseudo-count per level
+DRAWS = 4000
+MIN_RATINGS = 10
+DEFAULT_ERROR_RATE = 0.05
+
+_LEVELS = np.asarray(SCORE_LEVELS, dtype=np.float64)
+
+
+def posterior(histogram, draws=DRAWS, seed=None):
+    """Posterior samples of ``(mean score, high-quality share)`` given a five-bin histogram"""
+    counts = np.asarray(histogram, dtype=np.float64)
+    rng = np.random.default_rng(seed if seed is not None else tuple(int(c) for c in counts))
+    probabilities = rng.dirichlet(counts + PRIOR, size=draws)
+    return probabilities @ _LEVELS, probabilities[:, 3:].sum(axis=1)
+
+
+def assess(histogram, error_rate=DEFAULT_ERROR_RATE, min_ratings=MIN_RATINGS, draws=DRAWS):
+    """Probability the true average clears the threshold, credible intervals and a stop decision
+
+    ``decision`` is ``"pass"`` or ``"fail"`` once the verdict is settled at
+    ``error_rate``, otherwise None.
+    """
+    rated = int(sum(histogram))
+    if rated == 0:
+        return None
+    means, shares = posterior(histogram, draws)
+    p_pass = float((means >= PASS_THRESHOLD).mean())
+    tail = error_rate / 2 * 100
+    decision = None
+    if rated >= min_ratings:
+        if p_pass >= 1 - error_rate:
+            decision = "pass"
+        elif p_pass <= error_rate:
+            decision = "fail"
+    return {
+        "rated": rated,
+        "p_pass": p_pass,
+        "mean_interval": tuple(float(v) for v in np.percentile(means, [tail, 100 - tail])),
+        "high_quality_interval": tuple(float(v) * 100 for v in np.percentile(shares, [tail, 100 - tail])),
+        "decision": decision,
+    }
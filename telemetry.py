@@ -0,0 +1,265 @@
+"""Annotator interaction events and the dwell times computed from them.
+
+The app appends an event to the ratings database's ``events`` table for each
+interaction: an image shown, the view mode changed, a rating set or changed,
+and moving on to the next image. Events go through the ratings store's batched
+writer, so logging one never waits on the database. Rapid mode runs in the
+browser and sends the browser's own times for when each pair was shown and
+rated.
+
+A visit starts when an image is shown. It lasts until the session shows
+another image, or until the session's last event. A session's final visit
+with no event after it is still open (the image may be on screen now) and is
+left out. Visits longer than ``IDLE_SECONDS`` count as breaks and are left out. An image's dwell time in a
+session is the total of its visits. Dwell-time percentiles are reported per
+image, category and annotator, together with view-mode switches and rating
+changes per image and ratings per active hour. Events are kept as NumPy arrays
+that are refreshed from the rows appended since the last refresh, and
+percentiles for every group come from one sort. This module has no Streamlit
+dependency.
+
+Run as a batch job over the ratings database, one JSON line per group::
+
+    python telemetry.py --by image category annotator --manifest manifest.jsonl
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+
+import numpy as np
+
+SHOWN, VIEW_MODE, RATED, CHANGED, NEXT = "shown", "view_mode", "rated", "changed", "next"
+KINDS = (SHOWN, VIEW_MODE, RATED, CHANGED, NEXT)
+GROUPINGS = ("image", "category", "annotator")
+IDLE_SECONDS = 10 * 60
+QUANTILES = (0.5, 0.9)
+
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+
+
+def quantile_label(q):
+    return f"p{round(q * 100)}"
+
+
+def grouped_quantiles(codes, values, groups, quantiles=QUANTILES):
+    """``groups x len(quantiles)`` linearly interpolated quantiles of ``values`` per group code; NaN for empty groups"""
+    codes = np.asarray(codes, dtype=np.int64)
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full((groups, len(quantiles)), np.nan)
+    if not len(values):
+        return result
+    ordered = values[np.lexsort((values, codes))]
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.cumsum(counts) - counts
+    last = starts + np.maximum(counts - 1, 0)
+    position = starts[:, None] + np.asarray(quantiles)[None, :] * np.maximum(counts - 1, 0)[:, None]
+    lower = np.floor(position).astype(np.int64)
+    upper = np.minimum(lower + 1, last[:, None])
+    fraction = position - lower
+    lower, upper = np.minimum(lower, len(values) - 1), np.minimum(upper, len(values) - 1)
+    present = counts > 0
+    result[present] = (ordered[lower] * (1 - fraction) + ordered[upper] * fraction)[present]
+    return result
+
+
+def _rows(keys, codes, pairs, quantiles):
+    """One row per group with any timed images, slowest median first"""
+    groups = len(keys)
+    counts = np.bincount(codes, minlength=groups)
+    percentiles = grouped_quantiles(codes, pairs["seconds"], groups, quantiles)
+    seconds = np.bincount(codes, weights=pairs["seconds"], minlength=groups)
+    switches = np.bincount(codes, weights=pairs["view_switches"], minlength=groups)
+    changes = np.bincount(codes, weights=pairs["rating_changes"], minlength=groups)
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-percentiles[present, 0], kind="stable")]
+    return [
+        {
+            "key": keys[i],
+            "timed": int(counts[i]),
+            **{quantile_label(q): float(percentiles[i, j]) for j, q in enumerate(quantiles)},
+            "mean": float(seconds[i] / counts[i]),
+            "view_switches": float(switches[i] / counts[i]),
+            "rating_changes": int(changes[i]),
+        }
+        for i in order
+    ]
+
+
+class DwellTimes:
+    """Every interaction event in the ratings database as NumPy arrays, refreshed incrementally"""
+
+    def __init__(self):
+        self.rowid = 0
+        self.rater_codes, self.session_codes, self.image_codes = {}, {}, {}
+        self.rater_names, self.session_ids, self.image_ids = [], [], []
+        self.raters = np.empty(0, dtype=np.int64)
+        self.sessions = np.empty(0, dtype=np.int64)
+        self.images = np.empty(0, dtype=np.int64)
+        self.kinds = np.empty(0, dtype=np.int8)
+        self.ts = np.empty(0, dtype=np.float64)
+        self._lock = threading.Lock()
+
+    def _code(self, codes, names, name):
+        code = codes.get(name)
+        if code is None:
+            code = codes[name] = len(names)
+            names.append(name)
+        return code
+
+    def refresh(self, store):
+        """Fold in events appended since the last refresh; returns how many were read"""
+        with self._lock:
+            rows = store.events_since(self.rowid)
+            if not rows:
+                return 0
+            known = [row for row in rows if row[3] in _KIND_CODES]
+            count = len(known)
+            columns = (
+                (self.raters, (self._code(self.rater_codes, self.rater_names, row[1]) for row in known), np.int64),
+                (self.sessions, (self._code(self.session_codes, self.session_ids, row[2]) for row in known), np.int64),
+                (self.images, (-1 if row[4] is None else self._code(self.image_codes, self.image_ids, row[4])
+                               for row in known), np.int64),
+                (self.kinds, (_KIND_CODES[row[3]] for row in known), np.int8),
+                (self.ts, (row[6] for row in known), np.float64),
+            )
+            self.raters, self.sessions, self.images, self.kinds, self.ts = (
+                np.concatenate([current, np.fromiter(values, dtype=dtype, count=count)])
+                for current, values, dtype in columns
+            )
+            self.rowid = rows[-1][0]
+            return len(rows)
+
+    def _visits(self, idle_seconds):
+        """Per-visit arrays (rater, session, image, seconds, view switches, rating changes) and the number of breaks"""
+        count = len(self.ts)
+        if not count:
+            empty = np.empty(0, dtype=np.int64)
+            return {"rater": empty, "session": empty, "image": empty, "seconds": np.empty(0),
+                    "view_switches": empty, "rating_changes": empty}, 0
+        order = np.lexsort((np.arange(count), self.ts, self.sessions))
+        raters, sessions, images, kinds, ts = (
+            column[order] for column in (self.raters, self.sessions, self.images, self.kinds, self.ts)
+        )
+        starts = np.flatnonzero(kinds == _KIND_CODES[SHOWN])
+
+        # A visit ends when its session shows the next image, or at the session's last event
+        first = np.append(True, sessions[1:] != sessions[:-1])
+        last = np.append(sessions[1:] != sessions[:-1], True)
+        session_end = ts[last][np.cumsum(first) - 1]
+        following = np.append(starts[1:], count)
+        continued = following < count
+        continued[continued] = sessions[following[continued]] == sessions[starts[continued]]
+        end = session_end[starts]
+        end[continued] = ts[following[continued]]
+        seconds = end - ts[starts]
+        # Nothing logged after the session's final image was shown: no end time yet
+        session_last = np.flatnonzero(last)[np.cumsum(first) - 1]
+        unclosed = ~continued & (starts == session_last[starts])
+
+        # Other events count toward the visit they happen in, if it shows the same image
+        visit = np.cumsum(kinds == _KIND_CODES[SHOWN]) - 1
+        belongs = visit >= 0
+        owner = starts[visit[belongs]]
+        belongs[belongs] = (sessions[owner] == sessions[belongs]) & (images[owner] == images[belongs])
+        switches = np.bincount(visit[belongs & (kinds == _KIND_CODES[VIEW_MODE])], minlength=len(starts))
+        changes = np.bincount(visit[belongs & (kinds == _KIND_CODES[CHANGED])], minlength=len(starts))
+
+        kept = (seconds <= idle_seconds) & ~unclosed
+        visits = {
+            "rater": raters[starts][kept],
+            "session": sessions[starts][kept],
+            "image": images[starts][kept],
+            "seconds": seconds[kept],
+            "view_switches": switches[kept],
+            "rating_changes": changes[kept],
+        }
+        return visits, int((seconds > idle_seconds).sum())
+
+    def report(self, category_of=None, quantiles=QUANTILES, idle_seconds=IDLE_SECONDS):
+        """Dwell-time percentiles overall and per image, category (given ``category_of(image_id)``) and annotator"""
+        with self._lock:
+            visits, breaks = self._visits(idle_seconds)
+            ratings = np.bincount(self.raters[self.kinds == _KIND_CODES[RATED]], minlength=len(self.rater_names))
+            image_ids, rater_names, rater_codes = list(self.image_ids), list(self.rater_names), dict(self.rater_codes)
+            events = len(self.ts)
+
+        # An image's dwell time in a session is the total of its visits
+        keys = (visits["session"] << 32) | visits["image"]
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        pairs = {
+            "seconds": np.bincount(inverse, weights=visits["seconds"]),
+            "view_switches": np.bincount(inverse, weights=visits["view_switches"]),
+            "rating_changes": np.bincount(inverse, weights=visits["rating_changes"]),
+        }
+        pair_images, pair_raters = visits["image"][first], visits["rater"][first]
+        active = np.bincount(visits["rater"], weights=visits["seconds"], minlength=len(rater_names))
+
+        overall = _rows(["all"], np.zeros(len(first), dtype=np.int64), pairs, quantiles)
+        by_annotator = _rows(rater_names, pair_raters, pairs, quantiles)
+        for row in by_annotator:
+            code = rater_codes[row["key"]]
+            row["ratings"] = int(ratings[code])
+            row["ratings_per_hour"] = float(ratings[code] / active[code] * 3600) if active[code] else None
+        by_category = []
+        if category_of is not None and len(image_ids):
+            categories = np.array([category_of(image_id) for image_id in image_ids], dtype=object)
+            known = np.array([category is not None for category in categories], dtype=bool)
+            names, codes = np.unique(categories[known].astype(str), return_inverse=True)
+            image_category = np.full(len(image_ids), -1, dtype=np.int64)
+            image_category[known] = codes
+            mask = image_category[pair_images] >= 0
+            by_category = _rows(list(names), image_category[pair_images][mask],
+                                {name: values[mask] for name, values in pairs.items()}, quantiles)
+
+        return {
+            "events": events,
+            "visits": len(visits["seconds"]),
+            "breaks": breaks,
+            "overall": overall[0] if overall else None,
+            "ratings_per_hour": float(ratings.sum() / active.sum() * 3600) if active.sum() else None,
+            "image": _rows(image_ids, pair_images, pairs, quantiles),
+            "category": by_category,
+            "annotator": by_annotator,
+        }
+
+
+def main(argv=None):
+    from batch_analysis import manifest_lookup
+    from ratings_store import DEFAULT_DB_PATH, RatingsStore
+
+    parser = argparse.ArgumentParser(description="Dwell-time percentiles from the annotator event log")
+    parser.add_argument("--db", default=DEFAULT_DB_PATH, help="ratings database")
+    parser.add_argument("--by", nargs="+", choices=GROUPINGS, default=list(GROUPINGS))
+    parser.add_argument("--manifest", help="group images into categories from this manifest")
+    parser.add_argument("--idle", type=float, default=IDLE_SECONDS, help="visits longer than this many seconds are breaks")
+    parser.add_argument("--output", default="-", help="JSONL output file (default: stdout)")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    lookup = manifest_lookup(args.manifest)[0] if args.manifest else None
+    store = RatingsStore(args.db)
+    dwell = DwellTimes()
+    dwell.refresh(store)
+    store.close()
+    category_of = (lambda image_id: lookup.get(image_id, (None, None))[0]) if lookup is not None else None
+    report = dwell.report(category_of, idle_seconds=args.idle)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        for grouping in args.by:
+            for row in report[grouping]:
+                out.write(json.dumps({"grouping": grouping, **row}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    overall = report["overall"]
+    median = f"median dwell {overall['p50']:.1f}s, p90 {overall['p90']:.1f}s" if overall else "no timed images"
+    rate = f"{report['ratings_per_hour']:.0f} ratings per active hour" if report["ratings_per_hour"] else "no ratings"
+    print(f"{report['events']} events, {report['visits']} visits ({report['breaks']} breaks): {median}, {rate} "
+          f"in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
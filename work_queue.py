@@ -0,0 +1,243 @@
+"""Shared assignment of images to annotators under time-limited leases.
+
+Concurrent sessions that each pick their own images duplicate work on some
+pairs and leave others unrated. The queue hands out images instead. Each
+image needs ``TARGET_RATINGS`` ratings from distinct raters. An image is
+offered while its completed ratings plus its live leases are below that
+target, least-covered images first. A claim leases a batch of images to a
+rater for ``LEASE_SECONDS``. Rating an image completes its lease and renews
+the rest of the rater's batch, so a lease only lapses once its rater has been
+idle that long. The image then goes back into the pool on the next claim. Every claim and completion is one ``BEGIN IMMEDIATE`` transaction in a
+SQLite database in WAL mode, so the queue is shared safely by every session,
+thread and server process.
+
+Raters are the same as in the ratings store: named annotators are one rater
+across sessions, and anonymous sessions each count as their own rater. A
+rater is never offered an image it has already rated or currently holds.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from ratings_store import ANONYMOUS, BUSY_TIMEOUT_MS
+from scheduler import Scheduler
+
+DEFAULT_DB_PATH = os.environ.get(
+    "BRE_QUEUE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "queue.sqlite3"),
+)
+TARGET_RATINGS = int(os.environ.get("BRE_RATINGS_PER_IMAGE", 3))
+LEASE_SECONDS = 15 * 60
+BATCH_SIZE = 5
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS queue_images (
+    image_index INTEGER PRIMARY KEY,
+    done INTEGER NOT NULL DEFAULT 0,
+    leased INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS queue_open ON queue_images (done + leased, image_index);
+CREATE TABLE IF NOT EXISTS leases (
+    image_index INTEGER NOT NULL,
+    rater TEXT NOT NULL,
+    session TEXT NOT NULL,
+    expires_at REAL NOT NULL,
+    UNIQUE (image_index, rater)
+);
+CREATE INDEX IF NOT EXISTS leases_rater ON leases (rater);
+CREATE INDEX IF NOT EXISTS leases_session ON leases (session);
+CREATE INDEX IF NOT EXISTS leases_expiry ON leases (expires_at);
+CREATE TABLE IF NOT EXISTS completions (
+    image_index INTEGER NOT NULL,
+    rater TEXT NOT NULL,
+    PRIMARY KEY (image_index, rater)
+) WITHOUT ROWID;
+"""
+
+# Walks the coverage index from the least-covered image; the NOT EXISTS probes are primary-key lookups
+_CANDIDATES = """
+SELECT image_index FROM queue_images AS q
+WHERE done + leased < ? AND image_index != ?
+  AND NOT EXISTS (SELECT 1 FROM leases AS l WHERE l.image_index = q.image_index AND l.rater = ?)
+  AND NOT EXISTS (SELECT 1 FROM completions AS c WHERE c.image_index = q.image_index AND c.rater = ?)
+ORDER BY done + leased, image_index
+LIMIT ?
+"""
+
+
+def rater_for(annotator, session):
+    """Who a rating counts for: the annotator, or the session itself when anonymous"""
+    return session if annotator == ANONYMOUS else annotator
+
+
+class WorkQueue:
+    """SQLite-backed lease queue that spreads ``target`` ratings per image across raters"""
+
+    def __init__(self, path=DEFAULT_DB_PATH, target=TARGET_RATINGS, lease_seconds=LEASE_SECONDS):
+        self.path = path
+        self.target = target
+        self.lease_seconds = lease_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                     isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self, work):
+        """Run ``work(conn)`` in a write transaction; concurrent writers wait on the busy timeout"""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = work(self._conn)
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return result
+
+    def add_images(self, count):
+        """Make images ``0 .. count - 1`` available; images already in the queue keep their progress"""
+        def work(conn):
+            start = conn.execute("SELECT COALESCE(MAX(image_index) + 1, 0) FROM queue_images").fetchone()[0]
+            if start < count:
+                conn.execute(
+                    "WITH RECURSIVE n(i) AS (SELECT ? UNION ALL SELECT i + 1 FROM n WHERE i + 1 < ?) "
+                    "INSERT INTO queue_images (image_index) SELECT i FROM n",
+                    (start, count),
+                )
+        self._transaction(work)
+
+    def set_images(self, indices):
+        """Offer exactly these image indices; images kept keep their progress, the rest leave with their leases"""
+        def work(conn):
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS offered (image_index INTEGER PRIMARY KEY)")
+            conn.execute("DELETE FROM offered")
+            conn.executemany("INSERT INTO offered VALUES (?)", ((int(index),) for index in indices))
+            conn.execute("INSERT OR IGNORE INTO queue_images (image_index) SELECT image_index FROM offered")
+            conn.execute("DELETE FROM leases WHERE image_index NOT IN (SELECT image_index FROM offered)")
+            conn.execute("DELETE FROM queue_images WHERE image_index NOT IN (SELECT image_index FROM offered)")
+        self._transaction(work)
+
+    @staticmethod
+    def _expire(conn, now):
+        """Return the images of lapsed leases to the pool"""
+        expired = conn.execute("SELECT image_index FROM leases WHERE expires_at < ?", (now,)).fetchall()
+        if expired:
+            conn.executemany("UPDATE queue_images SET leased = leased - 1 WHERE image_index = ?", expired)
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+
+    def claim(self, session, rater, count=BATCH_SIZE, exclude=-1, now=None):
+        """Lease up to ``count`` more images to a rater and renew the leases it holds
+
+        Returns every image the rater now holds, oldest lease first. ``exclude``
+        is an image index not to hand out, e.g. the one on screen.
+        """
+        now = time.time() if now is None else now
+
+        def work(conn):
+            self._expire(conn, now)
+            expires_at = now + self.lease_seconds
+            conn.execute("UPDATE leases SET expires_at = ?, session = ? WHERE rater = ?", (expires_at, session, rater))
+            held = [row[0] for row in conn.execute("SELECT image_index FROM leases WHERE rater = ? ORDER BY rowid", (rater,))]
+            fresh = [row[0] for row in conn.execute(_CANDIDATES, (self.target, exclude, rater, rater, count))]
+            conn.executemany(
+                "INSERT INTO leases (image_index, rater, session, expires_at) VALUES (?, ?, ?, ?)",
+                [(index, rater, session, expires_at) for index in fresh],
+            )
+            conn.executemany("UPDATE queue_images SET leased = leased + 1 WHERE image_index = ?",
+                             [(index,) for index in fresh])
+            return held + fresh
+
+        return self._transaction(work)
+
+    def peek(self, rater, count=BATCH_SIZE, exclude=-1):
+        """Images a claim by the rater would lease next, without leasing them, e.g. to preload them
+
+        Leases that have lapsed but not yet been returned by a claim still count.
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute(_CANDIDATES, (self.target, exclude, rater, rater, count))]
+
+    def complete(self, rater, image_indices, now=None):
+        """Count ratings by a rater, end its leases on those images and renew its others; repeat ratings count once
+
+        A rating that arrives after its lease lapsed still counts, so an image
+        can end up one rating over target but a rating is never lost.
+        """
+        now = time.time() if now is None else now
+
+        def work(conn):
+            conn.execute("UPDATE leases SET expires_at = ? WHERE rater = ?", (now + self.lease_seconds, rater))
+            for index in image_indices:
+                if conn.execute("DELETE FROM leases WHERE image_index = ? AND rater = ?", (index, rater)).rowcount:
+                    conn.execute("UPDATE queue_images SET leased = leased - 1 WHERE image_index = ?", (index,))
+                if conn.execute("INSERT OR IGNORE INTO completions VALUES (?, ?)", (index, rater)).rowcount:
+                    conn.execute("UPDATE queue_images SET done = done + 1 WHERE image_index = ?", (index,))
+        self._transaction(work)
+
+    def release(self, session):
+        """Give back every lease held by a session, e.g. when it finishes or starts over"""
+        def work(conn):
+            held = conn.execute("SELECT image_index FROM leases WHERE session = ?", (session,)).fetchall()
+            conn.executemany("UPDATE queue_images SET leased = leased - 1 WHERE image_index = ?", held)
+            conn.execute("DELETE FROM leases WHERE session = ?", (session,))
+        self._transaction(work)
+
+    def progress(self):
+        """``(images at target, images, live leases)``"""
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COALESCE(SUM(done >= ?), 0), COUNT(*), COALESCE(SUM(leased), 0) FROM queue_images",
+                (self.target,),
+            ).fetchone()
+
+
+class QueueScheduler(Scheduler):
+    """Images leased from the shared work queue, so concurrent annotators split the dataset between them
+
+    Expects ``cursors`` to carry the session's ``session`` id and ``rater``.
+    The batch it holds is kept in ``cursors`` too, so the queue is only asked
+    for more once the batch is used up. ``peek`` looks further ahead, for
+    preloading, without leasing anything. The queue holds manifest indices;
+    ``queue_index`` and ``view_index`` map between those and the positions the
+    app shows, when near-duplicates are hidden.
+    """
+
+    name = "Shared queue"
+
+    def __init__(self, queue, batch_size=BATCH_SIZE, queue_index=None, view_index=None):
+        self.queue = queue
+        self.batch_size = batch_size
+        self.queue_index = queue_index or (lambda index: index)
+        self.view_index = view_index or (lambda index: index)
+
+    def next_index(self, current, ratings, cursors, analytics, total):
+        if cursors.get("synced") != cursors["rater"]:
+            # Ratings made before switching to the queue still count toward each image's target
+            self.queue.complete(cursors["rater"],
+                                [self.queue_index(i) for i, score in ratings.items() if score is not None])
+            cursors["synced"] = cursors["rater"]
+        held = [i for i in cursors.get("held", ()) if i not in ratings and i != current]
+        if not held:
+            claimed = self.queue.claim(cursors["session"], cursors["rater"], self.batch_size, self.queue_index(current))
+            shown = (self.view_index(i) for i in claimed)
+            held = [i for i in shown if i is not None and i not in ratings and i != current]
+        cursors["held"] = held
+        return held[0] if held else None
+
+    def peek(self, current, ratings, cursors, analytics, total, count):
+        """The rest of the held batch, then images the queue would offer next; nothing is leased"""
+        ahead = [i for i in cursors.get("held", ()) if i not in ratings and i != current][:count]
+        if len(ahead) < count:
+            offered = self.queue.peek(cursors["rater"], count - len(ahead), self.queue_index(current))
+            shown = (self.view_index(i) for i in offered)
+            ahead += [i for i in shown if i is not None and i not in ratings and i != current and i not in ahead]
+        return ahead